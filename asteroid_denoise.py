@@ -1,49 +1,61 @@
 import os
-import torch
-import torchaudio
-from asteroid.models import BaseModel
+from functools import lru_cache
+import numpy as np
+from audio_io import load_channels
+from pipeline_cache import Manifest, run_cached
+from telemetry import stage, file_bytes
 
 # Use the JorisCos DCCRNet-based model for single-speaker enhancement at 16kHz
-model = BaseModel.from_pretrained("JorisCos/DCCRNet_Libri1Mix_enhsingle_16k")
+PRETRAINED = "JorisCos/DCCRNet_Libri1Mix_enhsingle_16k"
 
 INPUT_FOLDER = "testset_1216/testset_noisy"
 OUTPUT_FOLDER = "testset_1216/asteroid_denoised"
+SAMPLE_RATE = 16000  # Rate the model was trained at
+DENOISE_VERSION = 1  # Bump when the output changes so cached results are rebuilt
+CHANNEL_MODE = "mono"  # "keep": every mic channel is a batch row of one forward pass, "beamform": delay-and-sum
 os.makedirs(OUTPUT_FOLDER, exist_ok=True)
 
+@lru_cache(maxsize=None)
+def load_model():
+    # Built on first use, so importing this module does not hit the hub
+    from asteroid.models import BaseModel
+    return BaseModel.from_pretrained(PRETRAINED)
+
 def denoise_with_asteroid(input_file, output_file):
-    # Load the audio file
-    waveform, sr = torchaudio.load(input_file)
-    
-    # If stereo, convert to mono
-    if waveform.shape[0] > 1:
-        waveform = torch.mean(waveform, dim=0, keepdim=True)  # [1, time]
-
-    # Resample if needed to 16 kHz
-    if sr != 16000:
-        resampler = torchaudio.transforms.Resample(sr, 16000)
-        waveform = resampler(waveform)
-        sr = 16000
-
-    # Model expects [batch, time]. We have [1, time], which is fine.
-    with torch.no_grad():
+    import torch
+    import torchaudio
+    # Load at 16 kHz (resampled once per file and cached on disk); channels become the batch
+    audio, sr = load_channels(input_file, SAMPLE_RATE, CHANNEL_MODE)
+    waveform = torch.from_numpy(np.ascontiguousarray(audio.T))  # [channels, time]
+
+    # Model expects [batch, time]; each channel is one batch row.
+    with torch.no_grad(), stage("forward", backend="asteroid", file=input_file) as s:
         # separate() returns [batch, n_src, time]. Here n_src=1, single source.
-        enhanced = model.separate(waveform)
-        enhanced = enhanced[:, 0, :]  # shape: [1, time]
+        enhanced = load_model().separate(waveform)
+        enhanced = enhanced[:, 0, :]  # shape: [channels, time]
+        s.count(samples=waveform.numel())
 
     # Save the enhanced audio
-    torchaudio.save(output_file, enhanced.cpu(), sr)
+    with stage("write", file=output_file) as s:
+        torchaudio.save(output_file, enhanced.cpu(), sr)
+        s.count(samples=enhanced.numel(), bytes=file_bytes(output_file))
     print(f"Denoised audio saved to {output_file}")
 
 def process_audio_files(input_folder, output_folder):
+    # Unchanged inputs denoised with the same model and settings are skipped
+    manifest = Manifest()
     for file_name in os.listdir(input_folder):
         if file_name.endswith(".wav"):
             input_path = os.path.join(input_folder, file_name)
             output_path = os.path.join(output_folder, file_name.replace(".wav", "_denoised.wav"))
             print(f"Processing {file_name}...")
             try:
-                denoise_with_asteroid(input_path, output_path)
+                run_cached(manifest, "asteroid", [input_path], [output_path],
+                           lambda: denoise_with_asteroid(input_path, output_path),
+                           {"model": PRETRAINED, "channel_mode": CHANNEL_MODE}, DENOISE_VERSION)
             except Exception as e:
                 print(f"Error processing {file_name}: {e}")
+    manifest.save()
 
 if __name__ == "__main__":
     process_audio_files(INPUT_FOLDER, OUTPUT_FOLDER)
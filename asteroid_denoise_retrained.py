@@ -1,9 +1,9 @@
 import os
-import librosa
 import soundfile as sf
-import torch
-from asteroid.models import BaseModel
 import numpy as np
+from chunked_inference import process_chunked
+from audio_io import load_channels
+from telemetry import stage, file_bytes
 
 # Define constants
 INPUT_FOLDER = "testset_1216/testset_noisy"
@@ -12,6 +12,9 @@ BEST_MODEL_PATH = "dccrnet_best_model.pth"  # Path to your saved model
 SAMPLE_RATE = 16000  # Fixed sample rate
 SEGMENT_DURATION = 5  # Duration of each segment in seconds
 SEGMENT_SAMPLES = SAMPLE_RATE * SEGMENT_DURATION  # Number of samples per segment
+SEGMENT_HOP = SEGMENT_SAMPLES // 2  # Segments overlap by half and are crossfaded (overlap-add)
+SEGMENT_BATCH = 8  # Segments per forward pass (bounds peak memory to SEGMENT_BATCH segments)
+CHANNEL_MODE = "mono"  # "keep": segments of every mic channel share the forward pass, "beamform": delay-and-sum
 
 # Ensure the output folder exists
 os.makedirs(OUTPUT_FOLDER, exist_ok=True)
@@ -21,52 +24,42 @@ def load_model(model_path):
     """
     Load the pre-trained model for denoising.
     """
+    import torch
+    from asteroid.models import BaseModel
     model = BaseModel.from_pretrained("JorisCos/DCCRNet_Libri1Mix_enhsingle_16k")
     model.load_state_dict(torch.load(model_path, map_location=torch.device("cpu")))
     model.eval()  # Set the model to evaluation mode
     return model
 
 # Process long audio files
-def process_long_audio(model, input_file, output_file, sample_rate=SAMPLE_RATE, segment_samples=SEGMENT_SAMPLES):
+def process_long_audio(model, input_file, output_file, sample_rate=SAMPLE_RATE, segment_samples=SEGMENT_SAMPLES,
+                       batch_size=SEGMENT_BATCH, hop_samples=SEGMENT_HOP):
     """
-    Process a long audio file by slicing it into smaller segments, enhancing each segment,
-    and combining the enhanced segments into a single output file.
+    Process a long audio file by slicing it into overlapping segments, enhancing the segments
+    in batches of batch_size, and crossfading the enhanced segments (Hann overlap-add)
+    into a single output file. Avoids the clicks at hard segment boundaries.
     """
-    # Load the long noisy audio
-    noisy, _ = librosa.load(input_file, sr=sample_rate)
-    
-    # Slice the audio into smaller segments
-    num_segments = int(np.ceil(len(noisy) / segment_samples))
-    enhanced_audio = []
+    # Load the long noisy audio ([time, channels]; overlap-add folds the channels into the batch)
+    noisy, _ = load_channels(input_file, sample_rate, CHANNEL_MODE)
+    noisy = np.array(noisy[:, 0] if noisy.shape[1] == 1 else noisy)
 
-    print(f"Processing {input_file} into {num_segments} segments...")
-    
-    for i in range(num_segments):
-        start = i * segment_samples
-        end = min((i + 1) * segment_samples, len(noisy))
-        segment = noisy[start:end]
+    import torch
 
-        # Pad the last segment if it's shorter than segment_samples
-        if len(segment) < segment_samples:
-            segment = np.pad(segment, (0, segment_samples - len(segment)))
+    def enhance(segments):
+        # segments: [batch, time] -> model expects [batch, 1, time]
+        with torch.no_grad(), stage("forward", backend="asteroid_retrained", file=input_file) as s:
+            enhanced_tensor = model(torch.from_numpy(segments).unsqueeze(1))
+            s.count(samples=segments.size)
+        return enhanced_tensor.reshape(len(segments), -1).numpy()
 
-        # Convert to tensor
-        segment_tensor = torch.tensor(segment).unsqueeze(0).unsqueeze(0)  # Shape: [1, 1, time]
-
-        # Enhance the segment using the model
-        with torch.no_grad():
-            enhanced_tensor = model(segment_tensor)
-        enhanced_segment = enhanced_tensor.squeeze().numpy()
-
-        # Append to the full enhanced audio
-        enhanced_audio.append(enhanced_segment[:end - start])  # Remove padding if any
-
-    # Combine all enhanced segments
-    enhanced_audio = np.concatenate(enhanced_audio)
+    enhanced_audio, stats = process_chunked(enhance, noisy, sample_rate, segment_samples / sample_rate,
+                                            hop_samples / sample_rate, batch_size)
 
     # Save the enhanced audio to output_file
-    sf.write(output_file, enhanced_audio, sample_rate)
-    print(f"Enhanced audio saved to {output_file}")
+    with stage("write", file=output_file) as s:
+        sf.write(output_file, enhanced_audio, sample_rate)
+        s.count(samples=len(enhanced_audio), bytes=file_bytes(output_file))
+    print(f"Enhanced audio saved to {output_file} (RTF {stats['rtf']:.3f})")
 
 # Main script
 if __name__ == "__main__":
@@ -0,0 +1,434 @@
+import os
+import re
+import json
+import shutil
+import hashlib
+import tempfile
+import subprocess
+import numpy as np
+import soundfile as sf
+from math import gcd
+from functools import lru_cache
+from telemetry import stage, file_bytes
+
+FFMPEG = "ffmpeg"
+FFPROBE = "ffprobe"
+CHUNK_FRAMES = 1 << 16  # Frames read from the ffmpeg pipe per chunk
+
+# Mono float32 conversions per (file, rate) when no cache_dir is given (cache_dir=None disables the disk cache).
+# One fixed per-user location whatever the cwd; the RESAMPLE_CACHE_DIR environment variable overrides it.
+RESAMPLE_CACHE_DIR = os.environ.get("RESAMPLE_CACHE_DIR") or os.path.join(
+    os.environ.get("XDG_CACHE_HOME") or os.path.expanduser("~/.cache"), "flightlog-audio", "resample")
+RESAMPLE_CACHE_MAX_MB = 4096  # Least recently used conversions are evicted once a cache dir grows past this
+EXPORT_FORMATS = ("m4a", "wav", "flac", "npy")  # m4a is lossy (AAC), the others are sample-exact
+# How multi-mic recordings reach the models: downmix, every channel as its own signal, or one delay-and-sum beam
+CHANNEL_MODES = ("mono", "keep", "beamform")
+BEAM_REFERENCE = 0  # Channel the other channels are aligned to before summing
+MAX_BEAM_DELAY_SECONDS = 0.002  # Largest inter-mic delay searched (about 0.7 m of path difference)
+BEAM_FRAME_SECONDS = 0.064  # GCC-PHAT frame length; frames overlap by half
+BEAM_EXCERPT_SECONDS = 20.0  # Delays are estimated on at most this much audio from the middle of the recording
+BEAM_FRAME_BLOCK = 64  # GCC-PHAT frames transformed per FFT call
+
+_PCM_FORMATS = {np.dtype(np.int16): "s16le", np.dtype(np.float32): "f32le"}
+
+
+def probe_audio(audio_file):
+    """
+    Return (sample_rate, channels, duration in s or None) of the first audio stream.
+    Uses ffprobe when available, otherwise parses the `ffmpeg -i` banner.
+    """
+    if shutil.which(FFPROBE):
+        out = subprocess.run(
+            [FFPROBE, "-v", "error", "-select_streams", "a:0", "-show_entries",
+             "stream=sample_rate,channels,duration", "-of", "json", audio_file],
+            capture_output=True, check=True, text=True).stdout
+        stream = json.loads(out)["streams"][0]
+        duration = stream.get("duration")
+        return int(stream["sample_rate"]), int(stream["channels"]), float(duration) if duration else None
+
+    banner = subprocess.run([FFMPEG, "-hide_banner", "-i", audio_file], capture_output=True, text=True).stderr
+    match = re.search(r"Audio: .*?(\d+) Hz, ([^,]+)", banner)
+    if match is None:
+        raise ValueError(f"No audio stream found in {audio_file}")
+    layout = match.group(2).strip()
+    n = re.match(r"(\d+) channels", layout)
+    channels = int(n.group(1)) if n else {"mono": 1, "stereo": 2}.get(layout, 2)
+    d = re.search(r"Duration: (\d+):(\d+):([\d.]+)", banner)
+    duration = int(d.group(1)) * 3600 + int(d.group(2)) * 60 + float(d.group(3)) if d else None
+    return int(match.group(1)), channels, duration
+
+
+def stream_pcm(audio_file, start_sample=0, num_samples=None, sample_rate=None, channels=None,
+               dtype=np.int16, chunk_frames=CHUNK_FRAMES):
+    """
+    Decode audio_file with ffmpeg and yield PCM chunks of shape [frames, channels].
+    start_sample / num_samples are counted at the output sample rate and are sample-exact;
+    samples before start_sample are discarded inside ffmpeg and never reach Python.
+    """
+    src_rate, src_channels, _ = probe_audio(audio_file)
+    sample_rate = sample_rate or src_rate
+    channels = channels or src_channels
+    dtype = np.dtype(dtype)
+
+    filters = []
+    if sample_rate != src_rate:
+        filters.append(f"aresample={sample_rate}")
+    if start_sample or num_samples is not None:
+        trim = f"atrim=start_sample={int(start_sample)}"
+        if num_samples is not None:
+            trim += f":end_sample={int(start_sample) + int(num_samples)}"
+        filters.append(trim)
+
+    cmd = [FFMPEG, "-v", "error", "-nostdin", "-i", audio_file]
+    if filters:
+        cmd += ["-af", ",".join(filters)]
+    cmd += ["-ac", str(channels), "-f", _PCM_FORMATS[dtype], "-"]
+
+    frame_bytes = dtype.itemsize * channels
+    # stderr goes to a temp file: a pipe read only after stdout is drained could fill up and block ffmpeg
+    with tempfile.TemporaryFile() as errors:
+        proc = subprocess.Popen(cmd, stdout=subprocess.PIPE, stderr=errors)
+        finished = False
+        try:
+            while True:
+                raw = proc.stdout.read(chunk_frames * frame_bytes)
+                if not raw:
+                    break
+                usable = len(raw) - len(raw) % frame_bytes
+                yield np.frombuffer(raw[:usable], dtype=dtype).reshape(-1, channels)
+            finished = True
+        finally:
+            # Consumer stopped early (close() / exception): stop ffmpeg quietly, its broken pipe is expected
+            if not finished:
+                proc.kill()
+            proc.stdout.close()
+            returncode = proc.wait()
+        if returncode != 0:
+            errors.seek(0)
+            raise RuntimeError(f"ffmpeg failed on {audio_file}: {errors.read().decode(errors='replace').strip()}")
+
+
+def decode_audio(audio_file, start_sample=0, num_samples=None, sample_rate=None, channels=None,
+                 dtype=np.int16):
+    """
+    Decode (a region of) audio_file into one [frames, channels] array with a single ffmpeg pass.
+    Returns (data, sample_rate).
+    """
+    src_rate, src_channels, duration = probe_audio(audio_file)
+    sample_rate = sample_rate or src_rate
+    channels = channels or src_channels
+
+    # Preallocate from the known/estimated length and fill in place, growing only if needed
+    if num_samples is not None:
+        capacity = int(num_samples)
+    elif duration:
+        capacity = max(int(duration * sample_rate) - int(start_sample), 0) + sample_rate
+    else:
+        capacity = 60 * sample_rate
+    buffer = np.empty((capacity, channels), dtype=dtype)
+
+    filled = 0
+    with stage("decode", file=audio_file, sample_rate=sample_rate) as s:
+        for chunk in stream_pcm(audio_file, start_sample, num_samples, sample_rate, channels, dtype):
+            if filled + len(chunk) > len(buffer):
+                buffer = np.resize(buffer, (max(2 * len(buffer), filled + len(chunk)), channels))
+            buffer[filled:filled + len(chunk)] = chunk
+            filled += len(chunk)
+        s.count(samples=filled * channels, bytes=file_bytes(audio_file))
+    return buffer[:filled], sample_rate
+
+
+def to_float32(data):
+    """
+    Convert int16 PCM to float32 in [-1, 1); float input is returned as float32.
+    """
+    if data.dtype == np.int16:
+        return data.astype(np.float32) / 32768.0
+    return np.asarray(data, dtype=np.float32)
+
+
+@lru_cache(maxsize=None)
+def resample_kernel(src_rate, dst_rate):
+    """
+    (up, down, FIR taps) for one rate pair, designed once per process.
+    Same Kaiser low-pass resample_poly designs by default, which costs more than the filtering
+    itself for awkward ratios like 44100 -> 16000 (up 160, down 441: 8821 taps).
+    """
+    from scipy.signal import firwin  # scipy.signal / pydub are imported on use: together ~1 s of startup
+    g = gcd(int(src_rate), int(dst_rate))
+    up, down = int(dst_rate) // g, int(src_rate) // g
+    max_rate = max(up, down)
+    taps = firwin(2 * 10 * max_rate + 1, 1.0 / max_rate, window=("kaiser", 5.0))
+    taps.setflags(write=False)
+    return up, down, taps
+
+
+def resample(data, src_rate, dst_rate):
+    """
+    Polyphase resampling along the first (time) axis.
+    """
+    if src_rate == dst_rate:
+        return data
+    from scipy.signal import resample_poly
+    with stage("resample", src_rate=int(src_rate), dst_rate=int(dst_rate)) as s:
+        up, down, taps = resample_kernel(int(src_rate), int(dst_rate))
+        s.count(samples=np.size(data))
+        return resample_poly(data, up, down, axis=0, window=taps).astype(np.float32)
+
+
+def check_rate(sample_rate, expected, what="audio"):
+    """
+    Raise if sample_rate differs from the rate a model expects (expected None accepts any rate).
+    """
+    if expected and int(sample_rate) != int(expected):
+        raise ValueError(f"{what} expects {expected} Hz audio, got {sample_rate} Hz")
+
+
+def _npy_info_file(npy_file):
+    return os.path.splitext(npy_file)[0] + ".json"
+
+
+def write_audio(data, sample_rate, output_file):
+    """
+    Write [frames, channels] audio; the format follows the extension (see EXPORT_FORMATS).
+    .npy stores float32 frames (memory-mappable) with the sample rate in a .json sidecar.
+    """
+    ext = os.path.splitext(output_file)[1].lower().lstrip(".")
+    with stage("write", file=output_file, format=ext) as s:
+        if ext == "npy":
+            np.save(output_file, to_float32(data))
+            with open(_npy_info_file(output_file), "w") as f:
+                json.dump({"sample_rate": int(sample_rate), "channels": int(data.shape[1])}, f)
+        elif ext in ("wav", "flac"):
+            subtype = "PCM_16" if data.dtype == np.int16 else ("FLOAT" if ext == "wav" else "PCM_24")
+            sf.write(output_file, data, sample_rate, subtype=subtype)
+        elif ext == "m4a":
+            from pydub import AudioSegment
+            pcm = data if data.dtype == np.int16 else (np.clip(data, -1.0, 1.0 - 1 / 32768) * 32768).astype(np.int16)
+            segment = AudioSegment(np.ascontiguousarray(pcm).tobytes(), frame_rate=sample_rate,
+                                   sample_width=2, channels=pcm.shape[1])
+            segment.export(output_file, format="ipod", codec="aac")
+        else:
+            raise ValueError(f"Unsupported audio format: {output_file}")
+        s.count(samples=data.size, bytes=file_bytes(output_file))
+
+
+def audio_info(input_file):
+    """
+    Return (frames, sample_rate, channels) without loading the samples.
+    """
+    ext = os.path.splitext(input_file)[1].lower().lstrip(".")
+    if ext == "npy":
+        with open(_npy_info_file(input_file)) as f:
+            info = json.load(f)
+        shape = np.load(input_file, mmap_mode="r").shape
+        return shape[0], info["sample_rate"], shape[1] if len(shape) > 1 else 1
+    if ext in ("wav", "flac"):
+        info = sf.info(input_file)
+        return info.frames, info.samplerate, info.channels
+    sample_rate, channels, duration = probe_audio(input_file)
+    return int(round((duration or 0.0) * sample_rate)), sample_rate, channels
+
+
+def load_audio(input_file, mmap=True):
+    """
+    Load audio as float32 [frames, channels]. Returns (data, sample_rate).
+    .npy is memory-mapped (no decode), .wav/.flac are read with soundfile, anything else via ffmpeg.
+    """
+    ext = os.path.splitext(input_file)[1].lower().lstrip(".")
+    with stage("load", file=input_file, format=ext) as s:
+        if ext == "npy":
+            with open(_npy_info_file(input_file)) as f:
+                sample_rate = json.load(f)["sample_rate"]
+            data = np.load(input_file, mmap_mode="r" if mmap else None)
+            data = data if data.ndim == 2 else data[:, None]
+        elif ext in ("wav", "flac"):
+            data, sample_rate = sf.read(input_file, dtype="float32", always_2d=True)
+        else:
+            data, sample_rate = decode_audio(input_file, dtype=np.float32)
+        s.count(samples=data.size, bytes=file_bytes(input_file))
+    return data, sample_rate
+
+
+def _converted_file(input_file, sample_rate, cache_dir, channel_mode="mono", beam=None):
+    # Keyed by path, size and mtime: a changed source gets a new entry
+    st = os.stat(input_file)
+    key = f"{os.path.abspath(input_file)}:{st.st_size}:{st.st_mtime_ns}"
+    stem = os.path.splitext(os.path.basename(input_file))[0]
+    suffix = "" if channel_mode == "mono" else f"_{channel_mode}"
+    if beam:
+        suffix += "_" + hashlib.sha256(json.dumps(beam, sort_keys=True).encode()).hexdigest()[:8]
+    return os.path.join(cache_dir, f"{stem}_{hashlib.sha256(key.encode()).hexdigest()[:16]}_{sample_rate}{suffix}.npy")
+
+
+def prune_cache(cache_dir, max_mb=RESAMPLE_CACHE_MAX_MB):
+    """
+    Delete the least recently used conversions in cache_dir until it holds at most max_mb
+    (0 empties it). Returns the number of files removed.
+    """
+    entries = []
+    for entry in os.scandir(cache_dir):
+        if entry.name.endswith(".npy") and ".tmp." not in entry.name:  # Never a file another worker is writing
+            try:
+                st = entry.stat()
+            except FileNotFoundError:
+                continue  # Pruned by another process meanwhile
+            entries.append((st.st_mtime, st.st_size, entry.path))
+    total, removed = sum(size for _, size, _ in entries), 0
+    for _, size, path in sorted(entries):
+        if total <= max_mb * 1024 * 1024:
+            break
+        try:
+            os.remove(path)  # Open memory maps of the file stay valid
+            removed += 1
+        except FileNotFoundError:
+            pass  # Already pruned by another worker
+        total -= size
+    return removed
+
+
+def _cache_hit(cached):
+    # Memory map of a cached conversion, or None if there is none (or another worker just evicted it)
+    try:
+        os.utime(cached)  # mtime marks the last use for prune_cache
+        return np.load(cached, mmap_mode="r")
+    except FileNotFoundError:
+        return None
+
+
+def _cache_store(cached, data):
+    os.makedirs(os.path.dirname(cached), exist_ok=True)
+    # A temp file of our own (the cache is shared by every process of the user), then an atomic rename,
+    # so parallel workers never read or replace a partial file
+    fd, tmp = tempfile.mkstemp(dir=os.path.dirname(cached), prefix=os.path.basename(cached), suffix=".tmp.npy")
+    try:
+        with os.fdopen(fd, "wb") as f:
+            np.save(f, data)
+        os.replace(tmp, cached)
+    except BaseException:
+        os.remove(tmp)
+        raise
+    prune_cache(os.path.dirname(cached))
+
+
+def load_mono(input_file, sample_rate=None, cache_dir=RESAMPLE_CACHE_DIR):
+    """
+    Load input_file downmixed to mono float32 at sample_rate (None keeps the file's rate).
+    Resampled conversions are stored in cache_dir (bounded by RESAMPLE_CACHE_MAX_MB), so each file is
+    converted to each rate once and later loads are a memory map. Returns (audio, sample_rate).
+    """
+    with stage("load_mono", file=input_file, sample_rate=sample_rate) as s:
+        if sample_rate and cache_dir:
+            cached = _converted_file(input_file, sample_rate, cache_dir)
+            mono = _cache_hit(cached)
+            if mono is not None:
+                s.tag(cache="hit")
+                return mono, sample_rate
+
+        data, rate = load_audio(input_file)
+        mono = np.asarray(data.mean(axis=1) if data.shape[1] > 1 else data[:, 0], dtype=np.float32)
+        if not sample_rate or sample_rate == rate:
+            return mono, rate
+        mono = resample(mono, rate, sample_rate)
+        if cache_dir:
+            s.tag(cache="miss")
+            _cache_store(cached, mono)
+        return mono, sample_rate
+
+
+def channel_delays(data, sample_rate, reference=BEAM_REFERENCE, max_delay_seconds=MAX_BEAM_DELAY_SECONDS,
+                   frame_seconds=BEAM_FRAME_SECONDS, excerpt_seconds=BEAM_EXCERPT_SECONDS):
+    """
+    Integer delay (in samples) of every channel relative to the reference channel, from GCC-PHAT
+    (robust to the coloured motor noise) averaged over short frames of a bounded excerpt.
+    Runs in float32; cost and memory do not grow with the recording length.
+    """
+    from scipy import fft  # Keeps float32 input in complex64
+
+    max_lag = max(int(max_delay_seconds * sample_rate), 1)
+    excerpt = int(excerpt_seconds * sample_rate)
+    start = max((len(data) - excerpt) // 2, 0)
+    x = np.asarray(data[start:start + excerpt], dtype=np.float32)
+    frame = min(int(frame_seconds * sample_rate), len(x))
+    n = 1 << int(np.ceil(np.log2(frame + max_lag)))  # No circular wrap within +-max_lag
+    window = np.hanning(frame).astype(np.float32)[None, :, None]
+    frames = np.lib.stride_tricks.sliding_window_view(x, frame, axis=0)[::max(frame // 2, 1)]  # [F, C, frame] view
+    cross = np.zeros((n // 2 + 1, x.shape[1]), dtype=np.complex64)
+    for i in range(0, len(frames), BEAM_FRAME_BLOCK):
+        spectra = fft.rfft(frames[i:i + BEAM_FRAME_BLOCK].transpose(0, 2, 1) * window, n, axis=1)
+        c = spectra * np.conj(spectra[..., [reference]])
+        cross += (c / np.maximum(np.abs(c), 1e-12)).sum(axis=0)
+    cc = fft.irfft(cross, n, axis=0)
+    lags = np.concatenate((cc[-max_lag:], cc[:max_lag + 1]))  # Lags -max_lag .. max_lag
+    return np.argmax(lags, axis=0) - max_lag
+
+
+def delay_and_sum(data, sample_rate, reference=BEAM_REFERENCE, max_delay_seconds=MAX_BEAM_DELAY_SECONDS,
+                  delays_ms=None):
+    """
+    Steer a [frames, channels] recording at its dominant source: align every channel to the
+    reference channel and average. delays_ms gives explicit steering delays instead (one per
+    channel, positive = the channel lags). Returns float32 [frames].
+    """
+    data = to_float32(data)
+    if data.shape[1] == 1:
+        return data[:, 0]
+    if delays_ms is not None:
+        if len(delays_ms) != data.shape[1]:
+            raise ValueError(f"{len(delays_ms)} steering delays given for {data.shape[1]} channels")
+        delays = np.round(np.asarray(delays_ms, dtype=float) * sample_rate / 1000.0).astype(int)
+    elif not 0 <= reference < data.shape[1]:
+        raise ValueError(f"Beam reference channel {reference} out of range for {data.shape[1]} channels")
+    else:
+        delays = channel_delays(data, sample_rate, reference, max_delay_seconds)
+    beam = np.zeros(len(data), dtype=np.float32)
+    for c, d in enumerate(delays):
+        if d >= 0:  # Channel lags the reference: advance it
+            beam[:len(data) - d] += data[d:, c]
+        else:
+            beam[-d:] += data[:d, c]
+    return beam / data.shape[1]
+
+
+def mix_channels(data, sample_rate, channel_mode="mono", beam=None):
+    """
+    Apply a CHANNEL_MODES mode to [frames, channels] audio. Returns float32 [frames, output channels].
+    beam: delay_and_sum options for "beamform" ({"reference": channel} or {"delays_ms": [...]}).
+    """
+    if channel_mode == "mono":
+        return np.asarray(data.mean(axis=1, keepdims=True), dtype=np.float32)
+    if channel_mode == "keep":
+        return to_float32(data)
+    if channel_mode == "beamform":
+        return delay_and_sum(data, sample_rate, **(beam or {}))[:, None]
+    raise ValueError(f"Unknown channel mode '{channel_mode}'. Available: {', '.join(CHANNEL_MODES)}")
+
+
+def load_channels(input_file, sample_rate=None, channel_mode="mono", cache_dir=RESAMPLE_CACHE_DIR, beam=None):
+    """
+    Load input_file as float32 [frames, channels] at sample_rate with the given CHANNEL_MODES mode
+    ("mono" is load_mono with a channel axis; beam: see mix_channels). Conversions are cached like load_mono's.
+    Returns (audio, sample_rate).
+    """
+    if channel_mode == "mono":
+        mono, rate = load_mono(input_file, sample_rate, cache_dir)
+        return mono[:, None], rate
+    if channel_mode not in CHANNEL_MODES:
+        raise ValueError(f"Unknown channel mode '{channel_mode}'. Available: {', '.join(CHANNEL_MODES)}")
+    with stage("load_channels", file=input_file, sample_rate=sample_rate, channel_mode=channel_mode) as s:
+        if sample_rate and cache_dir:
+            cached = _converted_file(input_file, sample_rate, cache_dir, channel_mode, beam)
+            data = _cache_hit(cached)
+            if data is not None:
+                s.tag(cache="hit")
+                return data, sample_rate
+
+        data, rate = load_audio(input_file)
+        data = mix_channels(data, rate, channel_mode, beam)  # Beamform at the native rate: finer delays
+        if not sample_rate or sample_rate == rate:
+            return data, rate
+        data = resample(data, rate, sample_rate)
+        if cache_dir:
+            s.tag(cache="miss")
+            _cache_store(cached, data)
+        return data, sample_rate
@@ -1,63 +1,77 @@
 import matplotlib.pyplot as plt
 import pandas as pd
-import numpy as np
-from pydub import AudioSegment
-import wave
 import os
-
-def load_audio_waveform(audio_file):
-    # Convert m4a to wav (pydub handles it automatically)
-    audio = AudioSegment.from_file(audio_file, format="m4a")
-    audio.export("temp.wav", format="wav")  # Export to WAV for easier handling
-    with wave.open("temp.wav", "rb") as wav_file:
-        sample_rate = wav_file.getframerate()
-        n_frames = wav_file.getnframes()
-        audio_data = np.frombuffer(wav_file.readframes(n_frames), dtype=np.int16)
-        time_array = np.linspace(0, len(audio_data) / sample_rate, num=len(audio_data))
-    os.remove("temp.wav")  # Clean up temporary WAV file
-    return time_array, audio_data, sample_rate
-
-def plot_trimmed_comparison(df, audio_time, audio_data):
+from audio_io import decode_audio, write_audio
+from auto_sync import estimate_offset, MIN_CONFIDENCE
+from batch_sync import set_offset
+from pipeline_cache import Manifest, run_cached
+from waveform_plot import plot_waveform
+
+# Estimate the START time automatically; the plot is only shown when confidence is low
+AUTO_SYNC = True
+# Trimmed output format: "m4a" (AAC, lossy) or "wav" / "flac" / "npy" (sample-exact, no re-encode)
+EXPORT_FORMAT = "m4a"
+
+def plot_trimmed_comparison(df, audio_data, sample_rate):
     """
     Plot the original actuator output and shifted trimmed audio waveform.
     Audio starts from 0 while actuator output remains unchanged.
     """
+    # Plot; the audio is drawn as a min/max envelope re-decimated on zoom (waveform_plot.py)
+    fig, ax = plt.subplots(figsize=(10, 6))  # Smaller plot size
+    ax.plot(df['timestamp_ms'], df['output[0]'], label="Motor Output (Original)", color="blue")
     # Scale audio data for better visualization (divide amplitude by 15)
-    audio_data_scaled = audio_data / 15
-
-    # Plot
-    plt.figure(figsize=(10, 6))  # Smaller plot size
-    plt.plot(df['timestamp_ms'], df['output[0]'], label="Motor Output (Original)", color="blue")
-    plt.plot(audio_time * 1000, audio_data_scaled, label="Audio Waveform (Shifted, Scaled)", color="orange", alpha=0.7)
-    plt.title("Trimmed Data Comparison: Motor Output and Shifted Audio")
-    plt.xlabel("Time (ms)")
-    plt.ylabel("Amplitude / Motor Output (Scaled)")
-    plt.legend()
-    plt.tight_layout()
+    plot_waveform(ax, audio_data, sample_rate, scale=1 / 15, label="Audio Waveform (Shifted, Scaled)",
+                  color="orange", alpha=0.7)
+    ax.set_title("Trimmed Data Comparison: Motor Output and Shifted Audio")
+    ax.set_xlabel("Time (ms)")
+    ax.set_ylabel("Amplitude / Motor Output (Scaled)")
+    ax.legend()
+    fig.tight_layout()
     plt.show()
 
-def sync_tool(csv_file, audio_file, output_audio_dir):
+def save_trimmed_audio(trimmed_data, sample_rate, audio_file, output_audio_dir, export_format=EXPORT_FORMAT):
+    # Save trimmed audio; wav/flac/npy keep the exact samples, m4a re-encodes to AAC
+    audio_basename = os.path.splitext(os.path.basename(audio_file))[0] + f"_trimmed.{export_format}"
+    trimmed_audio_filename = os.path.join(output_audio_dir, audio_basename)
+    write_audio(trimmed_data, sample_rate, trimmed_audio_filename)
+    print(f"Trimmed audio file saved as: {trimmed_audio_filename}")
+
+def sync_tool(csv_file, audio_file, output_audio_dir, auto=AUTO_SYNC):
     # Load CSV data
     df = pd.read_csv(csv_file)
     df['timestamp_ms'] = df['timestamp'] / 1000  # Convert microseconds to milliseconds
-
-    # Load audio waveform
-    audio_time, audio_data, sample_rate = load_audio_waveform(audio_file)
-    audio = AudioSegment.from_file(audio_file, format="m4a")
+    duration_ms = df['timestamp_ms'].iloc[-1] - df['timestamp_ms'].iloc[0]
+
+    # Decode the recording once; trimming below is done on sample offsets of this buffer
+    audio_data, sample_rate = decode_audio(audio_file)
+    mono = audio_data.mean(axis=1)
+    num_samples = int(round(duration_ms * sample_rate / 1000))
+
+    # Automatic alignment: cross-correlate the audio envelope with the motor outputs
+    if auto:
+        result = estimate_offset(df, mono, sample_rate)
+        print(f"Auto-sync START time: {result['offset_ms']:.1f} ms (confidence {result['confidence']:.2f})")
+        if result['confidence'] >= MIN_CONFIDENCE:
+            start_sample = max(result['offset_samples'], 0)
+            save_trimmed_audio(audio_data[start_sample:start_sample + num_samples], sample_rate,
+                               audio_file, output_audio_dir)
+            return result
+        print("Low confidence, falling back to manual sync.")
 
     # Main loop for syncing
     while True:
         # Plot original data for manual start time selection
         print(f"Processing {csv_file} and {audio_file}...")
         print("Zoom and pan in the plot to decide the start time.")
-        plt.figure(figsize=(10, 6))
-        plt.plot(df['timestamp_ms'], df['output[0]'], label="Motor Output", color="blue")
-        plt.plot(audio_time * 1000, audio_data / 15, label="Audio Waveform (Scaled)", color="orange", alpha=0.7)
-        plt.title("Original Flight Log and Audio")
-        plt.xlabel("Time (ms)")
-        plt.ylabel("Amplitude / Motor Output (Scaled)")
-        plt.legend()
-        plt.tight_layout()
+        fig, ax = plt.subplots(figsize=(10, 6))
+        ax.plot(df['timestamp_ms'], df['output[0]'], label="Motor Output", color="blue")
+        plot_waveform(ax, mono, sample_rate, scale=1 / 15, label="Audio Waveform (Scaled)", color="orange", alpha=0.7)
+        ax.set_title("Original Flight Log and Audio")
+        ax.set_xlabel("Time (ms)")
+        ax.set_ylabel("Amplitude / Motor Output (Scaled)")
+        ax.legend()
+        fig.tight_layout()
         plt.show()
 
         # Ask the user for the start time
@@ -67,28 +81,21 @@ def sync_tool(csv_file, audio_file, output_audio_dir):
             print("Invalid input. Please enter a numeric value for the start time.")
             continue
 
-        # Determine the duration to match the actuator output length
-        end_time = start_time + (df['timestamp_ms'].iloc[-1] - df['timestamp_ms'].iloc[0])
-
-        # Trim the audio data to match the actuator output duration
-        trimmed_audio = audio[start_time:end_time]
-
-        # Prepare audio time for shifted plot
-        trimmed_audio_time = np.linspace(0, (end_time - start_time) / 1000, num=len(trimmed_audio.get_array_of_samples()))
+        # Trim the audio data to match the actuator output duration (sample-exact)
+        start_sample = max(int(round(start_time * sample_rate / 1000)), 0)
+        trimmed_data = audio_data[start_sample:start_sample + num_samples]
 
         # Plot the trimmed data for validation
         print("Comparing the trimmed plot...")
-        plot_trimmed_comparison(df, trimmed_audio_time, np.array(trimmed_audio.get_array_of_samples()))
+        plot_trimmed_comparison(df, trimmed_data.mean(axis=1), sample_rate)
 
         # Ask user whether to proceed
         proceed = input("Do you want to save the synced data? (y/n): ").strip().lower()
         if proceed == 'y':
-            # Save trimmed audio with proper codec
-            audio_basename = os.path.basename(audio_file).replace(".m4a", "_trimmed.m4a")
-            trimmed_audio_filename = os.path.join(output_audio_dir, audio_basename)
-            trimmed_audio.export(trimmed_audio_filename, format="ipod", codec="aac")
-
-            print(f"Trimmed audio file saved as: {trimmed_audio_filename}")
+            save_trimmed_audio(trimmed_data, sample_rate, audio_file, output_audio_dir)
+            # Keep the hand-picked START time in the sync index so batch_sync.py can re-export it
+            set_offset(os.path.dirname(os.path.dirname(csv_file)), os.path.splitext(os.path.basename(csv_file))[0],
+                       start_time)
             break
         else:
             print("Retrying. Please enter a new start time.")
@@ -101,6 +108,10 @@ output_audio_dir = "real_flight_data_1214/audio_synced"  # Output folder for syn
 # Ensure output directories exist
 os.makedirs(output_audio_dir, exist_ok=True)
 
+# Flights synced before with the same log, recording and settings are skipped
+manifest = Manifest()
+sync_params = {"auto": AUTO_SYNC, "export_format": EXPORT_FORMAT, "min_confidence": MIN_CONFIDENCE}
+
 # Process files one by one
 for csv_file in os.listdir(csv_dir):
     if not csv_file.endswith('.csv'):
@@ -111,7 +122,11 @@ for csv_file in os.listdir(csv_dir):
 
     if os.path.exists(os.path.join(csv_dir, csv_file)) and os.path.exists(audio_file):
         print(f"\nSyncing {csv_file} with {audio_file}...")
-        sync_tool(os.path.join(csv_dir, csv_file), audio_file, output_audio_dir)
+        csv_path = os.path.join(csv_dir, csv_file)
+        trimmed_file = os.path.join(output_audio_dir, f"{base_name}_trimmed.{EXPORT_FORMAT}")
+        run_cached(manifest, "audio_sync", [csv_path, audio_file], [trimmed_file],
+                   lambda: sync_tool(csv_path, audio_file, output_audio_dir), sync_params)
+        manifest.save()
         print("\n--- Next File ---")
     else:
         print(f"Missing file: {csv_file} or {audio_file}. Skipping...")
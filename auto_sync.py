@@ -0,0 +1,126 @@
+import numpy as np
+from telemetry import stage
+
+# Automatic audio / flight-log alignment settings
+ENVELOPE_RATE = 100  # Envelope samples per second (10 ms resolution before sub-frame refinement)
+MOTOR_BAND = (80.0, 2000.0)  # Hz, band used by the "band" envelope
+MIN_CONFIDENCE = 0.25  # Below this, sync_tool falls back to the interactive plot
+PEAK_EXCLUSION_S = 1.0  # Second-best peak must be at least this far from the best one
+BLOCK_FRAMES = 4096  # Frames per FFT block when computing the band envelope
+MOTOR_TIME_CONSTANT_S = 0.25  # Motor spin-up lag between PWM command and audible noise
+
+
+def throttle_trace(df):
+    """
+    Return (time in s, mean motor output) from a flight_csv_processed DataFrame.
+    Uses every available output[i] column (output[0] only for older logs).
+    """
+    columns = [c for c in df.columns if c.startswith('output[')]
+    values = df[columns].to_numpy(dtype=np.float64).mean(axis=1)
+    t = (df['timestamp'].to_numpy(dtype=np.float64) - float(df['timestamp'].iloc[0])) / 1e6
+    return t, values
+
+
+def motor_response(trace, env_rate=ENVELOPE_RATE, time_constant=MOTOR_TIME_CONSTANT_S):
+    """
+    First-order low-pass of the commanded output, approximating how fast motor noise follows it.
+    Without this the estimated offset is biased late by roughly the spin-up time.
+    """
+    if time_constant <= 0:
+        return trace
+    from scipy.signal import lfilter, lfilter_zi
+    a = np.exp(-1.0 / (env_rate * time_constant))
+    b, den = [1.0 - a], [1.0, -a]
+    return lfilter(b, den, trace, zi=lfilter_zi(b, den) * trace[0])[0]
+
+
+def audio_envelope(audio, sample_rate, env_rate=ENVELOPE_RATE, method="rms", band=MOTOR_BAND):
+    """
+    Log-energy envelope of a mono signal at env_rate frames per second.
+    method="rms" uses broadband frame energy, method="band" only the motor band.
+    """
+    hop = int(round(sample_rate / env_rate))
+    n_frames = len(audio) // hop
+    frames = np.asarray(audio[:n_frames * hop], dtype=np.float32).reshape(n_frames, hop)
+
+    if method == "rms":
+        energy = np.einsum('ij,ij->i', frames, frames) / hop
+    elif method == "band":
+        freqs = np.fft.rfftfreq(hop, 1.0 / sample_rate)
+        in_band = (freqs >= band[0]) & (freqs <= band[1])
+        window = np.hanning(hop).astype(np.float32)
+        energy = np.empty(n_frames)
+        # Blocked so hour-long recordings don't allocate one huge spectrogram
+        for start in range(0, n_frames, BLOCK_FRAMES):
+            spec = np.fft.rfft(frames[start:start + BLOCK_FRAMES] * window, axis=1)[:, in_band]
+            energy[start:start + BLOCK_FRAMES] = (spec.real ** 2 + spec.imag ** 2).sum(axis=1)
+    else:
+        raise ValueError(f"Unknown envelope method: {method}")
+
+    return np.log10(energy + 1e-10)
+
+
+def _normalized_xcorr(envelope, trace):
+    """
+    Pearson correlation of trace against every fully-overlapping window of envelope
+    (lags 0 .. len(envelope) - len(trace)), computed with one FFT product plus running sums
+    for the window statistics.
+    """
+    n, m = len(envelope), len(trace)
+    trace = (trace - trace.mean()) / (trace.std() + 1e-12)
+
+    size = 1 << int(np.ceil(np.log2(n + m)))
+    corr = np.fft.irfft(np.fft.rfft(envelope, size) * np.conj(np.fft.rfft(trace, size)), size)[:n - m + 1]
+
+    csum = np.concatenate(([0.0], np.cumsum(envelope)))
+    csum2 = np.concatenate(([0.0], np.cumsum(envelope ** 2)))
+    win_mean = (csum[m:] - csum[:-m]) / m
+    win_var = (csum2[m:] - csum2[:-m]) / m - win_mean ** 2
+    return corr / (m * np.sqrt(np.maximum(win_var, 1e-12)))
+
+
+def estimate_offset(df, audio, sample_rate, env_rate=ENVELOPE_RATE, method="rms"):
+    """
+    Estimate where the flight log starts inside the audio recording.
+    Only recordings started before the log (and covering all of it) are supported: the offset is
+    never negative. For any other recording the best match is wrong, which usually shows up as a
+    low confidence, so it is left for manual sync.
+    Returns a dict with offset_ms, offset_samples, correlation and confidence (0..1).
+    """
+    with stage("auto_sync", method=method) as s:
+        t, throttle = throttle_trace(df)
+        grid = np.arange(0.0, t[-1], 1.0 / env_rate)
+        trace = motor_response(np.interp(grid, t, throttle), env_rate)
+        envelope = audio_envelope(audio, sample_rate, env_rate, method=method)
+        s.count(samples=len(audio))
+
+        if len(trace) < 2 or len(envelope) < len(trace):
+            return {"offset_ms": 0.0, "offset_samples": 0, "correlation": 0.0, "confidence": 0.0}
+
+        ncc = _normalized_xcorr(envelope, trace)
+    peak = int(np.argmax(ncc))
+    r_peak = float(ncc[peak])
+
+    # Distinctness: compare against the best lag outside the peak neighbourhood
+    exclusion = int(PEAK_EXCLUSION_S * env_rate)
+    masked = ncc.copy()
+    masked[max(0, peak - exclusion):peak + exclusion + 1] = -np.inf
+    r_second = float(masked.max()) if np.isfinite(masked).any() else 0.0
+    r_second = max(r_second, 0.0)
+    confidence = float(np.clip((r_peak - r_second) / (1.0 - r_second + 1e-12), 0.0, 1.0))
+
+    # Parabolic sub-frame refinement of the peak position
+    lag = float(peak)
+    if 0 < peak < len(ncc) - 1:
+        y0, y1, y2 = ncc[peak - 1], ncc[peak], ncc[peak + 1]
+        denom = y0 - 2 * y1 + y2
+        if denom < 0:
+            lag += 0.5 * (y0 - y2) / denom
+
+    offset_s = lag / env_rate
+    return {
+        "offset_ms": offset_s * 1000.0,
+        "offset_samples": int(round(offset_s * sample_rate)),
+        "correlation": r_peak,
+        "confidence": confidence,
+    }
@@ -0,0 +1,241 @@
+import os
+import json
+import time
+import argparse
+from concurrent.futures import ProcessPoolExecutor
+from audio_io import decode_audio, probe_audio, write_audio, EXPORT_FORMATS
+from auto_sync import estimate_offset, MIN_CONFIDENCE
+from pipeline import flight_paths, DATASET_ROOT, PROCESSED_SUBDIR, SYNCED_SUBDIR, NUM_WORKERS
+from pipeline_cache import Manifest, MANIFEST_FILE
+from telemetry import stage
+from ulog_reader import read_flight_log
+
+# Offsets of every flight of a campaign, computed once; trimming / exporting is a lookup
+SYNC_INDEX_FILE = "sync_index.json"  # Stored in the dataset root
+SYNC_INDEX_VERSION = 2  # Bump when the offset estimation changes so every entry is recomputed (2: root-relative paths)
+ANALYSIS_RATE = 16000  # Recordings are decoded at this rate for the estimate; offsets are stored at the native rate
+EXPORT_FORMAT = "wav"
+
+
+def index_path(root):
+    return os.path.join(root, SYNC_INDEX_FILE)
+
+
+def load_index(root):
+    path = index_path(root)
+    if not os.path.exists(path):
+        return {"version": SYNC_INDEX_VERSION, "flights": {}}
+    with open(path) as f:
+        index = json.load(f)
+    if index["version"] < 2:  # Version 1 stored the paths relative to the cwd of the indexing run
+        for entry in index["flights"].values():
+            entry["csv"], entry["audio"] = relative_path(root, entry["csv"]), relative_path(root, entry["audio"])
+    return index
+
+
+def save_index(root, index):
+    tmp = f"{index_path(root)}.tmp"
+    with open(tmp, "w") as f:
+        json.dump(index, f, indent=1, sort_keys=True)
+    os.replace(tmp, index_path(root))
+
+
+def relative_path(root, path):
+    """
+    Index paths are stored relative to the dataset root, so the index works from any cwd
+    and moves with the root.
+    """
+    return os.path.relpath(path, root)
+
+
+def entry_path(root, entry, field):
+    return os.path.join(root, entry[field])
+
+
+def sync_params(analysis_rate=ANALYSIS_RATE):
+    return {"analysis_rate": analysis_rate, "min_confidence": MIN_CONFIDENCE}
+
+
+def find_offset(csv_file, audio_file, analysis_rate=ANALYSIS_RATE):
+    """
+    Auto-sync one flight (runs in a worker process). Returns its index entry:
+    offset in samples at the recording's native rate (>= 0: the recording must start before the log),
+    confidence, native sample rate / channels and the log duration.
+    """
+    df = read_flight_log(csv_file)
+    log_duration_s = float(df['timestamp'].iloc[-1] - df['timestamp'].iloc[0]) / 1e6
+    sample_rate, channels, _ = probe_audio(audio_file)
+    mono, rate = decode_audio(audio_file, sample_rate=analysis_rate or sample_rate, channels=1)
+    result = estimate_offset(df, mono[:, 0], rate)
+    offset_s = float(result["offset_ms"]) / 1000.0
+    return {
+        "csv": csv_file,
+        "audio": audio_file,
+        "offset_samples": int(round(offset_s * sample_rate)),
+        "offset_ms": float(result["offset_ms"]),
+        "confidence": float(result["confidence"]),
+        "correlation": float(result["correlation"]),
+        "confident": bool(result["confidence"] >= MIN_CONFIDENCE),
+        "sample_rate": int(sample_rate),
+        "channels": int(channels),
+        "log_duration_s": log_duration_s,
+        "method": "auto",
+    }
+
+
+def discover_pairs(root):
+    """
+    {flight: (processed csv, recording)} for every flight that has both.
+    """
+    pairs = {}
+    for name in sorted(os.path.splitext(f)[0] for f in os.listdir(os.path.join(root, PROCESSED_SUBDIR))
+                       if f.endswith(".csv")):
+        paths = flight_paths(root, name)
+        if paths["audio"] is not None:
+            pairs[name] = (paths["csv"], paths["audio"])
+    return pairs
+
+
+def build_index(root=DATASET_ROOT, flights=None, workers=NUM_WORKERS, analysis_rate=ANALYSIS_RATE,
+                manifest=None, force=False):
+    """
+    Auto-sync every flight of root in parallel and store the offsets in <root>/sync_index.json.
+    Entries whose log, recording and settings are unchanged (content hash) are kept, as are manual offsets.
+    """
+    manifest = manifest or Manifest()
+    index = load_index(root)
+    pairs = discover_pairs(root)
+    if flights:
+        pairs = {name: pair for name, pair in pairs.items() if name in flights}
+
+    params = sync_params(analysis_rate)
+    todo = {}
+    for name, (csv_file, audio_file) in pairs.items():
+        key = manifest.key("sync_index", [csv_file, audio_file], params, SYNC_INDEX_VERSION)
+        entry = index["flights"].get(name)
+        if entry is None or (entry["method"] != "manual" and (force or entry["key"] != key)):
+            todo[name] = key
+    print(f"{len(pairs) - len(todo)}/{len(pairs)} flights already in {index_path(root)}, syncing {len(todo)}")
+
+    start = time.perf_counter()
+    with ProcessPoolExecutor(max_workers=max(workers, 1)) as pool:
+        futures = {name: pool.submit(find_offset, *pairs[name], analysis_rate) for name in todo}
+        for name, future in futures.items():
+            try:
+                entry = future.result()
+                entry["csv"], entry["audio"] = relative_path(root, entry["csv"]), relative_path(root, entry["audio"])
+                index["flights"][name] = {**entry, "key": todo[name]}
+            except Exception as e:
+                print(f"FAILED {name}: {type(e).__name__}: {e}")
+    index["version"] = SYNC_INDEX_VERSION
+    save_index(root, index)
+    manifest.save()
+    print(f"Synced {len(todo)} flights with {workers} worker(s) in {time.perf_counter() - start:.2f} s")
+    return index
+
+
+def set_offset(root, flight, offset_ms):
+    """
+    Record a manually chosen START time (e.g. from audio_sync_new.py's plot); kept by later build_index runs.
+    """
+    index = load_index(root)
+    paths = flight_paths(root, flight)
+    sample_rate, channels, _ = probe_audio(paths["audio"])
+    df = read_flight_log(paths["csv"])
+    index["flights"][flight] = {
+        "csv": relative_path(root, paths["csv"]), "audio": relative_path(root, paths["audio"]),
+        "offset_samples": int(round(offset_ms * sample_rate / 1000.0)), "offset_ms": float(offset_ms),
+        "confidence": None, "correlation": None, "confident": True,
+        "sample_rate": int(sample_rate), "channels": int(channels),
+        "log_duration_s": float(df['timestamp'].iloc[-1] - df['timestamp'].iloc[0]) / 1e6,
+        "method": "manual", "key": None,
+    }
+    save_index(root, index)
+    return index["flights"][flight]
+
+
+def trim(entry, output_file, sample_rate=None, channels=None, root=DATASET_ROOT):
+    """
+    Write the part of the recording covered by the log, straight from an index entry of root (no alignment).
+    The START time and length are converted to the output rate; ffmpeg skips the lead-in itself.
+    """
+    rate = sample_rate or entry["sample_rate"]
+    start = max(int(round(entry["offset_samples"] * rate / entry["sample_rate"])), 0)
+    with stage("trim", file=output_file) as s:
+        data, rate = decode_audio(entry_path(root, entry, "audio"), start_sample=start,
+                                  num_samples=int(round(entry["log_duration_s"] * rate)),
+                                  sample_rate=rate, channels=channels)
+        os.makedirs(os.path.dirname(output_file) or ".", exist_ok=True)
+        write_audio(data, rate, output_file)
+        s.count(samples=data.size)
+    return output_file
+
+
+def export_index(root=DATASET_ROOT, output_dir=None, export_format=EXPORT_FORMAT, sample_rate=None,
+                 channels=None, flights=None, include_low=False, workers=NUM_WORKERS):
+    """
+    Trim every indexed flight to <output_dir>/<flight>_trimmed.<format>, in parallel.
+    Low-confidence auto offsets are skipped unless include_low is set.
+    """
+    if export_format not in EXPORT_FORMATS:
+        raise ValueError(f"Unsupported format {export_format}; choose from {', '.join(EXPORT_FORMATS)}")
+    output_dir = output_dir or os.path.join(root, SYNCED_SUBDIR)
+    entries = load_index(root)["flights"]
+    selected = [n for n in sorted(entries) if not flights or n in flights]
+    names = [n for n in selected if include_low or entries[n]["confident"]]
+    for name in sorted(set(selected) - set(names)):
+        print(f"Skipping {name}: confidence {entries[name]['confidence']:.2f} < {MIN_CONFIDENCE} "
+              f"(set the offset by hand with 'batch_sync.py set')")
+
+    start = time.perf_counter()
+    with ProcessPoolExecutor(max_workers=max(workers, 1)) as pool:
+        outputs = [os.path.join(output_dir, f"{n}_trimmed.{export_format}") for n in names]
+        list(pool.map(trim, [entries[n] for n in names], outputs, [sample_rate] * len(names),
+                      [channels] * len(names), [root] * len(names)))
+    print(f"Exported {len(names)} flights to {output_dir} in {time.perf_counter() - start:.2f} s")
+    return outputs
+
+
+def print_index(index):
+    print(f"{'flight':<16}{'offset ms':>11}{'offset samples':>16}{'rate':>7}{'conf':>7}{'log s':>8}  method")
+    for name, e in sorted(index["flights"].items()):
+        conf = f"{e['confidence']:.2f}" if e["confidence"] is not None else "-"
+        print(f"{name:<16}{e['offset_ms']:>11.1f}{e['offset_samples']:>16}{e['sample_rate']:>7}{conf:>7}"
+              f"{e['log_duration_s']:>8.1f}  {e['method']}{'' if e['confident'] else ' (low confidence)'}")
+
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description="Auto-sync a whole campaign into a sync index, then trim from it")
+    parser.add_argument("--root", default=DATASET_ROOT, help="Dataset root (flight_csv_processed/, audio/)")
+    sub = parser.add_subparsers(dest="command", required=True)
+    p_index = sub.add_parser("index", help="Compute offsets for every flight (parallel, cached)")
+    p_index.add_argument("-j", "--workers", type=int, default=NUM_WORKERS)
+    p_index.add_argument("--flights", default=None, help="Comma-separated flight names (default: all)")
+    p_index.add_argument("--analysis-rate", type=int, default=ANALYSIS_RATE)
+    p_index.add_argument("--manifest", default=MANIFEST_FILE)
+    p_index.add_argument("--force", action="store_true", help="Recompute every auto offset")
+    p_export = sub.add_parser("export", help="Trim every indexed flight (no re-alignment)")
+    p_export.add_argument("-o", "--output-dir", default=None, help=f"Default: <root>/{SYNCED_SUBDIR}")
+    p_export.add_argument("-f", "--format", default=EXPORT_FORMAT, choices=EXPORT_FORMATS)
+    p_export.add_argument("-r", "--rate", type=int, default=None, help="Output sample rate (default: native)")
+    p_export.add_argument("-c", "--channels", type=int, default=None, help="Output channels (default: native)")
+    p_export.add_argument("-j", "--workers", type=int, default=NUM_WORKERS)
+    p_export.add_argument("--flights", default=None)
+    p_export.add_argument("--include-low", action="store_true", help="Also export low-confidence offsets")
+    p_set = sub.add_parser("set", help="Record a manually chosen START time")
+    p_set.add_argument("flight")
+    p_set.add_argument("offset_ms", type=float)
+    sub.add_parser("show", help="Print the index")
+    args = parser.parse_args()
+
+    if args.command == "index":
+        flights = args.flights.split(",") if args.flights else None
+        print_index(build_index(args.root, flights, args.workers, args.analysis_rate or None,
+                                Manifest(args.manifest), args.force))
+    elif args.command == "export":
+        export_index(args.root, args.output_dir, args.format, args.rate, args.channels,
+                     args.flights.split(",") if args.flights else None, args.include_low, args.workers)
+    elif args.command == "set":
+        print(set_offset(args.root, args.flight, args.offset_ms))
+    else:
+        print_index(load_index(args.root))
@@ -0,0 +1,339 @@
+import os
+import sys
+import json
+import time
+import struct
+import platform
+import argparse
+import resource
+import tempfile
+import subprocess
+import numpy as np
+
+# Throughput benchmark: every stage runs in its own interpreter so peak RSS is per stage
+RESULTS_DIR = "benchmark_results"
+FIXTURE_SECONDS = 60.0  # Length of the synthetic flight
+FIXTURE_RATE = 48000
+FIXTURE_LEAD_SECONDS = 7.5  # Recording starts this long before the log (true sync offset)
+LOG_RATE_HZ = 100  # actuator_outputs publish rate in the synthetic ULog
+DENOISE_BACKENDS = ("noisereduce", "rpm_notch")
+REGRESSION_TOLERANCE = 0.2  # --compare flags stages that got >20% slower or larger
+STAGES = ("ulog_parse", "ingest", "decode_m4a", "m4a_to_wav", "auto_sync")
+
+_ULOG_FORMAT = b"actuator_outputs:uint64_t timestamp;uint32_t noutputs;float[16] output;"
+
+
+def _ulog_message(msg_type, payload):
+    return struct.pack("<HB", len(payload), ord(msg_type)) + payload
+
+
+def write_synthetic_ulog(path, t, outputs):
+    """
+    Minimal ULog (v1) with a single actuator_outputs instance.
+    t: timestamps in s; outputs: [samples, motors] PWM values (up to 16 motors).
+    """
+    with open(path, "wb") as f:
+        f.write(b"ULog\x01\x12\x35" + bytes([1]) + struct.pack("<Q", 0))
+        f.write(_ulog_message("B", bytes(16) + struct.pack("<3Q", 0, 0, 0)))  # Flag bits: nothing appended
+        f.write(_ulog_message("F", _ULOG_FORMAT))
+        f.write(_ulog_message("A", struct.pack("<BH", 0, 0) + b"actuator_outputs"))
+        padded = np.zeros((len(t), 16), dtype=np.float32)
+        padded[:, :outputs.shape[1]] = outputs
+        for timestamp, row in zip(t, padded):
+            payload = struct.pack("<HQI", 0, int(timestamp * 1e6) + 1, outputs.shape[1]) + row.tobytes()
+            f.write(_ulog_message("D", payload))
+
+
+def synthetic_flight(seconds=FIXTURE_SECONDS, seed=0):
+    """
+    Throttle steps for 4 motors, ending at 1000 (disarmed) like a real log.
+    Returns (t in s, outputs [samples, 4]).
+    """
+    rng = np.random.default_rng(seed)
+    t = np.arange(0.0, seconds, 1.0 / LOG_RATE_HZ)
+    knots = np.arange(0.0, seconds + 2.0, 2.0)
+    level = np.interp(t, knots, rng.uniform(1250, 1750, len(knots)))
+    outputs = level[:, None] + rng.normal(0, 15, (len(t), 4))
+    outputs[-LOG_RATE_HZ // 2:] = 1000.0
+    return t, outputs
+
+
+def synthetic_audio(t, outputs, lead_seconds=FIXTURE_LEAD_SECONDS, sample_rate=FIXTURE_RATE, seed=0):
+    """
+    Motor hum (harmonics of the rotor frequency, louder with throttle) plus broadband noise,
+    preceded by lead_seconds of quiet and followed by a short tail.
+    """
+    from rpm_denoise import rotor_hz
+    rng = np.random.default_rng(seed)
+    n_lead, n_tail = int(lead_seconds * sample_rate), sample_rate
+    n = int(t[-1] * sample_rate)
+    audio = rng.normal(0, 0.01, n_lead + n + n_tail).astype(np.float32)
+
+    ts = np.arange(n) / sample_rate
+    for m in range(outputs.shape[1]):
+        pwm = np.interp(ts, t, outputs[:, m])
+        f0 = rotor_hz(pwm)
+        phase = 2 * np.pi * np.cumsum(f0) / sample_rate
+        gain = 0.05 * np.clip((pwm - 1000.0) / 1000.0, 0.0, None)
+        for h in range(1, 6):
+            audio[n_lead:n_lead + n] += (gain / h * np.sin(h * phase + m)).astype(np.float32)
+        audio[n_lead:n_lead + n] += gain * rng.normal(0, 0.3, n).astype(np.float32)
+    return audio
+
+
+def make_fixtures(fixture_dir, seconds=FIXTURE_SECONDS):
+    """
+    Write flight.ulg, flight.m4a (the recording, with the lead-in) and flight.wav (the recording
+    trimmed to the log, as audio_sync would) into fixture_dir.
+    """
+    from audio_io import write_audio
+    os.makedirs(fixture_dir, exist_ok=True)
+    t, outputs = synthetic_flight(seconds)
+    audio = synthetic_audio(t, outputs)[:, None]
+    fixtures = {
+        "ulog": os.path.join(fixture_dir, "flight.ulg"),
+        "m4a": os.path.join(fixture_dir, "flight.m4a"),
+        "wav": os.path.join(fixture_dir, "flight.wav"),
+        "work_dir": fixture_dir,
+        "actuator_dir": os.path.join(fixture_dir, "csv_processed"),
+        "true_offset_ms": FIXTURE_LEAD_SECONDS * 1000.0,
+        "source": f"synthetic {seconds:.0f} s",
+    }
+    write_synthetic_ulog(fixtures["ulog"], t, outputs)
+    write_audio(audio, FIXTURE_RATE, fixtures["m4a"])
+    lead = int(FIXTURE_LEAD_SECONDS * FIXTURE_RATE)
+    write_audio(audio[lead:lead + int(t[-1] * FIXTURE_RATE)], FIXTURE_RATE, fixtures["wav"])
+    return fixtures
+
+
+def real_fixtures(root, flight, work_dir):
+    """
+    Use a checked-in flight: <root>/flightlog_raw/<flight>.ulg, audio/<flight>.m4a, wav_files/<flight>_trimmed.wav.
+    Paths are absolute because the stages run with the script's directory as their cwd.
+    """
+    path = os.path.abspath(root)
+    return {
+        "ulog": os.path.join(path, "flightlog_raw", f"{flight}.ulg"),
+        "m4a": os.path.join(path, "audio", f"{flight}.m4a"),
+        "wav": os.path.join(path, "wav_files", f"{flight}_trimmed.wav"),
+        "work_dir": work_dir,
+        "actuator_dir": os.path.join(path, "flight_csv_processed"),
+        "true_offset_ms": None,
+        "source": f"{root}/{flight}",
+    }
+
+
+# Stage bodies, run inside the child process. Each returns (metrics, audio seconds or None)
+
+def _ulog_parse(fx):
+    from ulog_reader import read_ulog_topics
+    topics = read_ulog_topics(fx["ulog"])
+    rows = sum(len(f["timestamp"]) for f in topics.values())
+    return {"rows": rows, "mb": os.path.getsize(fx["ulog"]) / 1e6}, None
+
+
+def _process_log(fx):
+    from px4_log_new import process_ulog_file
+    return process_ulog_file(fx["ulog"], os.path.join(fx["work_dir"], "npz"), os.path.join(fx["work_dir"], "csv"),
+                             os.path.join(fx["work_dir"], "csv_processed"),
+                             track_dir=os.path.join(fx["work_dir"], "tracks"))
+
+
+def _ingest(fx):
+    data = _process_log(fx)
+    return {"rows": len(data["timestamp"]), "mb": os.path.getsize(fx["ulog"]) / 1e6}, None
+
+
+def _decode_m4a(fx):
+    from audio_io import decode_audio
+    data, sample_rate = decode_audio(fx["m4a"])
+    return {}, len(data) / sample_rate
+
+
+def _m4a_to_wav(fx):
+    from audio_io import decode_audio, write_audio
+    data, sample_rate = decode_audio(fx["m4a"])
+    write_audio(data, sample_rate, os.path.join(fx["work_dir"], "converted.wav"))
+    return {}, len(data) / sample_rate
+
+
+def _auto_sync(fx):
+    import pandas as pd
+    from audio_io import decode_audio
+    from auto_sync import estimate_offset
+    df = pd.DataFrame(_process_log(fx))
+    data, sample_rate = decode_audio(fx["m4a"])
+    start = time.perf_counter()  # Only the estimate itself; decode is measured by decode_m4a
+    result = estimate_offset(df, data.mean(axis=1), sample_rate)
+    metrics = {"estimate_seconds": time.perf_counter() - start, "confidence": result["confidence"],
+               "offset_ms": float(result["offset_ms"])}
+    if fx["true_offset_ms"] is not None:
+        metrics["error_ms"] = float(result["offset_ms"]) - fx["true_offset_ms"]
+    return metrics, len(data) / sample_rate
+
+
+def _denoise(fx, backend_name):
+    from denoise_engine import load_backends, denoise_batch
+    from audio_io import audio_info
+    backends = load_backends([backend_name])
+    if backends[backend_name].uses_source:
+        if fx["true_offset_ms"] is not None:
+            _process_log(fx)  # Synthetic flight: write the actuator CSV next to the fixtures
+        backends[backend_name].actuator_dir = fx["actuator_dir"]
+    results = denoise_batch([fx["wav"]], os.path.join(fx["work_dir"], "denoised"), backends)
+    if not results[0]["ok"]:
+        raise RuntimeError(results[0]["error"])
+    frames, sample_rate, _ = audio_info(fx["wav"])
+    return {"load_seconds": backends[backend_name].load_seconds,
+            "inference_seconds": results[0]["seconds"]}, frames / sample_rate
+
+
+def peak_rss_mb():
+    """
+    Peak resident memory of this process. On Linux VmHWM is used because ru_maxrss carries
+    over the parent's peak through fork + exec.
+    """
+    try:
+        with open("/proc/self/status") as f:
+            for line in f:
+                if line.startswith("VmHWM:"):
+                    return int(line.split()[1]) / 1024
+    except OSError:
+        pass
+    peak = resource.getrusage(resource.RUSAGE_SELF).ru_maxrss  # KiB on Linux, bytes on macOS
+    return peak / (1024 * 1024 if sys.platform == "darwin" else 1024)
+
+
+def run_stage(stage, fx):
+    """
+    Child side: run one stage and return its record (wall time, RTF, peak RSS).
+    """
+    start = time.perf_counter()
+    if stage.startswith("denoise:"):
+        metrics, audio_seconds = _denoise(fx, stage.split(":", 1)[1])
+    else:
+        metrics, audio_seconds = globals()[f"_{stage}"](fx)
+    wall = time.perf_counter() - start
+    record = {"stage": stage, "ok": True, "wall_seconds": wall, "peak_rss_mb": peak_rss_mb(), **metrics}
+    if audio_seconds:
+        compute = metrics.get("inference_seconds", metrics.get("estimate_seconds", wall))
+        record.update(audio_seconds=audio_seconds, rtf=compute / audio_seconds)
+    if "mb" in metrics:
+        record["mb_per_s"] = metrics["mb"] / wall
+    return record
+
+
+def run_isolated(stage, fx, timeout=None):
+    """
+    Run a stage in a fresh interpreter so imports, models and buffers of other stages
+    don't inflate its peak RSS.
+    """
+    cmd = [sys.executable, os.path.abspath(__file__), "_stage", stage, json.dumps(fx)]
+    try:
+        proc = subprocess.run(cmd, capture_output=True, text=True, timeout=timeout,
+                              cwd=os.path.dirname(os.path.abspath(__file__)))
+    except subprocess.TimeoutExpired:
+        return {"stage": stage, "ok": False, "error": f"timeout after {timeout} s"}
+    lines = proc.stdout.strip().splitlines()
+    if proc.returncode != 0 or not lines:
+        error = (proc.stderr.strip().splitlines() or ["no output"])[-1]
+        return {"stage": stage, "ok": False, "error": error}
+    return json.loads(lines[-1])
+
+
+def environment():
+    try:
+        commit = subprocess.run(["git", "rev-parse", "--short", "HEAD"], capture_output=True, text=True,
+                                cwd=os.path.dirname(os.path.abspath(__file__))).stdout.strip()
+    except OSError:
+        commit = None
+    return {"commit": commit, "python": platform.python_version(), "platform": platform.platform(),
+            "cpu_count": os.cpu_count(), "time": time.strftime("%Y-%m-%dT%H:%M:%S")}
+
+
+def run_benchmark(fx, stages=STAGES, backends=DENOISE_BACKENDS, timeout=None):
+    records = []
+    for stage in list(stages) + [f"denoise:{b}" for b in backends]:
+        record = run_isolated(stage, fx, timeout)
+        print_record(record)
+        records.append(record)
+    return {"environment": environment(), "fixtures": fx["source"], "results": records}
+
+
+def print_record(r):
+    if not r["ok"]:
+        print(f"{r['stage']:<24} FAILED: {r['error']}")
+        return
+    extra = []
+    if "rtf" in r:
+        extra.append(f"RTF {r['rtf']:.3f}")
+    if "mb_per_s" in r:
+        extra.append(f"{r['mb_per_s']:.1f} MB/s")
+    if "load_seconds" in r:
+        extra.append(f"load {r['load_seconds']:.2f} s")
+    if "error_ms" in r:
+        extra.append(f"sync error {r['error_ms']:+.0f} ms")
+    print(f"{r['stage']:<24} {r['wall_seconds']:8.2f} s  peak RSS {r['peak_rss_mb']:7.0f} MB  " + "  ".join(extra))
+
+
+def compare(current, baseline, tolerance=REGRESSION_TOLERANCE):
+    """
+    Print per-stage ratios against a previous results file. Returns the regressed stages.
+    """
+    old = {r["stage"]: r for r in baseline["results"] if r["ok"]}
+    regressions = []
+    print(f"\nCompared with {baseline['environment'].get('commit')} ({baseline['environment'].get('time')}):")
+    for r in current["results"]:
+        if not r["ok"] or r["stage"] not in old:
+            continue
+        flags = []
+        for metric in ("wall_seconds", "rtf", "peak_rss_mb"):
+            if metric in r and old[r["stage"]].get(metric):
+                ratio = r[metric] / old[r["stage"]][metric]
+                flags.append(f"{metric} x{ratio:.2f}" + (" REGRESSION" if ratio > 1 + tolerance else ""))
+                if ratio > 1 + tolerance:
+                    regressions.append(r["stage"])
+        print(f"{r['stage']:<24} " + ", ".join(flags))
+    return sorted(set(regressions))
+
+
+if __name__ == "__main__":
+    if len(sys.argv) > 1 and sys.argv[1] == "_stage":
+        try:
+            print(json.dumps(run_stage(sys.argv[2], json.loads(sys.argv[3]))))
+        except Exception as e:
+            print(json.dumps({"stage": sys.argv[2], "ok": False, "error": f"{type(e).__name__}: {e}"}))
+        sys.exit(0)
+
+    parser = argparse.ArgumentParser(description="Wall time, real-time factor and peak RSS per stage and backend")
+    parser.add_argument("-b", "--backends", default=",".join(DENOISE_BACKENDS))
+    parser.add_argument("--stages", default=",".join(STAGES))
+    parser.add_argument("--seconds", type=float, default=FIXTURE_SECONDS, help="Length of the synthetic flight")
+    parser.add_argument("--real", nargs=2, metavar=("ROOT", "FLIGHT"),
+                        help="Use a checked-in flight, e.g. real_flight_data_1214 Kus_11_2")
+    parser.add_argument("--timeout", type=float, default=None, help="Per-stage timeout in seconds")
+    parser.add_argument("-o", "--output", default=None, help=f"Results JSON (default: {RESULTS_DIR}/<time>.json)")
+    parser.add_argument("--compare", default=None, help="Previous results JSON to check for regressions")
+    args = parser.parse_args()
+
+    with tempfile.TemporaryDirectory(prefix="bench_") as work_dir:
+        if args.real:
+            fx = real_fixtures(args.real[0], args.real[1], work_dir)
+        else:
+            print(f"Generating {args.seconds:.0f} s synthetic ULog / m4a / wav fixtures...")
+            fx = make_fixtures(work_dir, args.seconds)
+        results = run_benchmark(fx, [s for s in args.stages.split(",") if s],
+                                [b for b in args.backends.split(",") if b], args.timeout)
+
+    output = args.output or os.path.join(RESULTS_DIR, time.strftime("%Y%m%d-%H%M%S") + ".json")
+    os.makedirs(os.path.dirname(output) or ".", exist_ok=True)
+    with open(output, "w") as f:
+        json.dump(results, f, indent=1)
+    print(f"Results written to {output}")
+
+    if args.compare:
+        with open(args.compare) as f:
+            regressions = compare(results, json.load(f))
+        if regressions:
+            print(f"Regressions: {', '.join(regressions)}")
+            sys.exit(1)
@@ -0,0 +1,146 @@
+import time
+import numpy as np
+import soundfile as sf
+
+# Defaults for overlap-add segmented inference
+CHUNK_SECONDS = 5.0  # Length of each model input
+HOP_SECONDS = 2.5  # Step between chunk starts (CHUNK - HOP seconds of crossfade)
+BATCH_CHUNKS = 4  # Chunks per model call
+
+
+class SoundFileSignal:
+    """
+    Read-only, mono view of an audio file that reads only the requested slice from disk.
+    Lets process_chunked() work on recordings that don't fit in memory.
+    """
+
+    def __init__(self, path):
+        self.file = sf.SoundFile(path)
+        self.sample_rate = self.file.samplerate
+
+    def __len__(self):
+        return self.file.frames
+
+    def __getitem__(self, index):
+        start, stop, _ = index.indices(len(self))
+        self.file.seek(start)
+        return self.file.read(stop - start, dtype="float32", always_2d=True).mean(axis=1)
+
+    def close(self):
+        self.file.close()
+
+
+def _chunk_starts(n_samples, chunk, hop, pad):
+    # Chunk start positions (in signal coordinates) so every sample is covered by the full window overlap
+    total = n_samples + 2 * pad
+    n_chunks = max(int(np.ceil((total - chunk) / hop)), 0) + 1
+    return [k * hop - pad for k in range(n_chunks)]
+
+
+def _channel_shape(signal):
+    # () for mono signals (including SoundFileSignal), (channels,) for [frames, channels] arrays
+    return tuple(getattr(signal, "shape", (len(signal),))[1:])
+
+
+def _read_chunk(signal, start, chunk):
+    # Zero-padded read of signal[start:start + chunk]
+    out = np.zeros((chunk,) + _channel_shape(signal), dtype=np.float32)
+    lo, hi = max(start, 0), min(start + chunk, len(signal))
+    if hi > lo:
+        out[lo - start:hi - start] = signal[lo:hi]
+    return out
+
+
+def iter_overlap_add(fn, signal, chunk, hop, batch_chunks=BATCH_CHUNKS):
+    """
+    Run fn over Hann-windowed, overlapping chunks of signal and yield the crossfaded output
+    in order, one finished block at a time. fn maps a float32 [B, chunk] array to [B, chunk].
+    A [frames, channels] signal is fed with its channels folded into the batch ([B * channels, chunk]),
+    so every channel goes through the same forward pass, and yields [frames, channels] blocks.
+    Memory is bounded by batch_chunks * chunk (* channels) regardless of len(signal).
+    """
+    if not 0 < hop <= chunk:
+        raise ValueError("hop must be in (0, chunk]")
+    channels = _channel_shape(signal)
+    window = np.hanning(chunk + 2)[1:-1].astype(np.float32)  # Strictly positive Hann
+    window = window.reshape((chunk,) + (1,) * len(channels))
+    pad = chunk - hop
+    n_samples = len(signal)
+    starts = _chunk_starts(n_samples, chunk, hop, pad)
+
+    acc = np.zeros((chunk,) + channels, dtype=np.float32)
+    wsum = np.zeros((chunk,) + (1,) * len(channels), dtype=np.float32)
+    emitted = -pad  # Signal position of acc[0]
+
+    for b in range(0, len(starts), batch_chunks):
+        batch_starts = starts[b:b + batch_chunks]
+        chunks = np.stack([_read_chunk(signal, s, chunk) for s in batch_starts])
+        if channels:
+            # [B, chunk, C] -> [B * C, chunk] and back
+            folded = np.ascontiguousarray(chunks.transpose(0, 2, 1)).reshape(-1, chunk)
+            outputs = fn(folded).reshape(len(batch_starts), channels[0], chunk).transpose(0, 2, 1)
+        else:
+            outputs = fn(chunks)
+        for i, start in enumerate(batch_starts):
+            acc += outputs[i] * window
+            wsum += window
+            # Samples before the next chunk start receive no further contributions
+            done = (batch_starts[i + 1] if i + 1 < len(batch_starts)
+                    else starts[b + len(batch_starts)] if b + len(batch_starts) < len(starts)
+                    else start + chunk) - emitted
+            block = acc[:done] / np.maximum(wsum[:done], 1e-8)
+            lo, hi = max(0, -emitted), min(done, n_samples - emitted)
+            if hi > lo:
+                yield block[lo:hi]
+            acc = np.concatenate((acc[done:], np.zeros((done,) + acc.shape[1:], dtype=np.float32)))
+            wsum = np.concatenate((wsum[done:], np.zeros((done,) + wsum.shape[1:], dtype=np.float32)))
+            emitted += done
+
+
+def process_chunked(fn, signal, sample_rate, chunk_seconds=CHUNK_SECONDS, hop_seconds=HOP_SECONDS,
+                    batch_chunks=BATCH_CHUNKS, writer=None):
+    """
+    Overlap-add inference over an arbitrarily long signal (array, memmap or SoundFileSignal;
+    [frames] or [frames, channels]).
+    If writer is given (e.g. SoundFile.write) blocks are streamed to it and no output array is kept.
+    Returns (output or None, stats) where stats holds audio/compute seconds and the real-time factor.
+    """
+    chunk = int(round(chunk_seconds * sample_rate))
+    hop = int(round(hop_seconds * sample_rate))
+    output = None if writer is not None else np.empty((len(signal),) + _channel_shape(signal), dtype=np.float32)
+
+    start = time.perf_counter()
+    position = 0
+    for block in iter_overlap_add(fn, signal, chunk, hop, batch_chunks):
+        if writer is not None:
+            writer(block)
+        else:
+            output[position:position + len(block)] = block
+        position += len(block)
+    compute_seconds = time.perf_counter() - start
+
+    audio_seconds = len(signal) / sample_rate
+    stats = {
+        "audio_seconds": audio_seconds,
+        "compute_seconds": compute_seconds,
+        "rtf": compute_seconds / audio_seconds if audio_seconds else 0.0,
+    }
+    return output, stats
+
+
+def process_file_chunked(fn, input_file, output_file, chunk_seconds=CHUNK_SECONDS, hop_seconds=HOP_SECONDS,
+                         batch_chunks=BATCH_CHUNKS):
+    """
+    Stream input_file (wav/flac, mono mixdown) through fn into output_file in bounded memory.
+    fn must operate at the file's own sample rate.
+    """
+    signal = SoundFileSignal(input_file)
+    try:
+        with sf.SoundFile(output_file, "w", samplerate=signal.sample_rate, channels=1) as out:
+            _, stats = process_chunked(fn, signal, signal.sample_rate, chunk_seconds, hop_seconds,
+                                       batch_chunks, writer=out.write)
+    finally:
+        signal.close()
+    print(f"{input_file}: {stats['audio_seconds']:.1f} s audio in {stats['compute_seconds']:.2f} s "
+          f"(RTF {stats['rtf']:.3f})")
+    return stats
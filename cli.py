@@ -0,0 +1,94 @@
+import os
+import re
+import sys
+import time
+import runpy
+import argparse
+import subprocess
+
+# One entry point for the pipeline scripts. A subcommand's module is only imported when that
+# subcommand runs, and denoise backends only import / build their model when selected (-b),
+# so `cli.py --help` and `cli.py <command> --help` never pay for torch, TensorFlow or a hub download.
+COMMANDS = {
+    "ingest": ("ulog_ingest", "Parse .ulg logs into processed CSVs and flight tracks (parallel)"),
+    "sync": ("batch_sync", "Auto-sync a campaign into sync_index.json and trim / export from it"),
+    "pipeline": ("pipeline", "Ingest -> sync -> denoise every flight of a dataset root"),
+    "denoise": ("denoise_engine", "Run any subset of denoise backends over a folder"),
+    "serve": ("denoise_server", "Long-lived denoise worker with resident models"),
+    "stream": ("stream_denoise", "Streaming (frame-by-frame) denoising"),
+    "evaluate": ("evaluate", "Objective metrics of every denoiser output folder"),
+    "dataset": ("dataset_builder", "Pack synced flights into a memory-mapped training store"),
+    "export": ("dccrnet_export", "Export / benchmark the retrained DCCRNet for CPU inference"),
+    "benchmark": ("benchmark", "Wall time, RTF and peak RSS per stage"),
+    "telemetry": ("telemetry", "Aggregate telemetry records across runs"),
+}
+STARTUP_TARGET_SECONDS = 1.0  # `cli.py <command> --help` in a fresh interpreter, Python startup included
+STARTUP_REPEATS = 3  # Best of this many runs (the first one also warms the OS file cache)
+IMPORT_REPORT = 3  # Slowest top-level imports listed per command
+
+
+def run_command(command, argv):
+    """
+    Run a subcommand's script as if it had been started directly (its own argparse, __main__ block).
+    """
+    module = COMMANDS[command][0]
+    sys.argv = [f"{module}.py"] + list(argv)
+    runpy.run_module(module, run_name="__main__", alter_sys=True)
+
+
+def slowest_imports(stderr, n=IMPORT_REPORT):
+    """
+    Top-level packages with the largest cumulative time in `python -X importtime` output.
+    """
+    times = []
+    for line in stderr.splitlines():
+        match = re.match(r"import time:\s+\d+ \|\s+(\d+) \| (\S.*)$", line)  # Unindented name = top level
+        if match:
+            times.append((int(match.group(1)) / 1e6, match.group(2).strip()))
+    return sorted(times, reverse=True)[:n]
+
+
+def measure_startup(commands=None, repeats=STARTUP_REPEATS, target=STARTUP_TARGET_SECONDS):
+    """
+    Time `cli.py [<command>] --help` in fresh interpreters. Returns {command: (seconds, slowest imports)}.
+    """
+    env = {**os.environ, "TELEMETRY_FILE": ""}
+    results = {}
+    for command in [None] + list(commands or COMMANDS):
+        cmd = [sys.executable, os.path.abspath(__file__)] + ([command] if command else []) + ["--help"]
+        best = float("inf")
+        for _ in range(repeats):
+            start = time.perf_counter()
+            subprocess.run(cmd, capture_output=True, env=env, check=True)
+            best = min(best, time.perf_counter() - start)
+        importtime = subprocess.run([sys.executable, "-X", "importtime"] + cmd[1:], capture_output=True,
+                                    text=True, env=env).stderr
+        results[command or "(cli)"] = (best, slowest_imports(importtime))
+
+    print(f"{'command':<12}{'startup s':>10}  slowest imports (cumulative s)")
+    for command, (seconds, imports) in results.items():
+        flag = "" if seconds <= target else "  OVER TARGET"
+        listed = ", ".join(f"{name} {s:.2f}" for s, name in imports)
+        print(f"{command:<12}{seconds:>10.2f}  {listed}{flag}")
+    return results
+
+
+if __name__ == "__main__":
+    if len(sys.argv) > 1 and sys.argv[1] in COMMANDS:
+        run_command(sys.argv[1], sys.argv[2:])
+        sys.exit(0)
+
+    parser = argparse.ArgumentParser(
+        description="Drone audio pipeline. Run `cli.py <command> --help` for the options of a command.",
+        formatter_class=argparse.RawDescriptionHelpFormatter,
+        epilog="commands:\n" + "\n".join(f"  {name:<11}{text}" for name, (_, text) in COMMANDS.items())
+        + "\n  startup    Measure the startup time of every command against the target")
+    parser.add_argument("command", choices=list(COMMANDS) + ["startup"], metavar="command")
+    parser.add_argument("--target", type=float, default=STARTUP_TARGET_SECONDS,
+                        help="startup: seconds allowed per command (exit status 1 when exceeded)")
+    parser.add_argument("--repeats", type=int, default=STARTUP_REPEATS)
+    parser.add_argument("--commands", default=None, help="startup: comma-separated subset of commands")
+    args = parser.parse_args()
+
+    results = measure_startup(args.commands.split(",") if args.commands else None, args.repeats, args.target)
+    sys.exit(int(any(seconds > args.target for seconds, _ in results.values())))
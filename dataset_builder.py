@@ -0,0 +1,237 @@
+import os
+import re
+import json
+import argparse
+import numpy as np
+from audio_io import load_mono
+from evaluate import find_lag
+from rpm_denoise import load_actuator_outputs
+
+# Training store: synced noisy audio + aligned clean reference + actuator outputs, packed into shards
+NOISY_FOLDER = "real_flight_data_1214/wav_files"  # <flight>_trimmed.wav, starts at log time 0
+CLEAN_FOLDER = "real_flight_data_1214/clean_audio_NOT SYNCED!! JUST FOR PPT SLIDES"  # <utterance>.wav
+ACTUATOR_DIR = "real_flight_data_1214/flight_csv_processed"  # <flight>.csv
+STORE_DIR = "dataset_16k"
+
+SAMPLE_RATE = 16000
+ACTUATOR_DECIMATION = 64  # Actuators stored at SAMPLE_RATE / 64 = 250 Hz; segment / hop frames must be multiples
+SEGMENT_SECONDS = 4.0
+SEGMENT_HOP_SECONDS = 2.0
+SHARD_SECONDS = 1800.0  # Recordings are appended to a shard until it holds this much audio
+N_MOTORS = 4
+INDEX_FILE = "index.json"
+SEGMENTS_FILE = "segments.npy"  # int64 [segments, 3]: shard, start frame in shard, recording
+
+
+def clean_reference_for(flight, clean_folder=CLEAN_FOLDER):
+    # "aslan_1_2" (flight 2 of utterance aslan_1) -> "<clean_folder>/aslan_1.wav"
+    utterance = re.sub(r"_\d+$", "", flight)
+    for name in (flight, utterance):
+        path = os.path.join(clean_folder, f"{name}.wav")
+        if os.path.exists(path):
+            return path
+    return None
+
+
+def discover_flights(noisy_folder=NOISY_FOLDER, clean_folder=CLEAN_FOLDER, actuator_dir=ACTUATOR_DIR):
+    """
+    [(flight, noisy wav, clean wav or None, actuator csv or None)] for every synced recording.
+    """
+    flights = []
+    for file_name in sorted(os.listdir(noisy_folder)):
+        if not file_name.endswith(".wav"):
+            continue
+        flight = re.sub(r"_trimmed$", "", os.path.splitext(file_name)[0])
+        csv_file = os.path.join(actuator_dir, f"{flight}.csv")
+        flights.append((flight, os.path.join(noisy_folder, file_name), clean_reference_for(flight, clean_folder),
+                        csv_file if os.path.exists(csv_file) else None))
+    return flights
+
+
+def place_clean(noisy, clean):
+    """
+    Clean track the length of noisy with the reference placed where it correlates best.
+    The references are short, unsynced clips played once during the flight.
+    Returns (track, start sample or None if the reference is longer than the recording).
+    """
+    track = np.zeros_like(noisy)
+    if len(clean) > len(noisy):
+        return track, None
+    start = find_lag(noisy, clean, len(noisy) - len(clean), min_lag=0)
+    track[start:start + len(clean)] = clean
+    return track, start
+
+
+def actuator_track(csv_file, n_frames, sample_rate=SAMPLE_RATE, decimation=ACTUATOR_DECIMATION, n_motors=N_MOTORS):
+    """
+    Actuator outputs interpolated onto the decimated audio grid -> float32 [ceil(n_frames / decimation), n_motors].
+    """
+    n = -(-n_frames // decimation)
+    if csv_file is None:
+        return np.zeros((n, n_motors), dtype=np.float32)
+    t, outputs = load_actuator_outputs(csv_file)
+    grid = np.arange(n) * decimation / sample_rate
+    track = np.zeros((n, n_motors), dtype=np.float32)
+    for m in range(min(n_motors, outputs.shape[1])):
+        track[:, m] = np.interp(grid, t, outputs[:, m])
+    return track
+
+
+def _write_shard(store_dir, shard_id, recordings):
+    """
+    Write one shard: audio_<id>.npy float32 [frames, 2] (noisy, clean interleaved so a segment
+    is one contiguous read) and actuators_<id>.npy float32 [frames / decimation, motors].
+    """
+    audio_file, actuator_file = f"audio_{shard_id:03d}.npy", f"actuators_{shard_id:03d}.npy"
+    frames = sum(len(r["noisy"]) for r in recordings)
+    audio = np.lib.format.open_memmap(os.path.join(store_dir, audio_file), mode="w+", dtype=np.float32,
+                                      shape=(frames, 2))
+    actuators = np.lib.format.open_memmap(os.path.join(store_dir, actuator_file), mode="w+", dtype=np.float32,
+                                          shape=(frames // ACTUATOR_DECIMATION, N_MOTORS))
+    position = 0
+    for r in recordings:
+        n = len(r["noisy"])
+        audio[position:position + n, 0] = r["noisy"]
+        audio[position:position + n, 1] = r["clean"]
+        a = position // ACTUATOR_DECIMATION
+        actuators[a:a + len(r["actuators"])] = r["actuators"][:len(actuators) - a]
+        position += n
+    audio.flush()
+    actuators.flush()
+    return {"audio": audio_file, "actuators": actuator_file, "frames": frames}
+
+
+def build_store(flights, store_dir=STORE_DIR, segment_seconds=SEGMENT_SECONDS, hop_seconds=SEGMENT_HOP_SECONDS,
+                shard_seconds=SHARD_SECONDS):
+    """
+    Pack every flight into sharded .npy files plus index.json / segments.npy.
+    Each recording is padded to a multiple of ACTUATOR_DECIMATION so audio and actuator offsets align.
+    """
+    segment, hop = int(segment_seconds * SAMPLE_RATE), int(hop_seconds * SAMPLE_RATE)
+    # Segment starts are divided by the decimation when actuators are read; they must not round
+    for name, frames in (("segment", segment), ("hop", hop)):
+        if frames % ACTUATOR_DECIMATION:
+            raise ValueError(f"{name} of {frames} frames is not a multiple of ACTUATOR_DECIMATION "
+                             f"({ACTUATOR_DECIMATION} frames = {ACTUATOR_DECIMATION / SAMPLE_RATE * 1000:g} ms)")
+    os.makedirs(store_dir, exist_ok=True)
+    shards, recordings, segments = [], [], []
+    pending, pending_frames = [], 0
+
+    def flush():
+        nonlocal pending, pending_frames
+        if pending:
+            shards.append(_write_shard(store_dir, len(shards), pending))
+            pending, pending_frames = [], 0
+
+    for flight, noisy_path, clean_path, csv_file in flights:
+        noisy = load_mono(noisy_path, SAMPLE_RATE)[0]
+        noisy = np.pad(noisy, (0, -len(noisy) % ACTUATOR_DECIMATION))
+        if clean_path:
+            clean, clean_start = place_clean(noisy, load_mono(clean_path, SAMPLE_RATE)[0])
+        else:
+            clean, clean_start = np.zeros_like(noisy), None
+        if pending_frames and pending_frames + len(noisy) > shard_seconds * SAMPLE_RATE:
+            flush()
+
+        start = pending_frames
+        record = {
+            "name": flight, "shard": len(shards), "start": start, "frames": len(noisy),
+            "noisy": noisy_path, "clean": clean_path, "actuators": csv_file,
+            "clean_start": clean_start,  # Sample where the unsynced reference was placed
+        }
+        recordings.append(record)
+        for offset in range(0, len(noisy) - segment + 1, hop):
+            segments.append((len(shards), start + offset, len(recordings) - 1))
+        pending.append({"noisy": noisy, "clean": clean, "actuators": actuator_track(csv_file, len(noisy))})
+        pending_frames += len(noisy)
+        print(f"{flight}: {len(noisy) / SAMPLE_RATE:.1f} s -> shard {len(shards)}"
+              + (f", clean reference at {clean_start / SAMPLE_RATE:.2f} s" if clean_start is not None else ""))
+    flush()
+
+    np.save(os.path.join(store_dir, SEGMENTS_FILE), np.array(segments, dtype=np.int64).reshape(-1, 3))
+    index = {
+        "sample_rate": SAMPLE_RATE, "actuator_decimation": ACTUATOR_DECIMATION, "n_motors": N_MOTORS,
+        "segment_frames": segment, "hop_frames": hop, "channels": ["noisy", "clean"],
+        "shards": shards, "recordings": recordings,
+    }
+    with open(os.path.join(store_dir, INDEX_FILE), "w") as f:
+        json.dump(index, f, indent=1)
+    print(f"Wrote {len(recordings)} recordings, {len(segments)} segments in {len(shards)} shard(s) to {store_dir}")
+    return index
+
+
+class _FlightSegments:
+    """
+    Random access to fixed-length segments of a store written by build_store().
+    A map-style dataset (__len__ / __getitem__) for torch's DataLoader; torch is only imported
+    once FlightSegmentDataset is looked up, so building the store and the CLI start without it.
+    Shards are memory-mapped copy-on-write, so each item is a view of the page cache
+    (no read or copy until the tensor is used) and nothing is written back to disk.
+    Items: {"noisy": [T], "clean": [T], "actuators": [T / decimation, motors], "recording": int}.
+    """
+
+    def __init__(self, store_dir=STORE_DIR, require_clean=False):
+        with open(os.path.join(store_dir, INDEX_FILE)) as f:
+            self.index = json.load(f)
+        self.store_dir = store_dir
+        self.segment = self.index["segment_frames"]
+        self.decimation = self.index["actuator_decimation"]
+        self.segments = np.load(os.path.join(store_dir, SEGMENTS_FILE))
+        if require_clean:
+            with_clean = [i for i, r in enumerate(self.index["recordings"]) if r["clean_start"] is not None]
+            self.segments = self.segments[np.isin(self.segments[:, 2], with_clean)]
+        self._shards = None  # Opened lazily so every DataLoader worker maps its own files
+
+    def _open(self):
+        if self._shards is None:
+            self._shards = [(np.load(os.path.join(self.store_dir, s["audio"]), mmap_mode="c"),
+                             np.load(os.path.join(self.store_dir, s["actuators"]), mmap_mode="c"))
+                            for s in self.index["shards"]]
+        return self._shards
+
+    def __len__(self):
+        return len(self.segments)
+
+    def __getitem__(self, i):
+        import torch
+        shard, start, recording = (int(v) for v in self.segments[i])
+        audio, actuators = self._open()[shard]
+        pair = torch.from_numpy(audio[start:start + self.segment])  # [T, 2] view of the mapped file
+        a = start // self.decimation
+        return {
+            "noisy": pair[:, 0],
+            "clean": pair[:, 1],
+            "actuators": torch.from_numpy(actuators[a:a + self.segment // self.decimation]),
+            "recording": recording,
+        }
+
+
+def __getattr__(name):
+    """
+    FlightSegmentDataset: _FlightSegments as a torch.utils.data.Dataset (a plain class without torch).
+    Created on first access, so importing this module does not load torch.
+    """
+    if name != "FlightSegmentDataset":
+        raise AttributeError(f"module {__name__!r} has no attribute {name!r}")
+    try:
+        from torch.utils.data import Dataset
+    except ImportError:
+        Dataset = object
+    cls = type(name, (_FlightSegments, Dataset), {"__module__": __name__, "__doc__": _FlightSegments.__doc__})
+    globals()[name] = cls  # One class per process, so instances pickle to DataLoader workers
+    return cls
+
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description="Pack synced flights into a memory-mapped training store")
+    parser.add_argument("--noisy", default=NOISY_FOLDER)
+    parser.add_argument("--clean", default=CLEAN_FOLDER)
+    parser.add_argument("--actuators", default=ACTUATOR_DIR)
+    parser.add_argument("-o", "--output", default=STORE_DIR)
+    parser.add_argument("--segment-seconds", type=float, default=SEGMENT_SECONDS)
+    parser.add_argument("--hop-seconds", type=float, default=SEGMENT_HOP_SECONDS)
+    parser.add_argument("--shard-seconds", type=float, default=SHARD_SECONDS)
+    args = parser.parse_args()
+
+    build_store(discover_flights(args.noisy, args.clean, args.actuators), args.output,
+                args.segment_seconds, args.hop_seconds, args.shard_seconds)
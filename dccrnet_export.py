@@ -0,0 +1,302 @@
+import os
+import json
+import time
+import argparse
+import numpy as np
+import pandas as pd
+from audio_io import load_mono
+from chunked_inference import process_chunked
+from pipeline_cache import Manifest, run_cached, MANIFEST_FILE
+from telemetry import stage, file_bytes
+
+# Self-contained CPU artifacts of the retrained DCCRNet: no Hugging Face hub, no asteroid at inference time
+EXPORT_DIR = "exported_models"
+MODEL_PATH = "dccrnet_best_model.pth"  # Same weights as asteroid_denoise_retrained.BEST_MODEL_PATH
+SAMPLE_RATE = 16000
+SEGMENT_SECONDS = 5.0  # Traced input length; inference always runs on overlap-add chunks of this length
+EXPORT_VERSION = 1  # Bump when the export changes so cached artifacts are rebuilt
+FORMATS = ("torchscript", "onnx")
+EXTENSIONS = {"torchscript": ".pt", "onnx": ".onnx"}
+ONNX_OPSET = 17
+CHECK_BATCH = 3  # Exports are verified against eager on this batch size (traced on 2) to detect a baked-in batch
+CHECK_TOLERANCE = 1e-3  # Max abs difference to eager for the fp32 artifacts
+NUM_THREADS = None  # Intra-op threads for CPU inference; None keeps the library default
+
+# Benchmark defaults
+BENCH_INPUT = "testset_1216/testset_noisy"
+BENCH_REFERENCE = "testset_1216/testset_clean"
+BENCH_FILES = 10
+BENCH_RESULTS = "dccrnet_export_benchmark.csv"
+
+
+def artifact_path(export_format, quantize, export_dir=EXPORT_DIR):
+    return os.path.join(export_dir, f"dccrnet_{'int8' if quantize else 'fp32'}{EXTENSIONS[export_format]}")
+
+
+def metadata_path(path):
+    return f"{os.path.splitext(path)[0]}.json"
+
+
+def enhancer(model):
+    """
+    [B, T] -> [B, T] wrapper of the asteroid model (same call as AsteroidRetrainedBackend.process_batch).
+    """
+    import torch
+
+    class Enhancer(torch.nn.Module):
+        def __init__(self, model):
+            super().__init__()
+            self.model = model
+
+        def forward(self, x):
+            return self.model(x.unsqueeze(1)).reshape(x.shape[0], -1)
+
+    return Enhancer(model).eval()
+
+
+def quantize_dynamic(module):
+    """
+    Dynamic int8 quantisation of the recurrent / linear layers (weights int8, activations quantised
+    on the fly). The complex convolutions of DCCRNet stay fp32: dynamic quantisation does not cover conv.
+    """
+    import torch
+    return torch.ao.quantization.quantize_dynamic(module, {torch.nn.LSTM, torch.nn.GRU, torch.nn.Linear},
+                                                  dtype=torch.qint8)
+
+
+def export_torchscript(module, path, example):
+    import torch
+    with torch.no_grad():
+        traced = torch.jit.trace(module, example, check_trace=False)
+    traced = torch.jit.freeze(traced.eval())
+    traced.save(path)
+
+
+def export_onnx(module, path, example, quantize=False):
+    import torch
+    fp32_path = f"{os.path.splitext(path)[0]}.fp32.onnx" if quantize else path
+    with torch.no_grad():
+        torch.onnx.export(module, (example,), fp32_path, input_names=["noisy"], output_names=["enhanced"],
+                          dynamic_axes={"noisy": {0: "batch"}, "enhanced": {0: "batch"}},
+                          opset_version=ONNX_OPSET, dynamo=False)
+    if quantize:
+        from onnxruntime.quantization import quantize_dynamic as ort_quantize_dynamic, QuantType
+        ort_quantize_dynamic(fp32_path, path, weight_type=QuantType.QInt8)
+        os.remove(fp32_path)
+
+
+def export_model(model, export_format, path, quantize=False, segment_seconds=SEGMENT_SECONDS,
+                 sample_rate=SAMPLE_RATE):
+    """
+    Trace / export the eager model to path and write <path>.json with what the runtime needs
+    (rate, segment length, whether the batch dimension is dynamic). The artifact is checked
+    against eager on a batch size it was not traced with; if the batch was baked in, it is run row by row.
+    """
+    import torch
+    segment_samples = int(round(segment_seconds * sample_rate))
+    module = enhancer(model)
+    example = torch.randn(2, segment_samples) * 0.1
+    os.makedirs(os.path.dirname(path) or ".", exist_ok=True)
+    with stage("export", format=export_format, quantize=quantize) as s:
+        if export_format == "torchscript":
+            export_torchscript(quantize_dynamic(module) if quantize else module, path, example)
+        elif export_format == "onnx":
+            export_onnx(module, path, example, quantize)
+        else:
+            raise ValueError(f"Unknown format '{export_format}'. Available: {', '.join(FORMATS)}")
+        s.count(bytes=file_bytes(path))
+
+    meta = {"format": export_format, "quantize": quantize, "sample_rate": sample_rate,
+            "segment_samples": segment_samples, "dynamic_batch": True, "torch": torch.__version__,
+            "version": EXPORT_VERSION}
+    with open(metadata_path(path), "w") as f:
+        json.dump(meta, f, indent=1)
+
+    # Verify on an unseen batch size
+    check = torch.randn(CHECK_BATCH, segment_samples) * 0.1
+    with torch.no_grad():
+        expected = module(check).numpy()
+    exported = load_exported(path)
+    try:
+        error = float(np.abs(exported(check.numpy()) - expected).max())
+    except Exception as e:  # Batch size baked into the graph
+        print(f"{path}: batched call failed ({type(e).__name__}), running rows one at a time")
+        error = None
+    if error is None or (not quantize and error > CHECK_TOLERANCE):
+        meta["dynamic_batch"] = False
+        with open(metadata_path(path), "w") as f:
+            json.dump(meta, f, indent=1)
+        error = float(np.abs(load_exported(path)(check.numpy()) - expected).max())
+    print(f"Exported {path} ({file_bytes(path) / 1e6:.1f} MB, max |exported - eager| = {error:.2e})")
+    return path
+
+
+class ExportedModel:
+    """
+    An exported DCCRNet artifact loaded for CPU inference: float32 [B, segment_samples] in and out.
+    Needs only torch (TorchScript) or onnxruntime (ONNX), plus the .json written next to the artifact.
+    """
+
+    def __init__(self, path, num_threads=NUM_THREADS):
+        with open(metadata_path(path)) as f:
+            self.meta = json.load(f)
+        self.path = path
+        self.sample_rate = self.meta["sample_rate"]
+        self.segment_samples = self.meta["segment_samples"]
+        if self.meta["format"] == "torchscript":
+            import torch
+            if num_threads:
+                torch.set_num_threads(num_threads)
+            self.model = torch.jit.load(path, map_location="cpu")
+            self.model.eval()
+            self.run = self._run_torchscript
+        else:
+            import onnxruntime
+            options = onnxruntime.SessionOptions()
+            if num_threads:
+                options.intra_op_num_threads = num_threads
+            self.model = onnxruntime.InferenceSession(path, options, providers=["CPUExecutionProvider"])
+            self.run = self._run_onnx
+
+    def _run_torchscript(self, batch):
+        import torch
+        with torch.no_grad():
+            return self.model(torch.from_numpy(batch)).numpy()
+
+    def _run_onnx(self, batch):
+        return self.model.run(None, {"noisy": batch})[0]
+
+    def __call__(self, batch):
+        batch = np.ascontiguousarray(batch, dtype=np.float32)
+        if batch.shape[1] != self.segment_samples:
+            raise ValueError(f"{self.path} was exported for {self.segment_samples}-sample segments, "
+                             f"got {batch.shape[1]}")
+        if self.meta["dynamic_batch"]:
+            return self.run(batch)
+        return np.concatenate([self.run(batch[i:i + 1]) for i in range(len(batch))])
+
+
+def load_exported(path, num_threads=NUM_THREADS):
+    return ExportedModel(path, num_threads)
+
+
+def load_eager(model_path=MODEL_PATH):
+    from asteroid_denoise_retrained import load_model  # Needs asteroid and the hub cache
+    return load_model(model_path)
+
+
+def export_all(formats=FORMATS, quantize=(False, True), model_path=MODEL_PATH, export_dir=EXPORT_DIR,
+               segment_seconds=SEGMENT_SECONDS, manifest=None):
+    """
+    Export every requested format / precision; artifacts whose weights and settings are unchanged are skipped.
+    """
+    manifest = manifest or Manifest()
+    model = None
+    paths = []
+    for export_format in formats:
+        for q in quantize:
+            path = artifact_path(export_format, q, export_dir)
+            params = {"format": export_format, "quantize": q, "segment_seconds": segment_seconds}
+
+            def build(export_format=export_format, q=q, path=path):
+                nonlocal model
+                model = model or load_eager(model_path)
+                export_model(model, export_format, path, q, segment_seconds)
+
+            try:
+                run_cached(manifest, "dccrnet_export", [model_path], [path, metadata_path(path)], build, params,
+                           EXPORT_VERSION)
+                paths.append(path)
+            except Exception as e:
+                print(f"FAILED {path}: {type(e).__name__}: {e}")
+    manifest.save()
+    return paths
+
+
+def benchmark(artifacts, input_folder=BENCH_INPUT, reference_folder=BENCH_REFERENCE, limit=BENCH_FILES,
+              model_path=MODEL_PATH, num_threads=NUM_THREADS):
+    """
+    Real-time factor and SI-SDR of every artifact against the eager fp32 model on the same chunks.
+    Reports SI-SDR to the eager output (fidelity of the export) and, where a clean file with the same
+    name exists, to the clean reference (does quantisation cost enhancement quality).
+    """
+    import torch
+    from evaluate import si_sdr
+    if num_threads:
+        torch.set_num_threads(num_threads)
+    files = sorted(f for f in os.listdir(input_folder) if f.endswith((".wav", ".flac")))[:limit]
+    signals = {f: load_mono(os.path.join(input_folder, f), SAMPLE_RATE)[0] for f in files}
+    references = {f: load_mono(os.path.join(reference_folder, f), SAMPLE_RATE)[0] for f in files
+                  if reference_folder and os.path.exists(os.path.join(reference_folder, f))}
+
+    eager = enhancer(load_eager(model_path))
+
+    def run_eager(batch):
+        with torch.no_grad():
+            return eager(torch.from_numpy(batch)).numpy()
+
+    variants = {"eager": (run_eager, os.path.getsize(model_path))}
+    for path in artifacts:
+        variants[os.path.basename(path)] = (load_exported(path, num_threads), os.path.getsize(path))
+
+    rows, eager_outputs = [], {}
+    for name, (fn, size) in variants.items():
+        audio_seconds = compute_seconds = 0.0
+        fidelity, quality = [], []
+        for f in files:
+            noisy = np.array(signals[f])
+            with stage("forward", backend=f"dccrnet:{name}", file=f) as s:
+                enhanced, stats = process_chunked(fn, noisy, SAMPLE_RATE, SEGMENT_SECONDS, SEGMENT_SECONDS / 2)
+                s.count(samples=len(noisy))
+            audio_seconds += stats["audio_seconds"]
+            compute_seconds += stats["compute_seconds"]
+            if name == "eager":
+                eager_outputs[f] = enhanced
+            else:
+                fidelity.append(si_sdr(enhanced, eager_outputs[f]))
+            if f in references:
+                n = min(len(enhanced), len(references[f]))
+                quality.append(si_sdr(enhanced[:n], references[f][:n]))
+        rows.append({"model": name, "MB": size / 1e6, "rtf": compute_seconds / max(audio_seconds, 1e-9),
+                     "speedup": None, "si_sdr_vs_eager": np.mean(fidelity) if fidelity else None,
+                     "si_sdr_vs_clean": np.mean(quality) if quality else None})
+        print(f"{name}: RTF {rows[-1]['rtf']:.3f} over {audio_seconds:.0f} s of audio")
+
+    df = pd.DataFrame(rows).set_index("model")
+    df["speedup"] = df.loc["eager", "rtf"] / df["rtf"]
+    return df
+
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description="Export the retrained DCCRNet to TorchScript / ONNX "
+                                                 "(optionally int8) and benchmark it against eager")
+    sub = parser.add_subparsers(dest="command", required=True)
+    p_export = sub.add_parser("export", help="Write self-contained artifacts to the export folder")
+    p_export.add_argument("-f", "--formats", nargs="+", default=list(FORMATS), choices=FORMATS)
+    p_export.add_argument("--precision", nargs="+", default=["fp32", "int8"], choices=["fp32", "int8"])
+    p_export.add_argument("-m", "--model", default=MODEL_PATH)
+    p_export.add_argument("-o", "--export-dir", default=EXPORT_DIR)
+    p_export.add_argument("--segment-seconds", type=float, default=SEGMENT_SECONDS)
+    p_export.add_argument("--manifest", default=MANIFEST_FILE)
+    p_bench = sub.add_parser("benchmark", help="RTF and SI-SDR of exported artifacts vs the eager model")
+    p_bench.add_argument("artifacts", nargs="*", help=f"Default: every artifact in {EXPORT_DIR}")
+    p_bench.add_argument("-i", "--input", default=BENCH_INPUT)
+    p_bench.add_argument("-r", "--reference", default=BENCH_REFERENCE)
+    p_bench.add_argument("-n", "--limit", type=int, default=BENCH_FILES)
+    p_bench.add_argument("-m", "--model", default=MODEL_PATH)
+    p_bench.add_argument("-t", "--threads", type=int, default=NUM_THREADS)
+    p_bench.add_argument("--output", default=BENCH_RESULTS)
+    args = parser.parse_args()
+
+    if args.command == "export":
+        start = time.perf_counter()
+        paths = export_all(args.formats, [p == "int8" for p in args.precision], args.model, args.export_dir,
+                           args.segment_seconds, Manifest(args.manifest))
+        print(f"{len(paths)} artifact(s) ready in {time.perf_counter() - start:.1f} s")
+    else:
+        artifacts = args.artifacts or sorted(
+            os.path.join(EXPORT_DIR, f) for f in os.listdir(EXPORT_DIR) if f.endswith(tuple(EXTENSIONS.values())))
+        results = benchmark(artifacts, args.input, args.reference, args.limit, args.model, args.threads)
+        print(results.to_string(float_format=lambda x: f"{x:.3f}"))
+        results.to_csv(args.output)
+        print(f"Saved {args.output}")
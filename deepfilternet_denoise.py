@@ -1,52 +1,74 @@
 import os
-from pydub import AudioSegment
-import torchaudio
-from df import enhance, init_df  # Correct module for DeepFilterNet
+from functools import lru_cache
+import numpy as np
+from audio_io import load_channels
+from pipeline_cache import Manifest, run_cached
+from telemetry import stage, file_bytes
 
-# Initialize DeepFilterNet
-model, df_state, _ = init_df()  # Load the default model
-print("DeepFilterNet initialized successfully.")
+# Initialize DeepFilterNet (on first use, so importing this module stays cheap)
+@lru_cache(maxsize=None)
+def load_deepfilternet():
+    from df import init_df  # Correct module for DeepFilterNet
+    model, df_state, _ = init_df(MODEL_NAME)
+    print("DeepFilterNet initialized successfully.")
+    return model, df_state
 
 # Define folder paths
 INPUT_M4A_FOLDER = "real_flight_data_1214/audio_synced"
 WAV_FOLDER = "testset_1216/testset_noisy"
 DENOISED_FOLDER = "testset_1216/deepfilternet_denoised"
+MODEL_NAME = "DeepFilterNet3"  # Pretrained model loaded by init_df
+DENOISE_VERSION = 1  # Bump when the output changes so cached results are rebuilt
+CONVERT_M4A = False  # WAV_FOLDER currently holds the test set, not converted flight audio
+CHANNEL_MODE = "mono"  # Same modes as the other denoisers: "keep" processes [channels, time], "beamform"
 
 os.makedirs(WAV_FOLDER, exist_ok=True)
 os.makedirs(DENOISED_FOLDER, exist_ok=True)
 
 # Step 1: Convert .m4a to .wav
 def convert_m4a_to_wav(input_file, output_file):
-    try:
+    from pydub import AudioSegment
+    with stage("m4a_to_wav", file=input_file) as s:
         audio = AudioSegment.from_file(input_file, format="m4a")
         audio.export(output_file, format="wav")
-        print(f"Converted {input_file} to {output_file}")
-    except Exception as e:
-        print(f"Error converting {input_file}: {e}")
+        s.count(bytes=file_bytes(input_file), samples=int(audio.frame_count()) * audio.channels)
+    print(f"Converted {input_file} to {output_file}")
 
 # Step 2: Apply DeepFilterNet
 def denoise_with_deepfilternet(input_wav, output_wav):
-    try:
-        # Load the audio using torchaudio
-        noisy_audio, sr = torchaudio.load(input_wav)
+    import torch
+    import torchaudio
+    from df import enhance
+    model, df_state = load_deepfilternet()
+    # DeepFilterNet runs at 48 kHz; load at the model rate (cached on disk)
+    audio, sr = load_channels(input_wav, df_state.sr(), CHANNEL_MODE)
+    noisy_audio = torch.from_numpy(np.ascontiguousarray(audio.T))  # [channels, time]
 
-        # Enhance audio using DeepFilterNet
+    # Enhance audio using DeepFilterNet
+    with stage("forward", backend="deepfilternet", file=input_wav) as s:
         enhanced_audio = enhance(model, df_state, noisy_audio)
+        s.count(samples=noisy_audio.numel())
 
-        # Save the enhanced audio back to a .wav file
+    # Save the enhanced audio back to a .wav file
+    with stage("write", file=output_wav) as s:
         torchaudio.save(output_wav, enhanced_audio, sample_rate=sr)
-        print(f"DeepFilterNet denoised audio saved to {output_wav}")
-    except Exception as e:
-        print(f"Error processing {input_wav}: {e}")
+        s.count(samples=enhanced_audio.numel(), bytes=file_bytes(output_wav))
+    print(f"DeepFilterNet denoised audio saved to {output_wav}")
 
 # Step 3: Process all .m4a files
 def process_audio_files(m4a_folder, wav_folder, denoised_folder):
-    # Step 3.1: Convert all .m4a files to .wav
-    for file_name in os.listdir(m4a_folder):
-        if file_name.endswith(".m4a"):
-            m4a_path = os.path.join(m4a_folder, file_name)
-            wav_path = os.path.join(wav_folder, file_name.replace(".m4a", ".wav"))
-            #convert_m4a_to_wav(m4a_path, wav_path)
+    # Step 3.1: Convert all .m4a files to .wav (only when CONVERT_M4A is set; unchanged files are skipped)
+    manifest = Manifest()
+    if CONVERT_M4A:
+        for file_name in os.listdir(m4a_folder):
+            if file_name.endswith(".m4a"):
+                m4a_path = os.path.join(m4a_folder, file_name)
+                wav_path = os.path.join(wav_folder, file_name.replace(".m4a", ".wav"))
+                try:
+                    run_cached(manifest, "m4a_to_wav", [m4a_path], [wav_path],
+                               lambda: convert_m4a_to_wav(m4a_path, wav_path))
+                except Exception as e:
+                    print(f"Error converting {m4a_path}: {e}")
 
     # Step 3.2: Apply DeepFilterNet denoising
     for file_name in os.listdir(wav_folder):
@@ -54,7 +76,13 @@ def process_audio_files(m4a_folder, wav_folder, denoised_folder):
             input_path = os.path.join(wav_folder, file_name)
             output_path = os.path.join(denoised_folder, file_name.replace(".wav", "_denoised.wav"))
             print(f"Processing {file_name}...")
-            denoise_with_deepfilternet(input_path, output_path)
+            try:
+                run_cached(manifest, "deepfilternet", [input_path], [output_path],
+                           lambda: denoise_with_deepfilternet(input_path, output_path),
+                           {"model": MODEL_NAME, "channel_mode": CHANNEL_MODE}, DENOISE_VERSION)
+            except Exception as e:
+                print(f"Error processing {input_path}: {e}")
+    manifest.save()
 
 # Main process
 if __name__ == "__main__":
@@ -0,0 +1,79 @@
+import os
+import numpy as np
+import soundfile as sf
+from audio_io import resample
+from telemetry import stage, file_bytes
+
+# Denoising using demucs (in-process: the model is loaded once for all files)
+
+# Step 1: Define input and output folders
+INPUT_FOLDER = "testset_1216/testset_noisy"
+OUTPUT_FOLDER = "testset_1216/demucs_denoised"
+MODEL_NAME = "htdemucs"
+BATCH_SIZE = 4  # Files per apply_model call
+SEGMENT_OVERLAP = 0.25  # Overlap between demucs' internal chunks
+
+
+# Step 2: Load the model once
+def load_demucs(model_name=MODEL_NAME):
+    from demucs.pretrained import get_model
+    model = get_model(model_name)
+    model.eval()
+    return model
+
+
+def separate_vocals(model, mix, lengths=None):
+    """
+    mix: float32 [batch, time] mono at model.samplerate, rows zero-padded after lengths[i] samples
+    (default: no padding). Returns the vocal stem as [batch, time], mixed down to mono.
+    """
+    import torch
+    from demucs.apply import apply_model
+    wav = torch.from_numpy(np.ascontiguousarray(mix, dtype=np.float32))
+    lengths = torch.as_tensor(np.full(len(mix), mix.shape[1]) if lengths is None else lengths)
+    valid = (torch.arange(wav.shape[1])[None] < lengths[:, None]).to(wav.dtype)
+
+    # Same per-track normalisation as the demucs CLI, over each row's own samples only
+    count = lengths.to(wav.dtype)[:, None]
+    mean = (wav * valid).sum(dim=1, keepdim=True) / count
+    std = torch.sqrt((((wav - mean) * valid) ** 2).sum(dim=1, keepdim=True) / (count - 1).clamp(min=1)) + 1e-8
+    wav = ((wav - mean) / std * valid)[:, None].expand(-1, model.audio_channels, -1)
+    with torch.no_grad(), stage("forward", backend="demucs", batch=len(mix)) as s:
+        sources = apply_model(model, wav, device="cpu", split=True, overlap=SEGMENT_OVERLAP)
+        s.count(samples=np.size(mix))
+    vocals = sources[:, model.sources.index("vocals")] * std[:, None] + mean[:, None]
+    return vocals.mean(dim=1).numpy()
+
+
+# Step 3: Run Demucs on each file, writing only the vocal stem
+def denoise_with_demucs(input_folder, output_folder, model=None, batch_size=BATCH_SIZE):
+    model = model or load_demucs()
+    os.makedirs(output_folder, exist_ok=True)
+    # Sorted by length, so each batch pads its rows to a similar length
+    files = sorted((f for f in os.listdir(input_folder) if f.endswith(".wav")),
+                   key=lambda f: (sf.info(os.path.join(input_folder, f)).frames, f))
+
+    for start in range(0, len(files), batch_size):
+        names = files[start:start + batch_size]
+        signals = []
+        for file_name in names:
+            data, sr = sf.read(os.path.join(input_folder, file_name), dtype="float32", always_2d=True)
+            signals.append(resample(data.mean(axis=1), sr, model.samplerate))
+
+        # Pad to a common length so the batch runs in one apply_model call
+        mix = np.zeros((len(signals), max(len(x) for x in signals)), dtype=np.float32)
+        for i, x in enumerate(signals):
+            mix[i, :len(x)] = x
+        vocals = separate_vocals(model, mix, [len(x) for x in signals])
+
+        for file_name, x, enhanced in zip(names, signals, vocals):
+            output_path = os.path.join(output_folder, file_name.replace(".wav", "_denoised.wav"))
+            with stage("write", file=output_path) as s:
+                sf.write(output_path, enhanced[:len(x)], model.samplerate)
+                s.count(samples=len(x), bytes=file_bytes(output_path))
+            print(f"Denoised {file_name} using Demucs. Output saved to {output_path}")
+
+
+# Main process
+if __name__ == "__main__":
+    denoise_with_demucs(INPUT_FOLDER, OUTPUT_FOLDER)
@@ -0,0 +1,670 @@
+import os
+import time
+import argparse
+import threading
+import contextlib
+from concurrent.futures import ThreadPoolExecutor
+import numpy as np
+import soundfile as sf
+from audio_io import load_mono, load_channels, audio_info, check_rate, CHANNEL_MODES, BEAM_REFERENCE
+from chunked_inference import process_chunked, BATCH_CHUNKS
+from pipeline_cache import Manifest, MANIFEST_FILE
+from telemetry import stage, file_bytes
+
+# Defaults (same folders as the individual denoise scripts)
+INPUT_FOLDER = "testset_1216/testset_noisy"
+OUTPUT_ROOT = "testset_1216"  # Each backend writes to OUTPUT_ROOT/<backend>_denoised
+INPUT_EXTENSIONS = (".wav", ".flac", ".npy")
+NUM_WORKERS = 2
+BATCH_MEMORY_MB = None  # Set (e.g. 2048) to run batch-capable backends on padded batches under this cap
+LENGTH_TOLERANCE = 1.25  # Longest file in a batch may be at most this many times the shortest
+CHUNK_SECONDS = None  # Override every backend's chunk length (0 disables chunking)
+RESAMPLE_CACHE_SUBDIR = ".resample_cache"  # Inputs converted to each model rate, kept in the output root
+EXPORTED_ARTIFACT = "exported_models/dccrnet_int8.pt"  # Artifact of the asteroid_exported backend (dccrnet_export.py)
+CHANNEL_MODE = "mono"  # "keep": denoise every mic channel (channels share a forward pass), "beamform": delay-and-sum
+
+BACKENDS = {}
+
+
+def register_backend(cls):
+    """
+    Class decorator adding a backend to the registry under cls.name.
+    """
+    BACKENDS[cls.name] = cls
+    return cls
+
+
+class DenoiserBackend:
+    """
+    A denoising model. Subclasses implement load() (build the model, called once)
+    and process() (mono float32 at self.sample_rate in, enhanced mono float32 out).
+    Backends that can run several signals in one forward pass set supports_batch
+    and override process_batch().
+    """
+    name = None
+    sample_rate = 16000  # Rate the model expects; None accepts any rate
+    thread_safe = True  # False serialises process() calls across worker threads
+    supports_batch = False
+    memory_factor = 16  # Rough peak inference memory per byte of input, used to size batches
+    chunk_seconds = None  # Overlap-add chunk length for long inputs; None processes the whole signal
+    hop_seconds = None  # Defaults to half a chunk
+    fixed_chunk = False  # True: the model only takes chunk_seconds-long input, so --chunk-seconds is ignored
+    uses_source = False  # True: process_source() also gets the input path (e.g. to find the flight log)
+    version = 1  # Bump when the backend's output changes so cached results are rebuilt
+
+    def __init__(self):
+        self.model = None
+        self.lock = threading.Lock()
+        self.load_seconds = 0.0
+
+    @property
+    def output_folder(self):
+        return f"{self.name}_denoised"
+
+    def load(self):
+        pass
+
+    def cache_params(self):
+        """
+        Everything besides the input audio that determines the output (see pipeline_cache).
+        """
+        return {"name": self.name, "sample_rate": self.sample_rate, "chunk_seconds": self.chunk_seconds,
+                "hop_seconds": self.hop_seconds, "pretrained": getattr(self, "pretrained", None)}
+
+    def cache_inputs(self, source):
+        """
+        Files other than the input audio whose content affects the output (weights, flight logs).
+        """
+        return []
+
+    def process(self, audio, sample_rate):
+        raise NotImplementedError
+
+    def process_batch(self, batch, lengths, sample_rate):
+        """
+        batch: zero-padded float32 [B, T]; lengths: valid samples per row. Returns [B, T].
+        """
+        out = np.zeros_like(batch)
+        for i, n in enumerate(lengths):
+            out[i, :n] = self.process(batch[i, :n], sample_rate)
+        return out
+
+    def process_source(self, source, audio, sample_rate):
+        return self.process(audio, sample_rate)
+
+    def _guard(self):
+        return contextlib.nullcontext() if self.thread_safe else self.lock
+
+    def check_rate(self, sample_rate):
+        check_rate(sample_rate, self.sample_rate, f"Backend '{self.name}'")
+
+    def _forward(self, samples):
+        return stage("forward", backend=self.name, sample_rate=self.sample_rate).count(samples=samples)
+
+    def __call__(self, audio, sample_rate):
+        self.check_rate(sample_rate)
+        with self._guard(), self._forward(len(audio)):
+            return self.process(audio, sample_rate)
+
+    def run_batch(self, batch, lengths, sample_rate):
+        self.check_rate(sample_rate)
+        with self._guard(), self._forward(int(np.sum(lengths))):
+            return self.process_batch(batch, lengths, sample_rate)
+
+    def run_source(self, source, audio, sample_rate):
+        self.check_rate(sample_rate)
+        with self._guard(), self._forward(len(audio)).tag(file=source):
+            return self.process_source(source, audio, sample_rate)
+
+
+def pad_batch(signals):
+    """
+    Stack 1-D signals into a zero-padded float32 [B, T] array. Returns (batch, lengths).
+    """
+    lengths = np.array([len(x) for x in signals])
+    batch = np.zeros((len(signals), lengths.max()), dtype=np.float32)
+    for i, x in enumerate(signals):
+        batch[i, :len(x)] = x
+    return batch, lengths
+
+
+def plan_batches(lengths, max_batch_bytes, bytes_per_sample=4 * 16, length_tolerance=LENGTH_TOLERANCE):
+    """
+    Group indices of similar length so that B * longest * bytes_per_sample stays under max_batch_bytes.
+    A signal that alone exceeds the cap still gets a batch of its own.
+    """
+    batches, current = [], []
+    for i in np.argsort(lengths, kind="stable"):
+        if current:
+            longest, shortest = lengths[i], lengths[current[0]]
+            if ((len(current) + 1) * longest * bytes_per_sample > max_batch_bytes
+                    or longest > shortest * length_tolerance):
+                batches.append(current)
+                current = []
+        current.append(int(i))
+    if current:
+        batches.append(current)
+    return batches
+
+
+@register_backend
+class NoiseReduceBackend(DenoiserBackend):
+    name = "noisereduce"
+    sample_rate = None
+
+    def load(self):
+        import noisereduce
+        self.model = noisereduce
+
+    def process(self, audio, sample_rate):
+        return self.model.reduce_noise(y=audio, y_noise=None, sr=sample_rate)
+
+
+@register_backend
+class RpmNotchBackend(DenoiserBackend):
+    name = "rpm_notch"
+    sample_rate = 16000  # Harmonics up to a few kHz; 16 kHz keeps the STFT cheap
+    uses_source = True
+    actuator_dir = None  # flight_csv_processed folder; None uses rpm_denoise.ACTUATOR_DIR
+
+    def load(self):
+        import rpm_denoise
+        self.model = rpm_denoise
+
+    def cache_params(self):
+        import rpm_denoise
+        settings = {k: v for k, v in vars(rpm_denoise).items()
+                    if k.isupper() and not k.endswith(("_FOLDER", "_DIR"))}
+        return {**super().cache_params(), **settings}
+
+    def actuator_csv(self, source):
+        import rpm_denoise
+        return rpm_denoise.actuator_csv_for(source, self.actuator_dir or rpm_denoise.ACTUATOR_DIR)
+
+    def cache_inputs(self, source):
+        actuator_csv = self.actuator_csv(source)
+        return [actuator_csv] if actuator_csv else []
+
+    def process_source(self, source, audio, sample_rate):
+        actuator_csv = self.actuator_csv(source)
+        if actuator_csv is None:
+            raise FileNotFoundError(f"No actuator CSV for {source} in {self.actuator_dir or self.model.ACTUATOR_DIR}")
+        t, outputs = self.model.load_actuator_outputs(actuator_csv)
+        return self.model.denoise_rpm(audio, sample_rate, t, outputs)[0]
+
+
+@register_backend
+class AsteroidBackend(DenoiserBackend):
+    name = "asteroid"
+    pretrained = "JorisCos/DCCRNet_Libri1Mix_enhsingle_16k"
+    supports_batch = True
+    chunk_seconds = 8.0
+
+    def load(self):
+        from asteroid.models import BaseModel
+        self.model = BaseModel.from_pretrained(self.pretrained)
+        self.model.eval()
+
+    def process(self, audio, sample_rate):
+        return self.process_batch(np.asarray(audio, dtype=np.float32)[None], [len(audio)], sample_rate)[0]
+
+    def process_batch(self, batch, lengths, sample_rate):
+        import torch
+        with torch.no_grad():
+            # separate() returns [batch, n_src, time]; padding only affects samples past each length
+            enhanced = self.model.separate(torch.from_numpy(np.ascontiguousarray(batch)))
+        return enhanced[:, 0].cpu().numpy()
+
+
+@register_backend
+class AsteroidRetrainedBackend(AsteroidBackend):
+    name = "asteroid_retrained"
+    model_path = "dccrnet_best_model.pth"
+    chunk_seconds = 5.0  # Segment length used in asteroid_denoise_retrained.py
+    hop_seconds = 2.5
+
+    def load(self):
+        import torch
+        super().load()
+        self.model.load_state_dict(torch.load(self.model_path, map_location=torch.device("cpu")))
+        self.model.eval()
+
+    def cache_inputs(self, source):
+        return [self.model_path]
+
+    def process_batch(self, batch, lengths, sample_rate):
+        import torch
+        with torch.no_grad():
+            out = self.model(torch.from_numpy(np.ascontiguousarray(batch))[:, None])
+        return out.reshape(out.shape[0], -1).cpu().numpy()
+
+
+@register_backend
+class DCCRNetExportedBackend(DenoiserBackend):
+    """
+    The retrained DCCRNet from an artifact written by dccrnet_export.py (TorchScript or ONNX,
+    fp32 or int8). Loads offline: no hub cache and no asteroid import.
+    """
+    name = "asteroid_exported"
+    artifact = EXPORTED_ARTIFACT
+    supports_batch = True
+    sample_rate = None  # Rate and chunk length are the traced ones, read from the artifact's .json in load()
+    fixed_chunk = True
+
+    def load(self):
+        from dccrnet_export import load_exported
+        self.model = load_exported(self.artifact)
+        self.sample_rate = self.model.sample_rate
+        self.chunk_seconds = self.model.segment_samples / self.model.sample_rate
+        self.hop_seconds = self.chunk_seconds / 2
+
+    def cache_params(self):
+        return {**super().cache_params(), "artifact": self.artifact}
+
+    def cache_inputs(self, source):
+        return [self.artifact]
+
+    def process(self, audio, sample_rate):
+        return self.process_batch(np.asarray(audio, dtype=np.float32)[None], [len(audio)], sample_rate)[0]
+
+    def process_batch(self, batch, lengths, sample_rate):
+        # Inputs shorter than the segment (whole short files) are zero-padded to the traced length
+        segment = np.zeros((len(batch), self.model.segment_samples), dtype=np.float32)
+        segment[:, :batch.shape[1]] = batch
+        return self.model(segment)[:, :batch.shape[1]]
+
+
+@register_backend
+class SpeechBrainBackend(DenoiserBackend):
+    name = "speechbrain"
+    pretrained = "speechbrain/metricgan-plus-voicebank"
+    supports_batch = True
+    chunk_seconds = 8.0
+
+    def load(self):
+        from speechbrain.inference import SpectralMaskEnhancement
+        self.model = SpectralMaskEnhancement.from_hparams(
+            source=self.pretrained,
+            savedir="pretrained_models/speech_enhancement"
+        )
+
+    def process(self, audio, sample_rate):
+        return self.process_batch(np.asarray(audio, dtype=np.float32)[None], [len(audio)], sample_rate)[0]
+
+    def process_batch(self, batch, lengths, sample_rate):
+        import torch
+        # Relative lengths tell SpeechBrain which part of each padded row is real signal
+        relative = torch.tensor(np.asarray(lengths) / batch.shape[1], dtype=torch.float32)
+        enhanced = self.model.enhance_batch(torch.from_numpy(np.ascontiguousarray(batch)), lengths=relative)
+        return enhanced.cpu().numpy()
+
+
+@register_backend
+class DeepFilterNetBackend(DenoiserBackend):
+    name = "deepfilternet"
+    pretrained = "DeepFilterNet3"
+    sample_rate = 48000  # DeepFilterNet models run at 48 kHz
+    chunk_seconds = 10.0
+
+    def load(self):
+        from df import init_df
+        self.model, self.df_state, _ = init_df(self.pretrained)
+
+    def process(self, audio, sample_rate):
+        import torch
+        from df import enhance
+        enhanced = enhance(self.model, self.df_state, torch.from_numpy(np.ascontiguousarray(audio))[None])
+        return enhanced[0].cpu().numpy()
+
+
+@register_backend
+class DemucsBackend(DenoiserBackend):
+    name = "demucs"
+    pretrained = "htdemucs"
+    sample_rate = 44100  # htdemucs rate
+    supports_batch = True
+
+    def load(self):
+        from demucs_denoise import load_demucs
+        self.model = load_demucs(self.pretrained)
+        self.sample_rate = self.model.samplerate
+
+    def process(self, audio, sample_rate):
+        return self.process_batch(np.asarray(audio, dtype=np.float32)[None], [len(audio)], sample_rate)[0]
+
+    def process_batch(self, batch, lengths, sample_rate):
+        from demucs_denoise import separate_vocals
+        # apply_model splits long inputs into overlapping segments internally
+        return separate_vocals(self.model, batch, lengths)
+
+
+@register_backend
+class SpleeterBackend(DenoiserBackend):
+    name = "spleeter"
+    sample_rate = 44100
+    thread_safe = False  # TensorFlow session is not shared safely across threads
+
+    def load(self):
+        from spleeter.separator import Separator
+        self.model = Separator('spleeter:2stems')  # Separate vocals and accompaniment
+
+    def process(self, audio, sample_rate):
+        stems = self.model.separate(np.stack([audio, audio], axis=1))
+        return stems['vocals'].mean(axis=1).astype(np.float32)
+
+
+def load_backends(names):
+    """
+    Instantiate and load the selected backends once. Returns {name: backend}.
+    """
+    backends = {}
+    for name in names:
+        if name not in BACKENDS:
+            raise ValueError(f"Unknown backend '{name}'. Available: {', '.join(sorted(BACKENDS))}")
+        start = time.perf_counter()
+        backend = BACKENDS[name]()
+        with stage("model_load", backend=name):
+            backend.load()
+        backend.load_seconds = time.perf_counter() - start
+        print(f"Loaded {name} in {backend.load_seconds:.2f} s")
+        backends[name] = backend
+    return backends
+
+
+def output_path(output_root, backend, input_path):
+    name = os.path.splitext(os.path.basename(input_path))[0]
+    return os.path.join(output_root, backend.output_folder, f"{name}_denoised.wav")
+
+
+def split_channels(signals):
+    """
+    Flatten [T] / [T, C] signals into one list of mono rows (channel c of a file is its own row).
+    """
+    return [row for x in signals for row in (np.ascontiguousarray(x.T) if x.ndim == 2 else [x])]
+
+
+def merge_channels(rows, signals):
+    """
+    Inverse of split_channels: regroup enhanced rows into [T] / [T, C] outputs shaped like signals.
+    """
+    outputs, i = [], 0
+    for x in signals:
+        if x.ndim == 2:
+            outputs.append(np.stack(rows[i:i + x.shape[1]], axis=1))
+            i += x.shape[1]
+        else:
+            outputs.append(rows[i])
+            i += 1
+    return outputs
+
+
+def per_channel(fn, signal):
+    """
+    Apply a mono fn to every channel of a [T, C] signal ([T] signals are passed straight through).
+    """
+    if signal.ndim == 1:
+        return fn(signal)
+    return np.stack([fn(np.ascontiguousarray(signal[:, c])) for c in range(signal.shape[1])], axis=1)
+
+
+def chunks_per_batch(backend, sample_rate, channels=1, batch_memory_mb=BATCH_MEMORY_MB):
+    """
+    Overlap-add chunks per forward pass: as many as fit batch_memory_mb (at least one), else BATCH_CHUNKS.
+    """
+    if not batch_memory_mb:
+        return BATCH_CHUNKS
+    chunk_bytes = backend.chunk_seconds * sample_rate * channels * 4 * backend.memory_factor
+    return max(int(batch_memory_mb * 1024 * 1024 // chunk_bytes), 1)
+
+
+def run_chunked(backend, signal, sample_rate, batch_memory_mb=BATCH_MEMORY_MB):
+    """
+    Overlap-add inference of one long signal; chunks (and the channels of a [T, C] signal) are fed
+    to the backend as batches sized to batch_memory_mb.
+    """
+    def fn(batch):
+        return backend.run_batch(batch, [batch.shape[1]] * len(batch), sample_rate)
+
+    channels = signal.shape[1] if signal.ndim == 2 else 1
+    return process_chunked(fn, signal, sample_rate, backend.chunk_seconds,
+                           backend.hop_seconds or backend.chunk_seconds / 2,
+                           chunks_per_batch(backend, sample_rate, channels, batch_memory_mb))
+
+
+def denoise_batch(input_paths, output_root, backends, cache_dir=None, channel_mode=CHANNEL_MODE,
+                  batch_memory_mb=BATCH_MEMORY_MB, beam=None):
+    """
+    Load and downmix each input once per required rate (conversions are cached on disk in cache_dir,
+    by default <output_root>/.resample_cache; see audio_io.load_mono), and run the group through
+    every backend: files longer than the backend's chunk length by overlap-add chunks, the others in
+    one padded forward pass for batch-capable backends.
+    With channel_mode "keep" every channel is denoised and the outputs are multi-channel; the channels
+    ride in the batch dimension of the same forward pass. "beamform" denoises one delay-and-sum beam
+    (beam: reference channel or explicit steering delays, see audio_io.mix_channels).
+    Returns one result record per file and backend.
+    """
+    cache_dir = cache_dir or os.path.join(output_root, RESAMPLE_CACHE_SUBDIR)
+    # Native rate from the header; signals are loaded lazily per rate the backends need
+    sources = [({}, audio_info(path)[1]) for path in input_paths]
+
+    results = []
+    for name, backend in backends.items():
+        start = time.perf_counter()
+        records = [{"file": p, "backend": name, "ok": False, "seconds": 0.0, "error": None} for p in input_paths]
+        try:
+            signals, rates = [], []
+            for path, (by_rate, sample_rate) in zip(input_paths, sources):
+                rate = backend.sample_rate or sample_rate
+                if rate not in by_rate:
+                    # Copy out of the read-only cache map; torch.from_numpy needs writable arrays
+                    if channel_mode == "mono":
+                        by_rate[rate] = np.array(load_mono(path, rate, cache_dir)[0])
+                    else:
+                        audio = np.array(load_channels(path, rate, channel_mode, cache_dir, beam)[0])
+                        by_rate[rate] = audio[:, 0] if audio.shape[1] == 1 else audio
+                signals.append(by_rate[rate])
+                rates.append(rate)
+
+            if backend.uses_source:
+                outputs = [per_channel(lambda y, p=p, rate=rate: backend.run_source(p, y, rate), x)
+                           for p, x, rate in zip(input_paths, signals, rates)]
+            else:
+                outputs = [None] * len(signals)
+                whole = []
+                for i, (x, rate) in enumerate(zip(signals, rates)):
+                    if backend.chunk_seconds and len(x) > backend.chunk_seconds * rate:
+                        outputs[i], stats = run_chunked(backend, x, rate, batch_memory_mb)
+                        records[i]["rtf"] = stats["rtf"]
+                    else:
+                        whole.append(i)
+                if whole and backend.supports_batch:
+                    short = [signals[i] for i in whole]
+                    batch, lengths = pad_batch(split_channels(short))
+                    enhanced = backend.run_batch(batch, lengths, rates[whole[0]])
+                    for i, y in zip(whole, merge_channels([enhanced[j, :n] for j, n in enumerate(lengths)], short)):
+                        outputs[i] = y
+                else:
+                    for i in whole:
+                        outputs[i] = per_channel(lambda y, rate=rates[i]: backend(y, rate), signals[i])
+
+            os.makedirs(os.path.join(output_root, backend.output_folder), exist_ok=True)
+            for record, path, enhanced, rate in zip(records, input_paths, outputs, rates):
+                record["output"] = output_path(output_root, backend, path)
+                with stage("write", file=record["output"], backend=name) as st:
+                    sf.write(record["output"], enhanced, rate)
+                    st.count(samples=np.size(enhanced), bytes=file_bytes(record["output"]))
+                record["ok"] = True
+        except Exception as e:
+            for record in records:
+                record["error"] = f"{type(e).__name__}: {e}"
+        elapsed = time.perf_counter() - start
+        for record in records:
+            record["seconds"] = elapsed / len(records)
+        results.extend(records)
+    return results
+
+
+def denoise_file(input_path, output_root, backends, channel_mode=CHANNEL_MODE, beam=None):
+    return denoise_batch([input_path], output_root, backends, channel_mode=channel_mode, beam=beam)
+
+
+def group_files(files, backends, batch_memory_mb, channel_mode=CHANNEL_MODE):
+    """
+    Split files into groups of similar length whose padded batch fits batch_memory_mb
+    for the most demanding selected backend (each kept channel is a batch row).
+    Files longer than every batching backend's chunk length are chunked instead, so they count
+    as one chunk. Without a cap every file is its own group.
+    """
+    batching = [b for b in backends.values() if b.supports_batch and not b.uses_source]
+    if not batch_memory_mb or not batching:
+        return [[f] for f in files]
+
+    max_rate = max(b.sample_rate or 0 for b in batching)
+    bytes_per_sample = 4 * max(b.memory_factor for b in batching)
+    chunks = [b.chunk_seconds for b in batching]
+    max_seconds = max(chunks) if all(chunks) else None
+
+    # Lengths at the highest model rate, read from headers only
+    lengths = []
+    for f in files:
+        frames, sample_rate, channels = audio_info(f)
+        rows = channels if channel_mode == "keep" else 1
+        rate = max_rate or sample_rate
+        samples = int(frames * rate / sample_rate)
+        lengths.append(min(samples, int(max_seconds * rate)) * rows if max_seconds else samples * rows)
+    groups = plan_batches(np.array(lengths), batch_memory_mb * 1024 * 1024, bytes_per_sample)
+    return [[files[i] for i in group] for group in groups]
+
+
+def override_chunking(backends, chunk_seconds):
+    if chunk_seconds is not None:
+        for backend in backends.values():
+            if not backend.fixed_chunk:
+                backend.chunk_seconds, backend.hop_seconds = chunk_seconds or None, None
+
+
+def denoise_params(backend, channel_mode=CHANNEL_MODE, beam=None):
+    # Mono runs keep the keys they had before channel modes existed
+    params = backend.cache_params()
+    if channel_mode != "mono":
+        params = {**params, "channel_mode": channel_mode}
+    return {**params, "beam": beam} if beam else params
+
+
+def stale_backends(files, backends, output_root, manifest, channel_mode=CHANNEL_MODE, beam=None):
+    """
+    {file: [backend names whose output is missing or was built from other inputs/settings]}.
+    Works on unloaded backend instances, so fully cached runs never load a model.
+    """
+    return {f: [n for n, b in backends.items()
+                if not manifest.fresh("denoise", [f] + b.cache_inputs(f), [output_path(output_root, b, f)],
+                                      denoise_params(b, channel_mode, beam), b.version)]
+            for f in files}
+
+
+def denoise_folder(input_folder=INPUT_FOLDER, output_root=OUTPUT_ROOT, backend_names=("noisereduce",),
+                   workers=NUM_WORKERS, batch_memory_mb=BATCH_MEMORY_MB, chunk_seconds=CHUNK_SECONDS,
+                   manifest=None, channel_mode=CHANNEL_MODE, beam=None):
+    """
+    Denoise every file in input_folder with each selected backend, using a shared worker pool.
+    With batch_memory_mb set, files of similar length are processed as padded batches;
+    backends with a chunk length process long files by overlap-add in bounded memory.
+    With a Manifest, (file, backend) pairs whose output is up to date are skipped.
+    channel_mode selects mono, multi-channel ("keep") or beamformed processing (beam options: see denoise_batch).
+    Returns the flat list of per-file, per-backend result records for the work that ran.
+    """
+    files = sorted(os.path.join(input_folder, f) for f in os.listdir(input_folder)
+                   if f.endswith(INPUT_EXTENSIONS))
+    unknown = [n for n in backend_names if n not in BACKENDS]
+    if unknown:
+        raise ValueError(f"Unknown backend '{unknown[0]}'. Available: {', '.join(sorted(BACKENDS))}")
+    probes = {n: BACKENDS[n]() for n in backend_names}
+    override_chunking(probes, chunk_seconds)
+    # Taken before load() may change attributes
+    params = {n: denoise_params(b, channel_mode, beam) for n, b in probes.items()}
+
+    if manifest is not None:
+        pending = stale_backends(files, probes, output_root, manifest, channel_mode, beam)
+        n_cached = sum(len(backend_names) - len(names) for names in pending.values())
+        print(f"{n_cached}/{len(files) * len(backend_names)} outputs up to date, skipping")
+    else:
+        pending = {f: list(backend_names) for f in files}
+
+    # Files needing the same set of backends are grouped (and batched) together
+    by_backends = {}
+    for f in files:
+        if pending[f]:
+            by_backends.setdefault(tuple(pending[f]), []).append(f)
+    backends = load_backends([n for n in backend_names if any(n in names for names in by_backends)])
+    override_chunking(backends, chunk_seconds)
+    jobs = []
+    for names, members in by_backends.items():
+        subset = {n: backends[n] for n in names}
+        jobs.extend((g, subset) for g in group_files(members, subset, batch_memory_mb, channel_mode))
+
+    start = time.perf_counter()
+    with ThreadPoolExecutor(max_workers=max(workers, 1)) as pool:
+        results = [r for group_results in pool.map(
+                       lambda job: denoise_batch(job[0], output_root, job[1], channel_mode=channel_mode,
+                                                 batch_memory_mb=batch_memory_mb, beam=beam), jobs)
+                   for r in group_results]
+    elapsed = time.perf_counter() - start
+
+    if manifest is not None:
+        for r in results:
+            if r["ok"]:
+                probe = probes[r["backend"]]
+                manifest.record("denoise", [r["file"]] + probe.cache_inputs(r["file"]), [r["output"]],
+                                params[r["backend"]], probe.version, r["seconds"])
+        manifest.save()
+
+    for name in backends:
+        done = [r for r in results if r["backend"] == name]
+        for r in done:
+            if not r["ok"]:
+                print(f"FAILED {name} on {r['file']}: {r['error']}")
+        rtf = [r["rtf"] for r in done if "rtf" in r]
+        print(f"{name}: {sum(r['ok'] for r in done)}/{len(done)} files, "
+              f"{sum(r['seconds'] for r in done):.2f} s inference"
+              + (f", mean RTF {np.mean(rtf):.3f}" if rtf else ""))
+    print(f"Denoised {sum(len(members) for members in by_backends.values())} files in {len(jobs)} batch(es) "
+          f"with {len(backends)} backend(s) in {elapsed:.2f} s")
+    return results
+
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description="Run any subset of denoisers over a folder in one pass")
+    parser.add_argument("--input", default=INPUT_FOLDER)
+    parser.add_argument("--output-root", default=OUTPUT_ROOT)
+    parser.add_argument("-b", "--backends", default="noisereduce",
+                        help=f"Comma-separated subset of: {', '.join(BACKENDS)}")
+    parser.add_argument("-j", "--workers", type=int, default=NUM_WORKERS)
+    parser.add_argument("--batch-memory-mb", type=float, default=BATCH_MEMORY_MB,
+                        help="Enable padded batch inference with this peak-memory budget")
+    parser.add_argument("--chunk-seconds", type=float, default=CHUNK_SECONDS,
+                        help="Overlap-add chunk length for every backend (0 = whole file)")
+    parser.add_argument("--channel-mode", default=CHANNEL_MODE, choices=CHANNEL_MODES,
+                        help="mono: downmix; keep: every channel, multi-channel output; beamform: delay-and-sum")
+    parser.add_argument("--beam-reference", type=int, default=None,
+                        help=f"beamform: channel the others are aligned to (default {BEAM_REFERENCE})")
+    parser.add_argument("--beam-delays-ms", default=None,
+                        help="beamform: comma-separated steering delay per channel in ms (skips the GCC-PHAT estimate)")
+    parser.add_argument("--exported-artifact", default=EXPORTED_ARTIFACT,
+                        help="asteroid_exported: artifact written by dccrnet_export.py (.pt or .onnx)")
+    parser.add_argument("--manifest", default=MANIFEST_FILE)
+    parser.add_argument("--force", action="store_true", help="Recompute every output, ignoring the manifest")
+    args = parser.parse_args()
+    DCCRNetExportedBackend.artifact = args.exported_artifact
+    beam = {}
+    if args.beam_reference is not None:
+        beam["reference"] = args.beam_reference
+    if args.beam_delays_ms:
+        beam["delays_ms"] = [float(d) for d in args.beam_delays_ms.split(",")]
+    if beam and args.channel_mode != "beamform":
+        parser.error("--beam-reference / --beam-delays-ms need --channel-mode beamform")
+
+    manifest = Manifest(args.manifest)
+    if args.force:
+        manifest.forget("denoise")
+    denoise_folder(args.input, args.output_root, args.backends.split(","), args.workers, args.batch_memory_mb,
+                   args.chunk_seconds, manifest, args.channel_mode, beam or None)
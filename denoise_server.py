@@ -0,0 +1,188 @@
+import os
+import stat
+import time
+import secrets
+import argparse
+import threading
+from concurrent.futures import ThreadPoolExecutor
+from multiprocessing import AuthenticationError
+from multiprocessing.connection import Listener, Client
+from denoise_engine import BACKENDS, OUTPUT_ROOT, load_backends, denoise_batch
+
+# Local worker that keeps denoiser models resident between jobs
+ADDRESS = ("127.0.0.1", 6123)
+# Requests are pickles, so only clients holding this per-user secret (created 0600 on first serve) may connect
+KEY_FILE = os.path.join(os.environ.get("XDG_CACHE_HOME") or os.path.expanduser("~/.cache"),
+                        "flightlog-audio", "server.key")
+PRELOAD_BACKENDS = ("noisereduce",)
+SERVER_THREADS = 8  # Connections handled at once; later ones wait in the pool's queue
+
+
+def server_key(create=False, key_file=KEY_FILE):
+    """
+    Connection secret shared by serve and its clients. create=True writes a random key on first use.
+    Refuses a key file that other users can read.
+    """
+    if create:
+        os.makedirs(os.path.dirname(key_file), mode=0o700, exist_ok=True)
+        try:
+            fd = os.open(key_file, os.O_WRONLY | os.O_CREAT | os.O_EXCL, 0o600)
+            with os.fdopen(fd, "wb") as f:
+                f.write(secrets.token_bytes(32))
+        except FileExistsError:
+            pass
+    if os.stat(key_file).st_mode & (stat.S_IRWXG | stat.S_IRWXO):
+        raise PermissionError(f"{key_file} is accessible to other users; chmod 600 it or delete it")
+    with open(key_file, "rb") as f:
+        return f.read()
+
+
+class ModelCache:
+    """
+    Backends loaded once and shared by every job; unknown backends are loaded on first use.
+    Each backend has its own load lock, so a job waits only for the models it needs
+    while jobs on already loaded backends keep running.
+    """
+
+    def __init__(self):
+        self.backends = {}
+        self.load_locks = {}
+        self.lock = threading.Lock()  # Guards the two dicts only, never held during a load
+
+    def _load_lock(self, name):
+        with self.lock:
+            return self.load_locks.setdefault(name, threading.Lock())
+
+    def get(self, names):
+        """
+        Return ({name: backend}, {name: load seconds}) where the second dict only lists
+        backends this call had to load.
+        """
+        loaded = {}
+        for name in names:
+            with self._load_lock(name):
+                with self.lock:
+                    if name in self.backends:
+                        continue
+                backend = load_backends([name])[name]
+                with self.lock:
+                    self.backends[name] = backend
+                loaded[name] = backend.load_seconds
+        with self.lock:
+            return {n: self.backends[n] for n in names}, loaded
+
+    def status(self):
+        with self.lock:
+            return {n: {"load_seconds": b.load_seconds} for n, b in self.backends.items()}
+
+
+def handle_request(cache, request):
+    cmd = request.get("cmd")
+    if cmd == "status":
+        return {"ok": True, "backends": cache.status(), "available": sorted(BACKENDS)}
+    if cmd != "denoise":
+        return {"ok": False, "error": f"Unknown command: {cmd}"}
+
+    start = time.perf_counter()
+    backends, load_seconds = cache.get(request["backends"])
+    results = []
+    for path in request["inputs"]:
+        results.extend(denoise_batch([path], request.get("output_root", OUTPUT_ROOT), backends))
+    return {
+        "ok": all(r["ok"] for r in results),
+        "results": results,  # Per-file inference seconds in results[i]["seconds"]
+        "load_seconds": load_seconds,  # Only non-empty when this job triggered a model load
+        "job_seconds": time.perf_counter() - start,
+    }
+
+
+def _answer(conn, cache, stop, address, authkey):
+    """
+    Read one request and answer it (runs in the worker pool, so a slow client never blocks accept).
+    """
+    with conn:
+        try:
+            request = conn.recv()
+        except (EOFError, OSError):
+            return
+        if request.get("cmd") == "shutdown":
+            stop.set()
+            conn.send({"ok": True})
+            Client(address, authkey=authkey).close()  # Wake the accept loop so it sees the stop flag
+            return
+        try:
+            conn.send(handle_request(cache, request))
+        except Exception as e:
+            conn.send({"ok": False, "error": f"{type(e).__name__}: {e}"})
+
+
+def serve(address=ADDRESS, preload=PRELOAD_BACKENDS, threads=SERVER_THREADS):
+    """
+    Load the preload backends and answer jobs (in a pool of threads) until a shutdown request arrives.
+    Running jobs are finished before the server exits.
+    """
+    authkey = server_key(create=True)
+    cache = ModelCache()
+    cache.get(list(preload))
+    stop = threading.Event()
+
+    with Listener(address, authkey=authkey) as listener, ThreadPoolExecutor(max_workers=threads) as pool:
+        print(f"Denoise server listening on {address[0]}:{address[1]} with {', '.join(preload) or 'no models'}")
+        while True:
+            try:
+                conn = listener.accept()  # Handshake first: nothing is unpickled from a client without the key
+            except (AuthenticationError, EOFError, OSError) as e:
+                print(f"Rejected connection: {type(e).__name__}: {e}")
+                continue
+            if stop.is_set():
+                conn.close()
+                break
+            pool.submit(_answer, conn, cache, stop, address, authkey)
+    print("Denoise server stopped")
+
+
+def send(request, address=ADDRESS):
+    with Client(address, authkey=server_key()) as conn:
+        conn.send(request)
+        return conn.recv()
+
+
+def submit(inputs, backends, output_root=OUTPUT_ROOT, address=ADDRESS):
+    """
+    Thin client: ask the running server to denoise inputs with the given backends.
+    Paths are made absolute, since the server resolves them from its own working directory.
+    """
+    return send({"cmd": "denoise", "inputs": [os.path.abspath(p) for p in inputs], "backends": list(backends),
+                 "output_root": os.path.abspath(output_root)}, address)
+
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description="Long-lived denoise worker with resident models")
+    parser.add_argument("--port", type=int, default=ADDRESS[1])
+    sub = parser.add_subparsers(dest="command", required=True)
+    p_serve = sub.add_parser("serve")
+    p_serve.add_argument("-b", "--backends", default=",".join(PRELOAD_BACKENDS))
+    p_submit = sub.add_parser("submit")
+    p_submit.add_argument("inputs", nargs="+")
+    p_submit.add_argument("-b", "--backends", default="noisereduce")
+    p_submit.add_argument("--output-root", default=OUTPUT_ROOT)
+    sub.add_parser("status")
+    sub.add_parser("stop")
+    args = parser.parse_args()
+    address = (ADDRESS[0], args.port)
+
+    if args.command == "serve":
+        serve(address, [b for b in args.backends.split(",") if b])
+    elif args.command == "submit":
+        response = submit(args.inputs, args.backends.split(","), args.output_root, address)
+        for name, seconds in response.get("load_seconds", {}).items():
+            print(f"Model load {name}: {seconds:.2f} s")
+        for r in response.get("results", []):
+            status = f"{r['seconds']:.3f} s" if r["ok"] else f"FAILED ({r['error']})"
+            print(f"{r['backend']} {r['file']}: {status}")
+        if "error" in response:
+            print(f"Error: {response['error']}")
+    elif args.command == "status":
+        print(send({"cmd": "status"}, address))
+    else:
+        print(send({"cmd": "shutdown"}, address))
@@ -0,0 +1,245 @@
+import os
+import json
+import time
+import hashlib
+import argparse
+from concurrent.futures import ProcessPoolExecutor
+import numpy as np
+import pandas as pd
+from audio_io import load_mono
+from pipeline_cache import Manifest, MANIFEST_FILE
+
+# Objective comparison of every denoiser output folder against clean references
+OUTPUT_ROOT = "testset_1216"  # One sub-folder per method (baseline, ours, <backend>_denoised, testset_noisy)
+CACHE_FILE = "evaluation_cache.json"  # Per-file metrics keyed by content hashes, stored in the output root
+RESAMPLE_CACHE_SUBDIR = ".resample_cache"  # 16 kHz conversions, kept in the output root
+SUMMARY_FILE = "evaluation_summary.csv"
+RESULTS_FILE = "evaluation_results.csv"
+METRICS_VERSION = 2  # Bump when a metric implementation changes
+EVAL_RATE = 16000  # Everything is compared at this rate (PESQ wideband needs 16 kHz)
+MAX_LAG_SECONDS = 0.5  # Search range of the reference alignment (widened for references shorter than the output)
+SEGMENT_SECONDS = 0.03  # Frame length of the segmental SNR
+SEG_SNR_RANGE = (-10.0, 35.0)  # Per-frame clipping as in the usual segSNR definition
+NAME_SUFFIXES = ("_denoised", "_trimmed", "_enhanced")
+NUM_WORKERS = os.cpu_count() or 1
+
+
+def utterance_key(path):
+    """
+    Common name of an output file across methods: "p232_001_denoised.wav" -> "p232_001";
+    demucs' <model>/<name>/vocals.wav -> "<name>".
+    """
+    stem = os.path.splitext(os.path.basename(path))[0]
+    if stem == "vocals":
+        return os.path.basename(os.path.dirname(path))
+    for suffix in NAME_SUFFIXES:
+        if stem.endswith(suffix):
+            stem = stem[:-len(suffix)]
+    return stem
+
+
+def collect_outputs(folder):
+    """
+    {utterance key: path} of the .wav outputs anywhere below folder (demucs' no_vocals stems skipped).
+    """
+    files = {}
+    for root, _, names in os.walk(folder):
+        for name in sorted(names):
+            if name.endswith(".wav") and name != "no_vocals.wav":
+                path = os.path.join(root, name)
+                files[utterance_key(path)] = path
+    return files
+
+
+def discover_methods(output_root, reference_folder):
+    reference = os.path.normpath(reference_folder)
+    return {name: os.path.join(output_root, name) for name in sorted(os.listdir(output_root))
+            if os.path.isdir(os.path.join(output_root, name)) and not name.startswith(".")  # e.g. .resample_cache
+            and os.path.normpath(os.path.join(output_root, name)) != reference}
+
+
+def find_lag(estimate, reference, max_lag, min_lag=None):
+    """
+    Lag in [min_lag, max_lag] samples (min_lag defaults to -max_lag) that maximises the
+    cross-correlation, i.e. estimate[i + lag] best matches reference[i].
+    """
+    min_lag = -max_lag if min_lag is None else min_lag
+    n = len(estimate) + len(reference)
+    size = 1 << int(np.ceil(np.log2(n)))
+    corr = np.fft.irfft(np.fft.rfft(estimate, size) * np.conj(np.fft.rfft(reference, size)), size)
+    lags = np.arange(min_lag, max_lag + 1)
+    return int(lags[np.argmax(corr[lags])])  # Negative lags wrap around to the end of corr
+
+
+def align(estimate, reference, max_lag):
+    """
+    Shift estimate by the lag (|lag| <= max_lag samples) that maximises its cross-correlation
+    with reference, then trim both to their overlap.
+    """
+    lag = find_lag(estimate, reference, max_lag)
+    if lag >= 0:
+        estimate = estimate[lag:]
+    else:
+        reference = reference[-lag:]
+    length = min(len(estimate), len(reference))
+    return estimate[:length], reference[:length], lag
+
+
+def si_sdr(estimate, reference):
+    reference = reference - reference.mean()
+    estimate = estimate - estimate.mean()
+    scale = np.dot(estimate, reference) / (np.dot(reference, reference) + 1e-12)
+    target = scale * reference
+    noise = estimate - target
+    return float(10 * np.log10((np.dot(target, target) + 1e-12) / (np.dot(noise, noise) + 1e-12)))
+
+
+def segmental_snr(estimate, reference, sample_rate=EVAL_RATE, segment_seconds=SEGMENT_SECONDS, clip=SEG_SNR_RANGE):
+    frame = int(segment_seconds * sample_rate)
+    n = len(reference) // frame * frame
+    ref = reference[:n].reshape(-1, frame)
+    err = (reference[:n] - estimate[:n]).reshape(-1, frame)
+    snr = 10 * np.log10((np.einsum('ij,ij->i', ref, ref) + 1e-12) / (np.einsum('ij,ij->i', err, err) + 1e-12))
+    return float(np.clip(snr, *clip).mean())
+
+
+def optional_metrics(estimate, reference, sample_rate=EVAL_RATE):
+    """
+    STOI (pystoi) and wideband PESQ (pesq) when the packages are installed.
+    """
+    metrics = {}
+    try:
+        from pystoi import stoi
+        metrics["stoi"] = float(stoi(reference, estimate, sample_rate, extended=False))
+    except ImportError:
+        pass
+    try:
+        from pesq import pesq
+        metrics["pesq"] = float(pesq(sample_rate, reference, estimate, "wb"))
+    except ImportError:
+        pass
+    except Exception as e:  # pesq raises on silent / too short inputs
+        metrics["pesq_error"] = str(e)
+    return metrics
+
+
+def evaluate_pair(estimate_path, reference_path, max_lag_seconds=MAX_LAG_SECONDS, cache_dir=None):
+    """
+    All metrics for one output against its clean reference (runs in a worker process).
+    A reference shorter than the output (an unsynced clip played once during a flight) is searched
+    for over the whole output, as in dataset_builder.place_clean.
+    """
+    estimate = load_mono(estimate_path, EVAL_RATE, cache_dir)[0]
+    reference = load_mono(reference_path, EVAL_RATE, cache_dir)[0]
+    max_lag = max(int(max_lag_seconds * EVAL_RATE), len(estimate) - len(reference))
+    estimate, reference, lag = align(estimate, reference, max_lag)
+    return {
+        "si_sdr": si_sdr(estimate, reference),
+        "seg_snr": segmental_snr(estimate, reference),
+        **optional_metrics(estimate, reference),
+        "lag_ms": 1000.0 * lag / EVAL_RATE,
+        "seconds": len(reference) / EVAL_RATE,
+    }
+
+
+class ResultCache:
+    """
+    Per-file metrics keyed by the content hashes of output and reference plus the metric settings,
+    so only outputs that changed since the last run are evaluated again.
+    """
+
+    def __init__(self, path, manifest):
+        self.path = path
+        self.manifest = manifest  # Reused for its (size, mtime)-cached file hashes
+        self.results = {}
+        if os.path.exists(path):
+            with open(path) as f:
+                self.results = json.load(f)
+
+    def key(self, estimate_path, reference_path):
+        settings = {"version": METRICS_VERSION, "rate": EVAL_RATE, "max_lag": MAX_LAG_SECONDS,
+                    "segment": SEGMENT_SECONDS, "clip": SEG_SNR_RANGE}
+        payload = [self.manifest.file_hash(estimate_path), self.manifest.file_hash(reference_path), settings]
+        return hashlib.sha256(json.dumps(payload, sort_keys=True).encode()).hexdigest()
+
+    def save(self):
+        tmp = f"{self.path}.tmp"
+        with open(tmp, "w") as f:
+            json.dump(self.results, f)
+        os.replace(tmp, self.path)
+        self.manifest.save()
+
+
+def evaluate(reference_folder, output_root=OUTPUT_ROOT, methods=None, workers=NUM_WORKERS, cache_file=None):
+    """
+    Evaluate every method folder against reference_folder; cached pairs are not recomputed.
+    Outputs of a flight ("Kus_11_2") fall back to the utterance's reference ("Kus_11").
+    Returns a DataFrame with one row per (method, utterance).
+    """
+    from dataset_builder import clean_reference_for  # dataset_builder imports this module
+
+    references = collect_outputs(reference_folder)
+    if not references:
+        raise FileNotFoundError(f"No reference .wav files in {reference_folder}")
+    methods = methods or discover_methods(output_root, reference_folder)
+    cache = ResultCache(cache_file or os.path.join(output_root, CACHE_FILE),
+                        Manifest(os.path.join(output_root, MANIFEST_FILE)))
+    cache_dir = os.path.join(output_root, RESAMPLE_CACHE_SUBDIR)
+
+    rows, todo = [], []
+    for method, folder in methods.items():
+        for key, path in collect_outputs(folder).items():
+            reference = references.get(key) or clean_reference_for(key, reference_folder)
+            if reference is None:
+                continue
+            row = {"method": method, "utterance": key, "file": path, "reference": reference,
+                   "cache_key": cache.key(path, reference)}
+            rows.append(row)
+            if row["cache_key"] not in cache.results:
+                todo.append(row)
+
+    print(f"{len(rows) - len(todo)}/{len(rows)} outputs cached, evaluating {len(todo)}")
+    start = time.perf_counter()
+    if todo:
+        with ProcessPoolExecutor(max_workers=max(workers, 1)) as pool:
+            futures = [pool.submit(evaluate_pair, r["file"], r["reference"], MAX_LAG_SECONDS, cache_dir)
+                       for r in todo]
+            for row, future in zip(todo, futures):
+                try:
+                    cache.results[row["cache_key"]] = future.result()
+                except Exception as e:
+                    print(f"FAILED {row['method']} {row['utterance']}: {type(e).__name__}: {e}")
+        cache.save()
+    print(f"Evaluated {len(todo)} outputs in {time.perf_counter() - start:.2f} s")
+
+    results = [{**{k: v for k, v in r.items() if k != "cache_key"}, **cache.results[r["cache_key"]]}
+               for r in rows if r["cache_key"] in cache.results]
+    return pd.DataFrame(results)
+
+
+def summarize(results):
+    """
+    Mean of every metric per method (plus the number of utterances), best SI-SDR first.
+    """
+    metrics = [c for c in ("si_sdr", "seg_snr", "stoi", "pesq") if c in results.columns]
+    summary = results.groupby("method")[metrics].mean()
+    summary.insert(0, "files", results.groupby("method").size())
+    return summary.sort_values("si_sdr", ascending=False)
+
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description="SI-SDR / segmental SNR / STOI / PESQ for every denoiser output")
+    parser.add_argument("--output-root", default=OUTPUT_ROOT)
+    parser.add_argument("--reference", required=True, help="Folder with the clean utterances")
+    parser.add_argument("--methods", default=None, help="Comma-separated sub-folders (default: all)")
+    parser.add_argument("-j", "--workers", type=int, default=NUM_WORKERS)
+    args = parser.parse_args()
+
+    methods = None
+    if args.methods:
+        methods = {m: os.path.join(args.output_root, m) for m in args.methods.split(",")}
+    results = evaluate(args.reference, args.output_root, methods, args.workers)
+    summary = summarize(results)
+    results.to_csv(os.path.join(args.output_root, RESULTS_FILE), index=False)
+    summary.to_csv(os.path.join(args.output_root, SUMMARY_FILE))
+    print(summary.to_string(float_format=lambda x: f"{x:.3f}"))
@@ -1,70 +1,87 @@
 import os
+from importlib.metadata import version
 from pydub import AudioSegment
 import soundfile as sf
 import numpy as np
 import noisereduce as nr
+from audio_io import load_audio, mix_channels
+from pipeline_cache import Manifest, run_cached
+from telemetry import stage, file_bytes
+
+# Inputs accepted without a further decode (see EXPORT_FORMAT in audio_sync.py)
+INPUT_EXTENSIONS = (".wav", ".flac", ".npy")
 
 # Define folder paths
 INPUT_M4A_FOLDER = "real_flight_data_1214/audio_synced"
 WAV_FOLDER = "testset_1216/testset_noisy"
 DENOISED_FOLDER = "testset_1216/noisereduce_denoised"
+MODEL_ID = f"noisereduce {version('noisereduce')}"  # No weights: the spectral gating changes with the library
+DENOISE_VERSION = 1  # Bump when the output changes so cached results are rebuilt
+CONVERT_M4A = False  # WAV_FOLDER currently holds the test set, not converted flight audio
+CHANNEL_MODE = "mono"  # "keep": denoise every mic channel (multi-channel output), "beamform": delay-and-sum
 
 os.makedirs(WAV_FOLDER, exist_ok=True)
 os.makedirs(DENOISED_FOLDER, exist_ok=True)
 
 # Step 1: Convert .m4a to .wav
 def convert_m4a_to_wav(input_file, output_file):
-    audio = AudioSegment.from_file(input_file, format="m4a")
-    audio.export(output_file, format="wav")
+    with stage("m4a_to_wav", file=input_file) as s:
+        audio = AudioSegment.from_file(input_file, format="m4a")
+        audio.export(output_file, format="wav")
+        s.count(bytes=file_bytes(input_file), samples=int(audio.frame_count()) * audio.channels)
     print(f"Converted {input_file} to {output_file}")
 
 # Step 2: Apply noise reduction
 def reduce_noise(input_wav, output_wav):
-    # Load the audio file
-    data, rate = sf.read(input_wav)
-
-    # Ensure mono audio if stereo
-    if data.ndim > 1:
-        data = np.mean(data, axis=1)
+    # Load the audio file (.npy exports are memory-mapped, no decode)
+    data, rate = load_audio(input_wav)
 
-    # Ensure the data is a numpy array of type float32
-    data = np.asarray(data, dtype=np.float32)
+    # Downmix, keep or beamform the channels (float32 [frames, channels])
+    data = mix_channels(data, rate, CHANNEL_MODE)
+    # noisereduce takes [channels, frames] and denoises every channel; mono stays 1-D
+    data = data[:, 0] if data.shape[1] == 1 else np.ascontiguousarray(data.T)
 
     print(f"Data shape: {data.shape}, Sample rate: {rate}")
 
-    # Perform noise reduction
-    try:
+    # Perform noise reduction (errors propagate, so run_cached never records a failed file)
+    with stage("forward", backend="noisereduce", file=input_wav) as s:
         reduced_noise = nr.reduce_noise(y=data, y_noise=None, sr=rate)
-    except Exception as e:
-        print(f"Error during noise reduction: {e}")
-        return
+        s.count(samples=data.size)
 
     # Save the denoised audio
-    sf.write(output_wav, reduced_noise, rate)
+    with stage("write", file=output_wav) as s:
+        sf.write(output_wav, reduced_noise.T, rate)
+        s.count(samples=reduced_noise.size, bytes=file_bytes(output_wav))
     print(f"Noise reduction completed for {input_wav}. Saved as {output_wav}")
 
 # Step 3: Process all .m4a files
 def process_audio_files(m4a_folder, wav_folder, denoised_folder):
-    # Step 3.1: Convert all .m4a files to .wav
-    # for file_name in os.listdir(m4a_folder):
-    #     if file_name.endswith(".m4a"):
-    #         m4a_path = os.path.join(m4a_folder, file_name)
-    #         wav_path = os.path.join(wav_folder, file_name.replace(".m4a", ".wav"))
-    #         try:
-    #             convert_m4a_to_wav(m4a_path, wav_path)
-    #         except Exception as e:
-    #             print(f"Error converting {file_name}: {e}")
+    # Step 3.1: Convert .m4a to .wav (only when CONVERT_M4A is set; unchanged files are skipped)
+    manifest = Manifest()
+    if CONVERT_M4A:
+        for file_name in os.listdir(m4a_folder):
+            if file_name.endswith(".m4a"):
+                m4a_path = os.path.join(m4a_folder, file_name)
+                wav_path = os.path.join(wav_folder, file_name.replace(".m4a", ".wav"))
+                try:
+                    run_cached(manifest, "m4a_to_wav", [m4a_path], [wav_path],
+                               lambda: convert_m4a_to_wav(m4a_path, wav_path))
+                except Exception as e:
+                    print(f"Error converting {file_name}: {e}")
 
-    # Step 3.2: Apply noise reduction on .wav files
+    # Step 3.2: Apply noise reduction on .wav (or lossless .flac / .npy) files
     for file_name in os.listdir(wav_folder):
-        if file_name.endswith(".wav"):
+        if file_name.endswith(INPUT_EXTENSIONS):
             input_path = os.path.join(wav_folder, file_name)
-            output_path = os.path.join(denoised_folder, file_name.replace(".wav", "_denoised.wav"))
+            output_path = os.path.join(denoised_folder, os.path.splitext(file_name)[0] + "_denoised.wav")
             print(f"Processing {file_name}...")
             try:
-                reduce_noise(input_path, output_path)
+                run_cached(manifest, "noisereduce", [input_path], [output_path],
+                           lambda: reduce_noise(input_path, output_path),
+                           {"model": MODEL_ID, "channel_mode": CHANNEL_MODE}, DENOISE_VERSION)
             except Exception as e:
                 print(f"Error processing {file_name}: {e}")
+    manifest.save()
 
 # Main process
 if __name__ == "__main__":
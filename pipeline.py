@@ -0,0 +1,244 @@
+import os
+import time
+import argparse
+import threading
+from concurrent.futures import ProcessPoolExecutor, ThreadPoolExecutor, wait, FIRST_COMPLETED
+import numpy as np
+from audio_io import decode_audio, write_audio
+from auto_sync import estimate_offset, MIN_CONFIDENCE
+from pipeline_cache import Manifest, MANIFEST_FILE
+from telemetry import emit
+from ulog_reader import read_flight_log
+from ulog_ingest import ingest_file, ingest_outputs, ingest_params, INGEST_VERSION
+from denoise_engine import BACKENDS, load_backends, denoise_batch, stale_backends
+
+# Folder layout inside a dataset root (same as real_flight_data_1214/)
+ULOG_SUBDIR = "flightlog_raw"
+AUDIO_SUBDIR = "audio"
+COLUMNAR_SUBDIR = "flight_npz"
+PROCESSED_SUBDIR = "flight_csv_processed"
+TRACK_SUBDIR = "flight_tracks"
+SYNCED_SUBDIR = "wav_files"  # Trimmed audio, input of the denoise stage; backends write to <root>/<backend>_denoised
+AUDIO_EXTENSIONS = (".m4a", ".wav", ".flac")
+
+DATASET_ROOT = "real_flight_data_1214"
+SYNC_FORMAT = "wav"  # Lossless so the denoisers see the exact recorded samples
+SYNC_VERSION = 1
+DENOISE_BACKENDS = ("noisereduce",)
+NUM_WORKERS = os.cpu_count() or 1
+STAGES = ("ingest", "sync", "denoise")
+
+
+def flight_paths(root, name):
+    audio = next((os.path.join(root, AUDIO_SUBDIR, name + ext) for ext in AUDIO_EXTENSIONS
+                  if os.path.exists(os.path.join(root, AUDIO_SUBDIR, name + ext))), None)
+    return {
+        "ulog": os.path.join(root, ULOG_SUBDIR, f"{name}.ulg"),
+        "audio": audio,
+        "columnar_dir": os.path.join(root, COLUMNAR_SUBDIR),
+        "processed_dir": os.path.join(root, PROCESSED_SUBDIR),
+        "track_dir": os.path.join(root, TRACK_SUBDIR),
+        "csv": os.path.join(root, PROCESSED_SUBDIR, f"{name}.csv"),
+        "synced": os.path.join(root, SYNCED_SUBDIR, f"{name}_trimmed.{SYNC_FORMAT}"),
+    }
+
+
+def ingest_args(paths):
+    return paths["ulog"], paths["columnar_dir"], paths["processed_dir"], paths["track_dir"]
+
+
+def sync_flight(csv_file, audio_file, output_file, min_confidence=MIN_CONFIDENCE):
+    """
+    Non-interactive audio_sync: auto-align and write the trimmed audio when the estimate is
+    confident. Low-confidence flights are left for audio_sync_new.py's manual plot.
+    """
+    df = read_flight_log(csv_file)
+    duration_s = (df['timestamp'].iloc[-1] - df['timestamp'].iloc[0]) / 1e6
+    audio_data, sample_rate = decode_audio(audio_file)
+    result = estimate_offset(df, audio_data.mean(axis=1), sample_rate)
+    if result["confidence"] < min_confidence:
+        raise ValueError(f"Low sync confidence {result['confidence']:.2f}; sync {audio_file} manually")
+    start = max(result["offset_samples"], 0)
+    os.makedirs(os.path.dirname(output_file), exist_ok=True)
+    write_audio(audio_data[start:start + int(round(duration_s * sample_rate))], sample_rate, output_file)
+    return result
+
+
+class Pipeline:
+    """
+    Per-flight dependency graph ingest -> sync -> denoise. Each flight advances as soon as its
+    own previous stage is done, so flights overlap across stages. Ingest (pure Python parsing)
+    runs in a process pool, sync and denoise (ffmpeg / NumPy / torch, which release the GIL)
+    in a thread pool; both are bounded by workers.
+    """
+
+    def __init__(self, root, backend_names=DENOISE_BACKENDS, workers=NUM_WORKERS, manifest=None):
+        self.root = root
+        self.backend_names = list(backend_names)
+        self.workers = max(workers, 1)
+        self.manifest = manifest
+        self.probes = {n: BACKENDS[n]() for n in self.backend_names}
+        for probe in self.probes.values():
+            self._configure(probe)
+        self.backends = None  # Loaded on the first flight that needs denoising
+        self.load_lock = threading.Lock()
+        self.timings = []  # (flight, stage, seconds, status)
+
+    def _configure(self, backend):
+        if backend.uses_source:
+            backend.actuator_dir = os.path.join(self.root, PROCESSED_SUBDIR)
+
+    def flights(self):
+        ulog_dir = os.path.join(self.root, ULOG_SUBDIR)
+        return sorted(os.path.splitext(f)[0] for f in os.listdir(ulog_dir) if f.endswith(".ulg"))
+
+    # Stage bodies; sync / denoise return a status string and raise on failure.
+    # ingest only decides whether to run, the work itself is shipped to the process pool.
+
+    def ingest(self, paths):
+        outputs = ingest_outputs(*ingest_args(paths))
+        if self.manifest and self.manifest.fresh("ingest", [paths["ulog"]], outputs, ingest_params(), INGEST_VERSION):
+            return "cached", None
+        return "run", (ingest_file, *ingest_args(paths))
+
+    def sync(self, paths):
+        if paths["audio"] is None:
+            raise FileNotFoundError("No recording in " + os.path.join(self.root, AUDIO_SUBDIR))
+        from batch_sync import load_index, trim  # batch_sync imports this module
+        # A manual or confident offset from sync_index.json (batch_sync.py / audio_sync_new.py) wins over auto-sync
+        entry = load_index(self.root)["flights"].get(os.path.splitext(os.path.basename(paths["csv"]))[0])
+        if entry is not None and not entry["confident"]:
+            entry = None
+        inputs = [paths["csv"], paths["audio"]]
+        params = {"min_confidence": MIN_CONFIDENCE, "index_offset": entry and entry["offset_samples"]}
+        if self.manifest and self.manifest.fresh("sync", inputs, [paths["synced"]], params, SYNC_VERSION):
+            return "cached"
+        if entry is not None:
+            trim(entry, paths["synced"], root=self.root)
+            status = f"offset {entry['offset_ms']:.0f} ms from the sync index ({entry['method']})"
+        else:
+            result = sync_flight(paths["csv"], paths["audio"], paths["synced"])
+            status = f"offset {result['offset_ms']:.0f} ms, confidence {result['confidence']:.2f}"
+        if self.manifest:
+            self.manifest.record("sync", inputs, [paths["synced"]], params, SYNC_VERSION)
+        return status
+
+    def denoise(self, paths):
+        synced = paths["synced"]
+        names = self.backend_names
+        if self.manifest:
+            names = stale_backends([synced], self.probes, self.root, self.manifest)[synced]
+        if not names:
+            return "cached"
+        self._load_backends()
+        results = denoise_batch([synced], self.root, {n: self.backends[n] for n in names})
+        failed = [r for r in results if not r["ok"]]
+        if failed:
+            raise RuntimeError("; ".join(f"{r['backend']}: {r['error']}" for r in failed))
+        if self.manifest:
+            for r in results:
+                probe = self.probes[r["backend"]]
+                self.manifest.record("denoise", [synced] + probe.cache_inputs(synced), [r["output"]],
+                                     probe.cache_params(), probe.version, r["seconds"])
+        return ", ".join(names)
+
+    def _load_backends(self):
+        with self.load_lock:
+            if self.backends is None:
+                backends = load_backends(self.backend_names)
+                for backend in backends.values():
+                    self._configure(backend)
+                self.backends = backends
+
+    def run(self, flights=None):
+        """
+        Run every flight through the graph. Returns {flight: {stage: status}}.
+        """
+        flights = flights or self.flights()
+        paths = {name: flight_paths(self.root, name) for name in flights}
+        status = {name: {} for name in flights}
+        start = time.perf_counter()
+
+        with ProcessPoolExecutor(max_workers=self.workers) as processes, \
+                ThreadPoolExecutor(max_workers=self.workers) as threads:
+            running = {}
+
+            def submit(name, stage):
+                if stage == "ingest":
+                    state, job = self.ingest(paths[name])
+                    if job is None:
+                        return finish(name, stage, state, 0.0)
+                    future = processes.submit(*job)
+                else:
+                    future = threads.submit(_timed, getattr(self, stage), paths[name])
+                running[future] = (name, stage, time.perf_counter())
+
+            def finish(name, stage, state, seconds):
+                status[name][stage] = state
+                self.timings.append((name, stage, seconds, state))
+                emit({"stage": f"pipeline:{stage}", "seconds": round(seconds, 6), "ok": not state.startswith("FAILED"),
+                      "flight": name, "status": state})
+                print(f"[{time.perf_counter() - start:7.2f} s] {name} {stage}: {state} ({seconds:.2f} s)")
+                if not state.startswith("FAILED") and stage != STAGES[-1]:
+                    submit(name, STAGES[STAGES.index(stage) + 1])
+
+            for name in flights:
+                submit(name, STAGES[0])
+            while running:
+                done, _ = wait(list(running), return_when=FIRST_COMPLETED)
+                for future in done:
+                    name, stage, submitted = running.pop(future)
+                    try:
+                        if stage == "ingest":
+                            result = future.result()
+                            if not result["ok"]:
+                                raise RuntimeError(result["error"])
+                            if self.manifest:
+                                self.manifest.record("ingest", [paths[name]["ulog"]],
+                                                     ingest_outputs(*ingest_args(paths[name])),
+                                                     ingest_params(), INGEST_VERSION, result["seconds"])
+                            state, seconds = "run", result["seconds"]
+                        else:
+                            state, seconds = future.result()
+                    except Exception as e:
+                        state, seconds = f"FAILED ({type(e).__name__}: {e})", time.perf_counter() - submitted
+                    finish(name, stage, state, seconds)
+
+        if self.manifest:
+            self.manifest.save()
+        self.print_summary(time.perf_counter() - start)
+        return status
+
+    def print_summary(self, elapsed):
+        print(f"\n{'stage':<10}{'flights':>8}{'failed':>8}{'total s':>10}{'mean s':>9}{'max s':>9}")
+        for stage in STAGES:
+            rows = [t for t in self.timings if t[1] == stage]
+            if not rows:
+                continue
+            seconds = np.array([t[2] for t in rows])
+            failed = sum(t[3].startswith("FAILED") for t in rows)
+            print(f"{stage:<10}{len(rows):>8}{failed:>8}{seconds.sum():>10.2f}{seconds.mean():>9.2f}{seconds.max():>9.2f}")
+        busy = sum(t[2] for t in self.timings)
+        print(f"Wall clock {elapsed:.2f} s for {busy:.2f} s of stage work ({busy / max(elapsed, 1e-9):.1f}x overlap)")
+
+
+def _timed(fn, *args):
+    start = time.perf_counter()
+    return fn(*args), time.perf_counter() - start
+
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description="Ingest -> sync -> denoise every flight of a dataset root")
+    parser.add_argument("root", nargs="?", default=DATASET_ROOT,
+                        help=f"Folder with {ULOG_SUBDIR}/ and {AUDIO_SUBDIR}/")
+    parser.add_argument("-b", "--backends", default=",".join(DENOISE_BACKENDS),
+                        help=f"Comma-separated subset of: {', '.join(BACKENDS)}")
+    parser.add_argument("-j", "--workers", type=int, default=NUM_WORKERS)
+    parser.add_argument("--flights", default=None, help="Comma-separated flight names (default: all)")
+    parser.add_argument("--manifest", default=MANIFEST_FILE)
+    parser.add_argument("--no-cache", action="store_true", help="Run every stage, ignoring the manifest")
+    args = parser.parse_args()
+
+    pipeline = Pipeline(args.root, [b for b in args.backends.split(",") if b], args.workers,
+                        None if args.no_cache else Manifest(args.manifest))
+    pipeline.run(args.flights.split(",") if args.flights else None)
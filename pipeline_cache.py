@@ -0,0 +1,148 @@
+import os
+import json
+import time
+import hashlib
+import threading
+from telemetry import event
+
+# Content-hashed record of every artifact the pipeline produced, so reruns only redo stale work
+MANIFEST_FILE = "pipeline_manifest.json"
+HASH_BLOCK_BYTES = 1 << 20
+
+
+def _stat_key(path):
+    st = os.stat(path)
+    return st.st_size, st.st_mtime_ns
+
+
+class Manifest:
+    """
+    Maps (stage, output) to the key it was built from. The key hashes the content of every
+    input file together with the stage name, version and parameters, so an artifact is
+    stale as soon as any input, parameter or model version changes.
+    File hashes are cached by (size, mtime) and only recomputed when a file changes on disk.
+
+    Usage:
+        manifest = Manifest()
+        if not manifest.fresh("denoise", [wav], [out], params):
+            ...build out...
+            manifest.record("denoise", [wav], [out], params)
+        manifest.save()
+    """
+
+    def __init__(self, path=MANIFEST_FILE):
+        self.path = path
+        self.lock = threading.Lock()
+        self.files, self.artifacts = {}, {}
+        if os.path.exists(path):
+            with open(path) as f:
+                data = json.load(f)
+            self.files, self.artifacts = data.get("files", {}), data.get("artifacts", {})
+
+    def file_hash(self, path):
+        path = os.path.normpath(path)
+        size, mtime = _stat_key(path)
+        with self.lock:
+            entry = self.files.get(path)
+            if entry and entry["size"] == size and entry["mtime_ns"] == mtime:
+                return entry["sha256"]
+
+        digest = hashlib.sha256()
+        with open(path, "rb") as f:
+            for block in iter(lambda: f.read(HASH_BLOCK_BYTES), b""):
+                digest.update(block)
+        with self.lock:
+            self.files[path] = {"size": size, "mtime_ns": mtime, "sha256": digest.hexdigest()}
+        return digest.hexdigest()
+
+    def key(self, stage, inputs, params=None, version=None):
+        """
+        Hash of the stage, its version/parameters and the content of its inputs
+        (directories are hashed file by file).
+        """
+        payload = {
+            "stage": stage,
+            "version": version,
+            "params": params or {},
+            "inputs": sorted(self._input_hashes(inputs)),
+        }
+        return hashlib.sha256(json.dumps(payload, sort_keys=True, default=str).encode()).hexdigest()
+
+    def _input_hashes(self, inputs):
+        for path in inputs:
+            if os.path.isdir(path):
+                for root, _, names in os.walk(path):
+                    for name in sorted(names):
+                        full = os.path.join(root, name)
+                        yield f"{os.path.relpath(full, path)}:{self.file_hash(full)}"
+            else:
+                yield f"{os.path.basename(path)}:{self.file_hash(path)}"
+
+    def fresh(self, stage, inputs, outputs, params=None, version=None):
+        """
+        True when every output exists, is unchanged since it was recorded, and was built
+        from exactly these inputs / params / version.
+        """
+        if not all(os.path.exists(p) for p in inputs):
+            return False
+        key = self.key(stage, inputs, params, version)
+        for output in outputs:
+            entry = self.artifacts.get(f"{stage}:{os.path.normpath(output)}")
+            if entry is None or entry["key"] != key or not os.path.exists(output):
+                return False
+            if not os.path.isdir(output) and list(_stat_key(output)) != entry["stat"]:
+                return False
+        return True
+
+    def record(self, stage, inputs, outputs, params=None, version=None, seconds=None):
+        key = self.key(stage, inputs, params, version)
+        with self.lock:
+            for output in outputs:
+                self.artifacts[f"{stage}:{os.path.normpath(output)}"] = {
+                    "key": key,
+                    "inputs": [os.path.normpath(p) for p in inputs],
+                    "stat": None if os.path.isdir(output) else list(_stat_key(output)),
+                    "seconds": seconds,
+                    "created": time.strftime("%Y-%m-%dT%H:%M:%S"),
+                }
+
+    def forget(self, stage):
+        """
+        Drop every record of stage so the next run rebuilds it (--force).
+        """
+        with self.lock:
+            self.artifacts = {k: v for k, v in self.artifacts.items() if not k.startswith(f"{stage}:")}
+
+    def save(self):
+        """
+        Write atomically (tmp file + rename) so an interrupted run never leaves a broken manifest.
+        """
+        with self.lock:
+            data = {"files": self.files, "artifacts": self.artifacts}
+            tmp = f"{self.path}.tmp"
+            with open(tmp, "w") as f:
+                json.dump(data, f, indent=1, sort_keys=True)
+            os.replace(tmp, self.path)
+
+
+def run_cached(manifest, stage, inputs, outputs, build, params=None, version=None):
+    """
+    Call build() unless the outputs are fresh; record them if build() produced them.
+    Exceptions from build() propagate and nothing is recorded. Outputs that build() left untouched
+    (a build that failed quietly, with the previous run's files still on disk) are not recorded either.
+    Returns True when build() ran.
+    """
+    if manifest.fresh(stage, inputs, outputs, params, version):
+        print(f"Up to date: {', '.join(outputs)}")
+        event("cache", step=stage, output=outputs[0] if outputs else None, hit=True)
+        return False
+    event("cache", step=stage, output=outputs[0] if outputs else None, hit=False)
+    before = [_stat_key(p) if os.path.isfile(p) else None for p in outputs]
+    start = time.perf_counter()
+    build()
+    stale = [p for p, old in zip(outputs, before) if not os.path.exists(p) or (old and _stat_key(p) == old)]
+    if stale:
+        print(f"Not recording {', '.join(stale)}: not written by this build")
+    else:
+        manifest.record(stage, inputs, outputs, params, version, time.perf_counter() - start)
+    return True
@@ -1,16 +1,23 @@
 import os
 import pandas as pd
-from pyulog.ulog2csv import convert_ulog2csv
+from ulog_reader import read_ulog_topics, save_topics, export_topic_csv, process_actuator_outputs
 
 # Directories and file settings
 ulogfilepath = 'data/flightlog_raw'
+columnar_dir = 'data/flight_npz'  # Binary per-topic output (one folder per flight)
 output_dir = 'data/flight_csv'
 processed_dir = 'data/flight_csv_processed'  # Directory to store processed CSV files
 messages_type = ['actuator_outputs']
 
+# Text exports are optional; the raw topic CSVs are no longer needed by any later stage
+EXPORT_RAW_CSV = False
+EXPORT_PROCESSED_CSV = True  # audio_sync.py reads these
+
 # Ensure directories exist
-os.makedirs(output_dir, exist_ok=True)
+os.makedirs(columnar_dir, exist_ok=True)
 os.makedirs(processed_dir, exist_ok=True)
+if EXPORT_RAW_CSV:
+    os.makedirs(output_dir, exist_ok=True)
 
 # Loop through files from 01.ulg to 15.ulg
 for i in range(1, 16):
@@ -19,49 +26,34 @@ for i in range(1, 16):
     print(f"Processing {ulogfilename}...")
 
     try:
-        # Convert .ulog file to .csv
-        convert_ulog2csv(
-            ulog_file_name=ulog_full_path,
-            messages=','.join(messages_type),
-            output=output_dir,
-            delimiter=',',
-            time_s=0,
-            time_e=0,
-            disable_str_exceptions=False
-        )
+        # Parse the .ulg once, straight into NumPy arrays
+        topics = read_ulog_topics(ulog_full_path, messages_type)
+        save_topics(topics, os.path.join(columnar_dir, ulogfilename[:-4]))
     except Exception as e:
         print(f"Error converting {ulogfilename}: {e}")
         continue
 
-    # Process extracted actuator_outputs CSV
-    csv_filename = f"{ulogfilename[:-4]}_{messages_type[0]}_0.csv"
-    csv_full_path = os.path.join(output_dir, csv_filename)
+    if EXPORT_RAW_CSV:
+        for topic, fields in topics.items():
+            export_topic_csv(fields, os.path.join(output_dir, f"{ulogfilename[:-4]}_{topic}.csv"))
 
-    if os.path.exists(csv_full_path):
+    # Process extracted actuator_outputs topic
+    topic = f"{messages_type[0]}_0"
+    if topic in topics:
         try:
-            # Load data
-            df = pd.read_csv(csv_full_path)
-            if 'timestamp' not in df or 'output[0]' not in df:
-                print(f"Required columns not found in {csv_filename}. Skipping...")
+            # Keep only necessary columns, cut at flight end, normalize timestamp
+            data = process_actuator_outputs(topics[topic], ['timestamp', 'output[0]'])
+            if data is None:
+                print(f"Required columns not found in {topic} of {ulogfilename}. Skipping...")
                 continue
 
-            # Keep only necessary columns
-            df = df[['timestamp', 'output[0]']]
-
-            # Remove rows after `output[0]` reaches 1000 (flight end)
-            cutoff_index = df[df['output[0]'] == 1000].index.min()
-            if pd.notna(cutoff_index):  # If a cutoff point exists
-                df = df[:cutoff_index]  # Keep all rows until the cutoff index (exclusive)
-
-            # Normalize timestamp to start from 0 and convert to milliseconds
-            df['timestamp'] = df['timestamp'] - df['timestamp'].iloc[0]
-
             # Save processed data as a new CSV
-            processed_filename = f"{str(i).zfill(2)}.csv"
-            processed_full_path = os.path.join(processed_dir, processed_filename)
-            df.to_csv(processed_full_path, index=False)
-            print(f"Processed file saved as {processed_full_path}")
+            if EXPORT_PROCESSED_CSV:
+                processed_filename = f"{str(i).zfill(2)}.csv"
+                processed_full_path = os.path.join(processed_dir, processed_filename)
+                pd.DataFrame(data).to_csv(processed_full_path, index=False)
+                print(f"Processed file saved as {processed_full_path}")
         except Exception as e:
-            print(f"Error processing {csv_filename}: {e}")
+            print(f"Error processing {topic} of {ulogfilename}: {e}")
     else:
-        print(f"{csv_filename} not found in {output_dir}. Skipping...")
+        print(f"{topic} not found in {ulogfilename}. Skipping...")
@@ -1,72 +1,66 @@
 import os
 import pandas as pd
-from pyulog.ulog2csv import convert_ulog2csv
+from ulog_reader import (read_ulog_topics, save_topics, export_topic_csv, process_actuator_outputs,
+                         extract_track, save_track, TRACK_FIELDS)
 
 # Directories and file settings
 ulogfilepath = 'real_flight_data_1214/flightlog_raw'
+columnar_dir = 'real_flight_data_1214/flight_npz'  # Binary per-topic output (one folder per flight)
 output_dir = 'real_flight_data_1214/flight_csv'
 processed_dir = 'real_flight_data_1214/flight_csv_processed'  # Directory to store processed CSV files
-messages_type = ['actuator_outputs']
+track_dir = 'real_flight_data_1214/flight_tracks'  # <flight>.npz: all TRACK_FIELDS on one uniform time grid
+messages_type = list(TRACK_FIELDS)  # Every topic is parsed in the same pass
+required_columns = ['timestamp', 'output[0]', 'output[1]', 'output[2]', 'output[3]']
 
-# Ensure directories exist
-os.makedirs(output_dir, exist_ok=True)
-os.makedirs(processed_dir, exist_ok=True)
+# Text exports are optional; the raw topic CSVs are no longer needed by any later stage
+EXPORT_RAW_CSV = False
+EXPORT_PROCESSED_CSV = True  # audio_sync_new.py reads these
 
-# Loop through all .ulg files in the directory
-for ulogfilename in os.listdir(ulogfilepath):
-    if not ulogfilename.endswith('.ulg'):
-        continue  # Skip non-ULG files
 
-    ulog_full_path = os.path.join(ulogfilepath, ulogfilename)
-    print(f"Processing {ulogfilename}...")
+def process_ulog_file(ulog_full_path, columnar_dir=columnar_dir, output_dir=output_dir,
+                      processed_dir=processed_dir, columns=required_columns, track_dir=track_dir):
+    """
+    Parse one .ulg, store its topics as .npz, write the aligned track (track_dir/<flight>.npz)
+    and the processed actuator trace. Returns the processed columns as a dict of arrays.
+    """
+    name = os.path.splitext(os.path.basename(ulog_full_path))[0]
 
-    try:
-        # Convert .ulog file to .csv
-        convert_ulog2csv(
-            ulog_file_name=ulog_full_path,
-            messages=','.join(messages_type),
-            output=output_dir,
-            delimiter=',',
-            time_s=0,
-            time_e=0,
-            disable_str_exceptions=False
-        )
-    except Exception as e:
-        print(f"Error converting {ulogfilename}: {e}")
-        continue
+    # Parse the log once, straight into NumPy arrays
+    topics = read_ulog_topics(ulog_full_path, messages_type)
+    save_topics(topics, os.path.join(columnar_dir, name))
 
-    # Process extracted actuator_outputs CSV
-    csv_filename = f"{ulogfilename[:-4]}_{messages_type[0]}_0.csv"
-    csv_full_path = os.path.join(output_dir, csv_filename)
+    if EXPORT_RAW_CSV:
+        os.makedirs(output_dir, exist_ok=True)
+        for topic, fields in topics.items():
+            export_topic_csv(fields, os.path.join(output_dir, f"{name}_{topic}.csv"))
 
-    if os.path.exists(csv_full_path):
-        try:
-            # Load data
-            df = pd.read_csv(csv_full_path)
+    topic = "actuator_outputs_0"
+    if topic not in topics:
+        raise ValueError(f"{topic} not found in {ulog_full_path}")
+
+    if track_dir:
+        save_track(extract_track(topics), os.path.join(track_dir, f"{name}.npz"))
 
-            # Check for required columns
-            required_columns = ['timestamp', 'output[0]', 'output[1]', 'output[2]', 'output[3]']
-            if not all(col in df.columns for col in required_columns):
-                print(f"Required columns not found in {csv_filename}. Skipping...")
-                continue
+    data = process_actuator_outputs(topics[topic], columns)
+    if data is None:
+        raise ValueError(f"Required columns not found in {topic} of {ulog_full_path}")
 
-            # Keep only necessary columns
-            df = df[required_columns]
+    if EXPORT_PROCESSED_CSV:
+        os.makedirs(processed_dir, exist_ok=True)
+        processed_full_path = os.path.join(processed_dir, f"{name}.csv")
+        pd.DataFrame(data).to_csv(processed_full_path, index=False)
+        print(f"Processed file saved as {processed_full_path}")
+    return data
 
-            # Remove rows after `output[0]` reaches 1000 (flight end)
-            cutoff_index = df[df['output[0]'] == 1000].index.min()
-            if pd.notna(cutoff_index):  # If a cutoff point exists
-                df = df[:cutoff_index]  # Keep all rows until the cutoff index (exclusive)
 
-            # Normalize timestamp to start from 0 and convert to milliseconds
-            df['timestamp'] = df['timestamp'] - df['timestamp'].iloc[0]
+if __name__ == "__main__":
+    # Loop through all .ulg files in the directory
+    for ulogfilename in os.listdir(ulogfilepath):
+        if not ulogfilename.endswith('.ulg'):
+            continue  # Skip non-ULG files
 
-            # Save processed data as a new CSV
-            processed_filename = f"{ulogfilename[:-4]}.csv"
-            processed_full_path = os.path.join(processed_dir, processed_filename)
-            df.to_csv(processed_full_path, index=False)
-            print(f"Processed file saved as {processed_full_path}")
+        print(f"Processing {ulogfilename}...")
+        try:
+            process_ulog_file(os.path.join(ulogfilepath, ulogfilename))
         except Exception as e:
-            print(f"Error processing {csv_filename}: {e}")
-    else:
-        print(f"{csv_filename} not found in {output_dir}. Skipping...")
\ No newline at end of file
+            print(f"Error processing {ulogfilename}: {e}")
@@ -1,31 +1,32 @@
 import os
-import wave
-import rnnoise
-
-#CODE NOT WORKING
+import numpy as np
+import soundfile as sf
+from audio_io import decode_audio, to_float32
+from stream_denoise import RNNoiseStream, stream_denoise
+from telemetry import stage, file_bytes
 
 # Step 1: Define input and output directories
 INPUT_WAV_FOLDER = "real_flight_data_1214/wav_files"
 DENOISED_FOLDER = "real_flight_data_1214/rnnoise_denoised"
 
-os.makedirs(DENOISED_FOLDER, exist_ok=True)
-
-# Step 2: Apply RNNoise
+# Step 2: Apply RNNoise frame by frame (480 samples at 48 kHz)
 def denoise_with_rnnoise(input_wav, output_wav):
     try:
-        denoiser = rnnoise.RNNoise()
-        with wave.open(input_wav, "rb") as wav_in:
-            frames = wav_in.readframes(wav_in.getnframes())
-            params = wav_in.getparams()
+        denoiser = RNNoiseStream()
+        data, _ = decode_audio(input_wav, sample_rate=denoiser.sample_rate, channels=1)
+        audio = to_float32(data[:, 0])
 
-        # Apply noise suppression
-        denoised_frames = denoiser.filter(frames)
+        # Flush the algorithmic delay with zeros, then drop it so the output lines up with the input
+        padded = np.concatenate((audio, np.zeros(denoiser.delay_samples, dtype=np.float32)))
+        with stage("forward", backend="rnnoise", file=input_wav) as s:
+            denoised = np.concatenate(list(stream_denoise(denoiser, [padded])))
+            s.count(samples=len(padded))
+        denoised = denoised[denoiser.delay_samples:denoiser.delay_samples + len(audio)]
 
         # Save the enhanced audio
-        with wave.open(output_wav, "wb") as wav_out:
-            wav_out.setparams(params)
-            wav_out.writeframes(denoised_frames)
-
+        with stage("write", file=output_wav) as s:
+            sf.write(output_wav, denoised, denoiser.sample_rate)
+            s.count(samples=len(denoised), bytes=file_bytes(output_wav))
         print(f"RNNoise denoised audio saved to {output_wav}")
     except Exception as e:
         print(f"Error processing {input_wav}: {e}")
@@ -40,4 +41,6 @@ def process_audio_files_rnnoise(wav_folder, denoised_folder):
             denoise_with_rnnoise(input_path, output_path)
 
 # Run the RNNoise processing
-process_audio_files_rnnoise(INPUT_WAV_FOLDER, DENOISED_FOLDER)
+if __name__ == "__main__":
+    os.makedirs(DENOISED_FOLDER, exist_ok=True)
+    process_audio_files_rnnoise(INPUT_WAV_FOLDER, DENOISED_FOLDER)
@@ -0,0 +1,146 @@
+import os
+import numpy as np
+import soundfile as sf
+from ulog_reader import read_flight_log
+
+# Motor-harmonic notch + spectral gating driven by the synced actuator outputs
+WAV_FOLDER = "real_flight_data_1214/wav_files"
+ACTUATOR_DIR = "real_flight_data_1214/flight_csv_processed"
+DENOISED_FOLDER = "real_flight_data_1214/rpm_notch_denoised"
+
+N_FFT = 1024
+HOP = 256
+PWM_MIN, PWM_MAX = 1000.0, 2000.0  # Motor output range in the log
+ROTOR_HZ_AT_MAX = 100.0  # Rotor frequency at PWM_MAX (used when AUTO_CALIBRATE is off)
+AUTO_CALIBRATE = True  # Fit ROTOR_HZ_AT_MAX per recording from the spectrogram
+CALIBRATION_RANGE_HZ = (50.0, 600.0)
+N_HARMONICS = 12  # Harmonics of the rotor frequency per motor
+CALIBRATION_HARMONICS = 4  # Fewer harmonics for the fit; long combs favour sub-multiples of the true scale
+NOTCH_WIDTH_HZ = 6.0  # Gaussian notch std at the fundamental; grows with sqrt(harmonic)
+NOTCH_DEPTH = 0.9  # Attenuation at the notch centre (0..1)
+GATE_PERCENTILE = 20  # Per-bin noise floor estimate for spectral gating
+GATE_STRENGTH = 1.5  # Over-subtraction factor of the noise floor
+MIN_GAIN = 0.1  # Floor of the combined mask (limits musical noise)
+BLOCK_FRAMES = 128  # Frames per block when building the mask
+CALIBRATION_FRAMES = 400  # Frames sampled for the scale fit
+
+
+def load_actuator_outputs(csv_file):
+    """
+    Return (time in s, outputs [samples, motors]) from a flight_csv_processed CSV or flight_tracks .npz.
+    """
+    df = read_flight_log(csv_file)
+    columns = [c for c in df.columns if c.startswith('output[')]
+    t = (df['timestamp'].to_numpy(dtype=np.float64) - float(df['timestamp'].iloc[0])) / 1e6
+    return t, df[columns].to_numpy(dtype=np.float64)
+
+
+def outputs_at(frame_times, t, outputs):
+    """
+    Linear interpolation of every motor channel onto the STFT frame times -> [frames, motors].
+    """
+    return np.stack([np.interp(frame_times, t, outputs[:, m]) for m in range(outputs.shape[1])], axis=1)
+
+
+def rotor_hz(pwm, hz_at_max=ROTOR_HZ_AT_MAX):
+    return np.clip((pwm - PWM_MIN) / (PWM_MAX - PWM_MIN), 0.0, None) * hz_at_max
+
+
+def calibrate_rotor_scale(power, freqs, pwm, candidates=None, n_harmonics=CALIBRATION_HARMONICS):
+    """
+    Pick the PWM->rotor-Hz scale whose harmonic comb collects the most log-power.
+    power: [bins, frames]; pwm: [frames, motors]. Evaluated for all candidates at once.
+    """
+    if candidates is None:
+        candidates = np.linspace(*CALIBRATION_RANGE_HZ, 221)
+    from scipy.ndimage import uniform_filter1d
+    stride = max(1, power.shape[1] // CALIBRATION_FRAMES)
+    log_power = np.log10(power[:, ::stride] + 1e-12)
+    # Whiten along frequency so peaks count, not the overall low-frequency tilt
+    log_power -= uniform_filter1d(log_power, 15, axis=0)
+    frames = np.arange(log_power.shape[1])
+    base = rotor_hz(pwm[::stride], 1.0)  # [frames, motors]
+    harmonics = np.arange(1, n_harmonics + 1)
+
+    # [candidates, frames, motors, harmonics] target frequencies -> nearest bins
+    target = candidates[:, None, None, None] * base[None, :, :, None] * harmonics
+    bins = np.clip(np.rint(target / freqs[1]).astype(np.int64), 0, len(freqs) - 1)
+    score = log_power[bins, frames[None, :, None, None]]
+    score = np.where(target > freqs[1], score, np.nan)
+    return float(candidates[np.nanargmax(np.nanmean(score, axis=(1, 2, 3)))])
+
+
+def harmonic_mask(freqs, f0, n_harmonics=N_HARMONICS, width=NOTCH_WIDTH_HZ, depth=NOTCH_DEPTH):
+    """
+    Time-varying notch mask [bins, frames] for rotor fundamentals f0 [frames, motors].
+    """
+    harmonics = np.arange(1, n_harmonics + 1)
+    widths = width * np.sqrt(harmonics)
+    mask = np.empty((len(freqs), len(f0)), dtype=np.float32)
+    for start in range(0, len(f0), BLOCK_FRAMES):
+        centers = f0[start:start + BLOCK_FRAMES, :, None] * harmonics  # [frames, motors, harmonics]
+        dist = (freqs[:, None, None, None] - centers[None]) / widths  # [bins, frames, motors, harmonics]
+        notch = 1.0 - depth * np.exp(-0.5 * dist ** 2)
+        notch = np.where(centers[None] > 0, notch, 1.0)
+        mask[:, start:start + BLOCK_FRAMES] = notch.prod(axis=(2, 3))
+    return mask
+
+
+def denoise_rpm(audio, sample_rate, t, outputs, hz_at_max=None):
+    """
+    Apply the harmonic notch and spectral gate to mono float32 audio that starts at log time 0.
+    Returns (enhanced audio, fitted rotor Hz at PWM_MAX).
+    """
+    from scipy.signal import stft, istft
+    freqs, frame_times, spec = stft(audio, sample_rate, nperseg=N_FFT, noverlap=N_FFT - HOP)
+    power = spec.real ** 2 + spec.imag ** 2
+    pwm = outputs_at(frame_times, t, outputs)
+
+    if hz_at_max is None:
+        hz_at_max = calibrate_rotor_scale(power, freqs, pwm) if AUTO_CALIBRATE else ROTOR_HZ_AT_MAX
+    notch = harmonic_mask(freqs, rotor_hz(pwm, hz_at_max))
+
+    # Spectral gating on what the notches leave behind
+    residual = power * notch ** 2
+    floor = np.percentile(residual, GATE_PERCENTILE, axis=1, keepdims=True)
+    gate = np.clip(1.0 - GATE_STRENGTH * floor / (residual + 1e-12), 0.0, 1.0)
+
+    mask = np.maximum(notch * gate, MIN_GAIN)
+    _, enhanced = istft(spec * mask, sample_rate, nperseg=N_FFT, noverlap=N_FFT - HOP)
+    return enhanced[:len(audio)].astype(np.float32), hz_at_max
+
+
+def actuator_csv_for(audio_file, actuator_dir=ACTUATOR_DIR):
+    # "<flight>_trimmed.wav" / "<flight>.wav" -> "<actuator_dir>/<flight>.csv"
+    name = os.path.splitext(os.path.basename(audio_file))[0]
+    for suffix in ("_trimmed", ""):
+        if name.endswith(suffix):
+            candidate = os.path.join(actuator_dir, name[:len(name) - len(suffix)] + ".csv")
+            if os.path.exists(candidate):
+                return candidate
+    return None
+
+
+def denoise_with_rpm_notch(input_wav, actuator_csv, output_wav):
+    data, rate = sf.read(input_wav, dtype="float32", always_2d=True)
+    t, outputs = load_actuator_outputs(actuator_csv)
+    enhanced, hz_at_max = denoise_rpm(data.mean(axis=1), rate, t, outputs)
+    sf.write(output_wav, enhanced, rate)
+    print(f"RPM-notch denoised audio saved to {output_wav} (rotor {hz_at_max:.0f} Hz at PWM {PWM_MAX:.0f})")
+
+
+if __name__ == "__main__":
+    os.makedirs(DENOISED_FOLDER, exist_ok=True)
+    for file_name in os.listdir(WAV_FOLDER):
+        if file_name.endswith(".wav"):
+            input_path = os.path.join(WAV_FOLDER, file_name)
+            actuator_csv = actuator_csv_for(input_path)
+            if actuator_csv is None:
+                print(f"No actuator CSV for {file_name}. Skipping...")
+                continue
+            output_path = os.path.join(DENOISED_FOLDER, file_name.replace(".wav", "_denoised.wav"))
+            print(f"Processing {file_name}...")
+            try:
+                denoise_with_rpm_notch(input_path, actuator_csv, output_path)
+            except Exception as e:
+                print(f"Error processing {file_name}: {e}")
@@ -1,66 +1,78 @@
 import os
-import torchaudio
-import torch
-from pydub import AudioSegment
-from speechbrain.inference import SpectralMaskEnhancement
+from functools import lru_cache
+import numpy as np
+from audio_io import load_channels
+from pipeline_cache import Manifest, run_cached
+from telemetry import stage, file_bytes
 
 # Define folders
 INPUT_M4A_FOLDER = "real_flight_data_1214/audio_synced"  # Input .m4a files
 WAV_FOLDER = "testset_1216/testset_noisy"           # Intermediate .wav files
 OUTPUT_FOLDER = "testset_1216/speechbrain_denoised"  # Output denoised .wav files
+MODEL_SOURCE = "speechbrain/metricgan-plus-voicebank"
+SAMPLE_RATE = 16000  # MetricGAN+ was trained on 16 kHz VoiceBank
+DENOISE_VERSION = 1  # Bump when the output changes so cached results are rebuilt
+CONVERT_M4A = False  # WAV_FOLDER currently holds the test set, not converted flight audio
+CHANNEL_MODE = "mono"  # "keep": every mic channel is a batch row of one forward pass, "beamform": delay-and-sum
 
 # Ensure folders exist
 os.makedirs(WAV_FOLDER, exist_ok=True)
 os.makedirs(OUTPUT_FOLDER, exist_ok=True)
 
-# Load the speech enhancement model
-enhancer = SpectralMaskEnhancement.from_hparams(
-    source="speechbrain/metricgan-plus-voicebank",
-    savedir="pretrained_models/speech_enhancement"
-)
+# Load the speech enhancement model (on first use, so importing this module stays cheap)
+@lru_cache(maxsize=None)
+def load_enhancer():
+    from speechbrain.inference import SpectralMaskEnhancement
+    return SpectralMaskEnhancement.from_hparams(
+        source=MODEL_SOURCE,
+        savedir="pretrained_models/speech_enhancement"
+    )
 
 # Step 1: Convert .m4a to .wav
 def convert_m4a_to_wav(input_file, output_file):
-    audio = AudioSegment.from_file(input_file, format="m4a")
-    audio.export(output_file, format="wav")
+    from pydub import AudioSegment
+    with stage("m4a_to_wav", file=input_file) as s:
+        audio = AudioSegment.from_file(input_file, format="m4a")
+        audio.export(output_file, format="wav")
+        s.count(bytes=file_bytes(input_file), samples=int(audio.frame_count()) * audio.channels)
     print(f"Converted {input_file} to {output_file}")
 
 # Step 2: Apply SpeechBrain denoising
 def denoise_with_speechbrain(input_file, output_file):
-    # Load the audio
-    noisy_audio, sample_rate = torchaudio.load(input_file)
-    
-    # Ensure mono audio: if stereo, average the channels
-    if noisy_audio.shape[0] > 1:
-        noisy_audio = torch.mean(noisy_audio, dim=0, keepdim=True)  # [1, time]
+    import torch
+    import torchaudio
+    # Load at 16 kHz (resampled once per file and cached on disk); channels become the batch
+    audio, sample_rate = load_channels(input_file, SAMPLE_RATE, CHANNEL_MODE)
+    noisy_audio = torch.from_numpy(np.ascontiguousarray(audio.T))  # [channels, time]
 
-    # Resample to 16 kHz if necessary
-    if sample_rate != 16000:
-        resample_transform = torchaudio.transforms.Resample(orig_freq=sample_rate, new_freq=16000)
-        noisy_audio = resample_transform(noisy_audio)
-        sample_rate = 16000
-
-    # Set lengths as a relative fraction of the full audio. Full length = 1.0
-    lengths = torch.tensor([1.0], dtype=torch.float32)
+    # Set lengths as a relative fraction of the full audio. Full length = 1.0 for every channel
+    lengths = torch.ones(noisy_audio.shape[0], dtype=torch.float32)
 
     # Apply enhancement
-    enhanced_audio = enhancer.enhance_batch(noisy_audio, lengths=lengths)
+    with stage("forward", backend="speechbrain", file=input_file) as s:
+        enhanced_audio = load_enhancer().enhance_batch(noisy_audio, lengths=lengths)
+        s.count(samples=noisy_audio.numel())
 
     # Save the enhanced audio
-    torchaudio.save(output_file, enhanced_audio.cpu(), sample_rate)
+    with stage("write", file=output_file) as s:
+        torchaudio.save(output_file, enhanced_audio.cpu(), sample_rate)
+        s.count(samples=enhanced_audio.numel(), bytes=file_bytes(output_file))
     print(f"Denoised audio saved to {output_file}")
 
 # Step 3: Process all .m4a files
 def process_audio_files(m4a_folder, wav_folder, output_folder):
-    # Step 3.1: Convert all .m4a to .wav
-    # for file_name in os.listdir(m4a_folder):
-    #     if file_name.endswith(".m4a"):
-    #         m4a_path = os.path.join(m4a_folder, file_name)
-    #         wav_path = os.path.join(wav_folder, file_name.replace(".m4a", ".wav"))
-    #         try:
-    #             convert_m4a_to_wav(m4a_path, wav_path)
-    #         except Exception as e:
-    #             print(f"Error converting {file_name}: {e}")
+    # Step 3.1: Convert .m4a to .wav (only when CONVERT_M4A is set; unchanged files are skipped)
+    manifest = Manifest()
+    if CONVERT_M4A:
+        for file_name in os.listdir(m4a_folder):
+            if file_name.endswith(".m4a"):
+                m4a_path = os.path.join(m4a_folder, file_name)
+                wav_path = os.path.join(wav_folder, file_name.replace(".m4a", ".wav"))
+                try:
+                    run_cached(manifest, "m4a_to_wav", [m4a_path], [wav_path],
+                               lambda: convert_m4a_to_wav(m4a_path, wav_path))
+                except Exception as e:
+                    print(f"Error converting {file_name}: {e}")
 
     # Step 3.2: Perform SpeechBrain denoising on the .wav files
     for file_name in os.listdir(wav_folder):
@@ -69,9 +81,12 @@ def process_audio_files(m4a_folder, wav_folder, output_folder):
             output_path = os.path.join(output_folder, file_name.replace(".wav", "_denoised.wav"))
             print(f"Processing {file_name}...")
             try:
-                denoise_with_speechbrain(input_path, output_path)
+                run_cached(manifest, "speechbrain", [input_path], [output_path],
+                           lambda: denoise_with_speechbrain(input_path, output_path),
+                           {"model": MODEL_SOURCE, "channel_mode": CHANNEL_MODE}, DENOISE_VERSION)
             except Exception as e:
                 print(f"Error processing {file_name}: {e}")
+    manifest.save()
 
 # Main process
 if __name__ == "__main__":
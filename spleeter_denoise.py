@@ -0,0 +1,22 @@
+## Spleeter model
+from functools import lru_cache
+from telemetry import stage, file_bytes
+
+# Step 1: Initialize Spleeter (on first use; TensorFlow alone takes seconds to import)
+@lru_cache(maxsize=None)
+def load_separator():
+    from spleeter.separator import Separator
+    return Separator('spleeter:2stems')  # Separate vocals and accompaniment
+
+# Step 2: Denoise audio
+def denoise_with_spleeter(input_file, output_file):
+    with stage("forward", backend="spleeter", file=input_file) as s:
+        load_separator().separate_to_file(input_file, output_file)
+        s.count(bytes=file_bytes(input_file))
+    print(f"Separated and denoised audio saved to {output_file}")
+
+# Example usage
+if __name__ == "__main__":
+    input_file = "real_flight_data/audio_synced/noisy_audio.m4a"
+    output_folder = "real_flight_data/spleeter_denoised/"
+    denoise_with_spleeter(input_file, output_folder)
@@ -0,0 +1,231 @@
+import sys
+import time
+import argparse
+import numpy as np
+from audio_io import load_audio, resample, to_float32
+
+# Frame-in / frame-out denoising for live audio (stdin, a microphone generator, ...)
+STDIN_DTYPE = np.int16  # Raw s16le mono PCM, e.g. `ffmpeg -i <input> -f s16le -ac 1 -ar 48000 -`
+BLOCK_SECONDS = 0.32  # Block length when a whole-signal backend is run as a stream
+BLOCK_HOP_SECONDS = 0.16  # Frame size of such a stream (half a block: Hann overlap-add sums to one)
+BENCH_SECONDS = 30.0  # Audio used by the latency benchmark
+
+
+class StreamDenoiser:
+    """
+    Stateful denoiser fed with fixed-size float32 mono frames at sample_rate.
+    process_frame() returns one frame of the same size. The output signal lags the input
+    by delay_samples; the algorithmic latency adds the one frame that has to be buffered.
+    """
+    name = None
+    sample_rate = None
+    frame_size = None
+    delay_samples = 0
+
+    @property
+    def latency_ms(self):
+        return 1000.0 * (self.frame_size + self.delay_samples) / self.sample_rate
+
+    def process_frame(self, frame):
+        raise NotImplementedError
+
+    def reset(self):
+        pass
+
+
+class RNNoiseStream(StreamDenoiser):
+    """
+    RNNoise (pyrnnoise): 10 ms frames at 48 kHz.
+    """
+    name = "rnnoise"
+    sample_rate = 48000
+    frame_size = 480
+    delay_samples = 960  # Measured by cross-correlation with librnnoise 0.2 (frame overlap + lookahead)
+
+    def __init__(self):
+        from pyrnnoise import rnnoise
+        self.rnnoise = rnnoise
+        self.state = rnnoise.create()
+
+    def process_frame(self, frame):
+        pcm = (np.clip(frame, -1.0, 1.0 - 1 / 32768) * 32768).astype(np.int16)
+        out, _ = self.rnnoise.process_mono_frame(self.state, pcm)  # Second value: speech probability
+        return out.astype(np.float32) / 32768.0
+
+    def reset(self):
+        self.rnnoise.destroy(self.state)
+        self.state = self.rnnoise.create()
+
+    def __del__(self):
+        if getattr(self, "state", None) is not None:
+            self.rnnoise.destroy(self.state)
+            self.state = None
+
+
+class BlockStream(StreamDenoiser):
+    """
+    Runs a whole-signal denoiser fn(audio, sample_rate) on a sliding block and crossfades
+    consecutive blocks with a periodic Hann window (hop = half a block). Frames are one hop
+    long and the output lags by one more hop, so the algorithmic latency is one block.
+    """
+
+    def __init__(self, fn, sample_rate, block_seconds=BLOCK_SECONDS, hop_seconds=BLOCK_HOP_SECONDS, name=None):
+        self.fn = fn
+        self.name = name
+        self.sample_rate = sample_rate
+        self.block = int(round(block_seconds * sample_rate))
+        self.frame_size = int(round(hop_seconds * sample_rate))
+        if self.block != 2 * self.frame_size:
+            raise ValueError("BlockStream needs hop_seconds == block_seconds / 2")
+        self.delay_samples = self.frame_size
+        self.window = np.hanning(self.block + 1)[:-1].astype(np.float32)  # Periodic: 50% overlap sums to 1
+        self.reset()
+
+    def reset(self):
+        self.history = np.zeros(self.block, dtype=np.float32)
+        self.tail = np.zeros(self.frame_size, dtype=np.float32)
+
+    def process_frame(self, frame):
+        self.history = np.concatenate((self.history[self.frame_size:], frame))
+        enhanced = np.asarray(self.fn(self.history, self.sample_rate), dtype=np.float32)[:self.block] * self.window
+        out = self.tail + enhanced[:self.frame_size]
+        self.tail = enhanced[self.frame_size:]
+        return out
+
+
+def deepfilternet_stream(block_seconds=BLOCK_SECONDS, hop_seconds=BLOCK_HOP_SECONDS):
+    """
+    DeepFilterNet on short overlapping blocks at 48 kHz (the Python package has no frame API).
+    """
+    return backend_stream("deepfilternet", block_seconds, hop_seconds)
+
+
+def backend_stream(name, block_seconds=BLOCK_SECONDS, hop_seconds=BLOCK_HOP_SECONDS):
+    """
+    Wrap any denoise_engine backend with a fixed model rate as a BlockStream.
+    """
+    from denoise_engine import load_backends
+    backend = load_backends([name])[name]
+    if backend.sample_rate is None or backend.uses_source:
+        raise ValueError(f"Backend '{name}' cannot be streamed (needs a fixed rate and no source file)")
+    return BlockStream(backend, backend.sample_rate, block_seconds, hop_seconds, name=name)
+
+
+STREAMS = {
+    "rnnoise": RNNoiseStream,
+    "deepfilternet": deepfilternet_stream,
+}
+
+
+def make_stream(name):
+    return STREAMS[name]() if name in STREAMS else backend_stream(name)
+
+
+def reframe(chunks, frame_size):
+    """
+    Regroup float32 chunks of any length into frames of exactly frame_size samples.
+    The last partial frame is zero-padded.
+    """
+    pending = np.zeros(0, dtype=np.float32)
+    for chunk in chunks:
+        pending = np.concatenate((pending, to_float32(np.asarray(chunk)).reshape(-1)))
+        n = len(pending) // frame_size * frame_size
+        for start in range(0, n, frame_size):
+            yield pending[start:start + frame_size]
+        pending = pending[n:]
+    if len(pending):
+        yield np.concatenate((pending, np.zeros(frame_size - len(pending), dtype=np.float32)))
+
+
+def frames_from_array(audio, frame_size):
+    return reframe([audio], frame_size)
+
+
+def frames_from_stdin(frame_size, stream=None):
+    """
+    Read raw mono s16le PCM from stdin one frame at a time.
+    """
+    stream = stream or sys.stdin.buffer
+    itemsize = np.dtype(STDIN_DTYPE).itemsize
+    chunks = (np.frombuffer(raw[:len(raw) - len(raw) % itemsize], dtype=STDIN_DTYPE)
+              for raw in iter(lambda: stream.read(frame_size * itemsize), b""))
+    return reframe(chunks, frame_size)
+
+
+def stream_denoise(denoiser, frames, timings=None):
+    """
+    Denoise an iterable of frames (any chunk size; regrouped to denoiser.frame_size) and
+    yield denoised frames as soon as they are ready. If timings is a list, the compute
+    time of every frame (seconds) is appended to it.
+    """
+    for frame in reframe(frames, denoiser.frame_size):
+        start = time.perf_counter()
+        out = denoiser.process_frame(frame)
+        if timings is not None:
+            timings.append(time.perf_counter() - start)
+        yield out
+
+
+def denoise_stdin(denoiser, out=None):
+    """
+    stdin s16le -> denoised s16le on stdout, frame by frame (flushed after every frame).
+    """
+    out = out or sys.stdout.buffer
+    print(f"{denoiser.name}: {denoiser.sample_rate} Hz mono s16le, frames of {denoiser.frame_size} samples, "
+          f"latency {denoiser.latency_ms:.1f} ms", file=sys.stderr)
+    for frame in stream_denoise(denoiser, frames_from_stdin(denoiser.frame_size)):
+        out.write((np.clip(frame, -1.0, 1.0 - 1 / 32768) * 32768).astype(STDIN_DTYPE).tobytes())
+        out.flush()
+
+
+def benchmark(denoiser, audio):
+    """
+    Per-frame compute time percentiles (ms) against the real-time budget of one frame.
+    audio: mono float32 at denoiser.sample_rate.
+    """
+    timings = []
+    for _ in stream_denoise(denoiser, frames_from_array(audio, denoiser.frame_size), timings):
+        pass
+    ms = 1000.0 * np.asarray(timings)
+    budget_ms = 1000.0 * denoiser.frame_size / denoiser.sample_rate
+    return {
+        "stream": denoiser.name,
+        "frames": len(ms),
+        "frame_ms": budget_ms,
+        "latency_ms": denoiser.latency_ms,
+        "p50_ms": float(np.percentile(ms, 50)),
+        "p90_ms": float(np.percentile(ms, 90)),
+        "p99_ms": float(np.percentile(ms, 99)),
+        "max_ms": float(ms.max()),
+        "overruns": int((ms > budget_ms).sum()),  # Frames that took longer than real time
+        "rtf": float(ms.sum() / (budget_ms * len(ms))),
+    }
+
+
+def print_benchmark(result):
+    print(f"{result['stream']}: {result['frames']} frames of {result['frame_ms']:.1f} ms, "
+          f"latency {result['latency_ms']:.1f} ms | compute p50 {result['p50_ms']:.2f} / "
+          f"p90 {result['p90_ms']:.2f} / p99 {result['p99_ms']:.2f} / max {result['max_ms']:.2f} ms | "
+          f"overruns {result['overruns']} | RTF {result['rtf']:.3f}")
+
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description="Streaming (frame-by-frame) denoising")
+    sub = parser.add_subparsers(dest="command", required=True)
+    p_run = sub.add_parser("run", help="Denoise raw mono s16le from stdin to stdout")
+    p_run.add_argument("-b", "--backend", default="rnnoise")
+    p_bench = sub.add_parser("bench", help="Per-frame latency percentiles on a recording")
+    p_bench.add_argument("input")
+    p_bench.add_argument("-b", "--backends", default="rnnoise")
+    p_bench.add_argument("--seconds", type=float, default=BENCH_SECONDS)
+    args = parser.parse_args()
+
+    if args.command == "run":
+        denoise_stdin(make_stream(args.backend))
+    else:
+        data, sample_rate = load_audio(args.input)
+        mono = np.asarray(data.mean(axis=1), dtype=np.float32)
+        for name in args.backends.split(","):
+            denoiser = make_stream(name)
+            audio = resample(mono, sample_rate, denoiser.sample_rate)[:int(args.seconds * denoiser.sample_rate)]
+            print_benchmark(benchmark(denoiser, audio))
@@ -0,0 +1,162 @@
+import os
+import sys
+import json
+import time
+import argparse
+import threading
+import cProfile
+
+# Structured timing records (one JSON object per line) shared by every script of the pipeline
+TELEMETRY_FILE = os.environ.get("TELEMETRY_FILE", "telemetry.jsonl")  # Empty string disables recording
+PROFILE_DIR = os.environ.get("TELEMETRY_PROFILE") or None  # Set to a folder to cProfile every outermost stage
+# One id per run; exported so worker processes started by this run report under the same id
+RUN_ID = os.environ.setdefault("TELEMETRY_RUN_ID", f"{time.strftime('%Y%m%dT%H%M%S')}-{os.getpid()}")
+SCRIPT = os.path.splitext(os.path.basename(sys.argv[0] or "python"))[0]
+
+_lock = threading.Lock()
+_local = threading.local()
+_sink = {"file": None, "pid": None}
+_profile_seq = [0]
+
+
+def emit(record):
+    """
+    Append one record to TELEMETRY_FILE as a JSON line (no-op when telemetry is disabled).
+    """
+    if not TELEMETRY_FILE:
+        return
+    line = json.dumps({"ts": time.strftime("%Y-%m-%dT%H:%M:%S"), "run": RUN_ID, "script": SCRIPT,
+                       "pid": os.getpid(), **record}, default=str) + "\n"
+    with _lock:
+        if _sink["pid"] != os.getpid():  # Reopen after fork; the parent's buffer is not ours
+            _sink["file"], _sink["pid"] = open(TELEMETRY_FILE, "a", buffering=1), os.getpid()
+        _sink["file"].write(line)
+
+
+def event(name, **fields):
+    emit({"stage": name, "event": True, **fields})
+
+
+class Stage:
+    """
+    Context manager timing one unit of work. Counters added with count() (bytes, samples,
+    rows, ...) are summed into the record. Exceptions are recorded and re-raised.
+    While the stage runs its thread is named "stage:<name>", which shows up in py-spy dumps;
+    with TELEMETRY_PROFILE set the outermost stage of each thread is run under cProfile.
+
+        with stage("decode", file=path) as s:
+            data = ...
+            s.count(samples=len(data), bytes=os.path.getsize(path))
+    """
+
+    def __init__(self, name, **fields):
+        self.name = name
+        self.fields = fields
+        self.counters = {}
+        self.profiler = None
+
+    def tag(self, **fields):
+        self.fields.update(fields)
+        return self
+
+    def count(self, **counters):
+        for key, value in counters.items():
+            self.counters[key] = self.counters.get(key, 0) + int(value)
+        return self
+
+    def __enter__(self):
+        depth = getattr(_local, "depth", 0)
+        _local.depth = depth + 1
+        self.thread = threading.current_thread()
+        self.thread_name = self.thread.name
+        self.thread.name = f"stage:{self.name}"
+        if PROFILE_DIR and depth == 0:
+            self.profiler = cProfile.Profile()
+            self.profiler.enable()
+        self.start, self.cpu_start = time.perf_counter(), time.thread_time()
+        return self
+
+    def __exit__(self, exc_type, exc, tb):
+        seconds, cpu = time.perf_counter() - self.start, time.thread_time() - self.cpu_start
+        _local.depth -= 1
+        self.thread.name = self.thread_name
+        record = {"stage": self.name, "seconds": round(seconds, 6), "cpu_seconds": round(cpu, 6),
+                  "ok": exc_type is None, **self.fields, **self.counters}
+        if exc_type is not None:
+            record["error"] = f"{exc_type.__name__}: {exc}"
+        if self.profiler is not None:
+            self.profiler.disable()
+            os.makedirs(PROFILE_DIR, exist_ok=True)
+            with _lock:
+                _profile_seq[0] += 1
+                n = _profile_seq[0]
+            record["profile"] = os.path.join(PROFILE_DIR, f"{self.name}-{os.getpid()}-{n}.prof")
+            self.profiler.dump_stats(record["profile"])
+        emit(record)
+        return False
+
+
+def stage(name, **fields):
+    return Stage(name, **fields)
+
+
+def file_bytes(path):
+    try:
+        return os.path.getsize(path)
+    except (OSError, TypeError):
+        return 0
+
+
+def load_records(paths):
+    records = []
+    for path in paths:
+        with open(path) as f:
+            records.extend(json.loads(line) for line in f if line.strip())
+    return records
+
+
+def summarize(records, by=("stage",)):
+    """
+    Per-group totals of timed records: calls, failures, wall / CPU seconds, p95 and throughput.
+    """
+    import pandas as pd
+    df = pd.DataFrame([r for r in records if not r.get("event")])
+    if df.empty:
+        return df
+    for column in ("bytes", "samples"):
+        if column not in df:
+            df[column] = 0
+    by = [b for b in by if b in df]
+    grouped = df.groupby(by, dropna=False)
+    summary = pd.DataFrame({
+        "calls": grouped.size(),
+        "failed": grouped["ok"].apply(lambda ok: int((~ok.astype(bool)).sum())),
+        "total_s": grouped["seconds"].sum(),
+        "cpu_s": grouped["cpu_seconds"].sum(),
+        "mean_ms": grouped["seconds"].mean() * 1000,
+        "p95_ms": grouped["seconds"].quantile(0.95) * 1000,
+        "MB": grouped["bytes"].sum() / 1e6,
+        "Msamples": grouped["samples"].sum() / 1e6,
+    })
+    summary["MB/s"] = summary["MB"] / summary["total_s"].clip(lower=1e-9)
+    return summary.sort_values("total_s", ascending=False)
+
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description="Aggregate telemetry JSON lines across runs")
+    parser.add_argument("files", nargs="*", default=[TELEMETRY_FILE])
+    parser.add_argument("--run", default=None, help="Only this run id (default: all runs)")
+    parser.add_argument("--last", action="store_true", help="Only the most recent run")
+    parser.add_argument("--by", default="stage", help="Comma-separated grouping fields, e.g. stage,backend")
+    parser.add_argument("--script", default=None, help="Only records of this script")
+    args = parser.parse_args()
+
+    records = load_records(args.files)
+    if args.last and records:
+        args.run = max(records, key=lambda r: r["ts"])["run"]
+    records = [r for r in records if (args.run is None or r["run"] == args.run)
+               and (args.script is None or r["script"] == args.script)]
+    runs = sorted({r["run"] for r in records})
+    print(f"{len(records)} records from {len(runs)} run(s)")
+    summary = summarize(records, args.by.split(","))
+    print(summary.to_string(float_format=lambda x: f"{x:.3f}") if len(summary) else "Nothing recorded")
@@ -0,0 +1,123 @@
+import os
+import time
+import argparse
+from concurrent.futures import ProcessPoolExecutor, as_completed
+import px4_log_new
+import ulog_reader
+from px4_log_new import process_ulog_file
+from pipeline_cache import Manifest, MANIFEST_FILE
+
+# Defaults (same layout as px4_log_new.py)
+ULOG_DIR = 'real_flight_data_1214/flightlog_raw'
+COLUMNAR_DIR = 'real_flight_data_1214/flight_npz'
+PROCESSED_DIR = 'real_flight_data_1214/flight_csv_processed'
+TRACK_DIR = 'real_flight_data_1214/flight_tracks'
+NUM_WORKERS = os.cpu_count() or 1
+INGEST_VERSION = 3  # Bump when process_ulog_file output changes so cached flights are rebuilt
+
+
+def ingest_outputs(ulog_full_path, columnar_dir=COLUMNAR_DIR, processed_dir=PROCESSED_DIR, track_dir=TRACK_DIR):
+    name = os.path.splitext(os.path.basename(ulog_full_path))[0]
+    outputs = [os.path.join(columnar_dir, name), os.path.join(track_dir, f"{name}.npz")]
+    if px4_log_new.EXPORT_PROCESSED_CSV:
+        outputs.append(os.path.join(processed_dir, f"{name}.csv"))
+    return outputs
+
+
+def ingest_params():
+    return {"messages": px4_log_new.messages_type, "columns": px4_log_new.required_columns,
+            "raw_csv": px4_log_new.EXPORT_RAW_CSV, "processed_csv": px4_log_new.EXPORT_PROCESSED_CSV,
+            "track": {"fields": ulog_reader.TRACK_FIELDS, "rate_hz": ulog_reader.TRACK_RATE_HZ,
+                      "armed_pwm": ulog_reader.ARMED_PWM, "min_gap": ulog_reader.MIN_GAP_SECONDS,
+                      "min_segment": ulog_reader.MIN_SEGMENT_SECONDS}}
+
+
+def ingest_file(ulog_full_path, columnar_dir=COLUMNAR_DIR, processed_dir=PROCESSED_DIR, track_dir=TRACK_DIR):
+    """
+    Ingest a single .ulg and return a result record instead of raising.
+    """
+    start = time.perf_counter()
+    result = {
+        "file": ulog_full_path,
+        "bytes": os.path.getsize(ulog_full_path),
+        "ok": False,
+        "rows": 0,
+        "seconds": 0.0,
+        "error": None,
+    }
+    try:
+        data = process_ulog_file(ulog_full_path, columnar_dir=columnar_dir, processed_dir=processed_dir,
+                                 track_dir=track_dir)
+        result["rows"] = len(data['timestamp'])
+        result["ok"] = True
+    except Exception as e:
+        result["error"] = f"{type(e).__name__}: {e}"
+    result["seconds"] = time.perf_counter() - start
+    return result
+
+
+def ingest_directory(ulog_dir=ULOG_DIR, columnar_dir=COLUMNAR_DIR, processed_dir=PROCESSED_DIR,
+                     workers=NUM_WORKERS, manifest=None, track_dir=TRACK_DIR):
+    """
+    Ingest every .ulg in ulog_dir with a process pool.
+    With a Manifest, flights whose log and settings are unchanged since the last run are skipped.
+    Returns the per-file result records (sorted by file name) of the flights that were ingested.
+    """
+    files = sorted(os.path.join(ulog_dir, f) for f in os.listdir(ulog_dir) if f.endswith('.ulg'))
+    if manifest is not None:
+        params = ingest_params()
+        stale = [f for f in files
+                 if not manifest.fresh("ingest", [f], ingest_outputs(f, columnar_dir, processed_dir, track_dir),
+                                       params, INGEST_VERSION)]
+        print(f"{len(files) - len(stale)}/{len(files)} flights unchanged, skipping")
+        files = stale
+    start = time.perf_counter()
+
+    if workers <= 1:
+        results = [ingest_file(f, columnar_dir, processed_dir, track_dir) for f in files]
+    else:
+        results = []
+        with ProcessPoolExecutor(max_workers=workers) as pool:
+            futures = [pool.submit(ingest_file, f, columnar_dir, processed_dir, track_dir) for f in files]
+            for future in as_completed(futures):
+                results.append(future.result())
+        results.sort(key=lambda r: r["file"])
+
+    elapsed = time.perf_counter() - start
+    if manifest is not None:
+        for r in results:
+            if r["ok"]:
+                manifest.record("ingest", [r["file"]],
+                                ingest_outputs(r["file"], columnar_dir, processed_dir, track_dir),
+                                params, INGEST_VERSION, r["seconds"])
+        manifest.save()
+    print_summary(results, elapsed, workers)
+    return results
+
+
+def print_summary(results, elapsed, workers):
+    n_ok = sum(r["ok"] for r in results)
+    total_mb = sum(r["bytes"] for r in results) / 1e6
+    elapsed = max(elapsed, 1e-9)
+    for r in results:
+        if not r["ok"]:
+            print(f"FAILED {r['file']}: {r['error']}")
+    print(f"Ingested {n_ok}/{len(results)} files with {workers} worker(s) in {elapsed:.2f} s "
+          f"({len(results) / elapsed:.2f} files/s, {total_mb / elapsed:.2f} MB/s)")
+
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description="Parallel ULog ingest for a whole flight directory")
+    parser.add_argument("--ulog-dir", default=ULOG_DIR)
+    parser.add_argument("--columnar-dir", default=COLUMNAR_DIR)
+    parser.add_argument("--processed-dir", default=PROCESSED_DIR)
+    parser.add_argument("--track-dir", default=TRACK_DIR)
+    parser.add_argument("-j", "--workers", type=int, default=NUM_WORKERS)
+    parser.add_argument("--manifest", default=MANIFEST_FILE)
+    parser.add_argument("--force", action="store_true", help="Re-ingest every flight, ignoring the manifest")
+    args = parser.parse_args()
+
+    manifest = Manifest(args.manifest)
+    if args.force:
+        manifest.forget("ingest")
+    ingest_directory(args.ulog_dir, args.columnar_dir, args.processed_dir, args.workers, manifest, args.track_dir)
@@ -0,0 +1,233 @@
+import os
+import numpy as np
+import pandas as pd
+from telemetry import stage, file_bytes
+
+# Directory (per flight) holding one .npz file per topic instance
+COLUMNAR_SUFFIX = ".npz"
+
+# Fields of the aligned per-flight track; every instance of a topic present in the log is extracted
+TRACK_FIELDS = {
+    "actuator_outputs": ["output[0]", "output[1]", "output[2]", "output[3]"],
+    "esc_status": ["esc[0].esc_rpm", "esc[1].esc_rpm", "esc[2].esc_rpm", "esc[3].esc_rpm"],
+    "battery_status": ["voltage_v", "current_a"],
+    "vehicle_acceleration": ["xyz[0]", "xyz[1]", "xyz[2]"],
+    "actuator_armed": ["armed"],
+}
+STEP_FIELDS = ("armed",)  # Held (zero-order) instead of linearly interpolated
+TRACK_RATE_HZ = 100.0  # Common time grid of the track
+TIME_REFERENCE = "actuator_outputs_0"  # Track time 0 = first sample of this topic (same as the processed CSV)
+MOTOR_TOPIC = "actuator_outputs_0"
+ARMED_PWM = 1025.0  # Motor outputs above this count as armed (idle ~1050; disarmed 1000, 900 or 0)
+MIN_GAP_SECONDS = 0.5  # Shorter dips below ARMED_PWM do not end an armed segment
+MIN_SEGMENT_SECONDS = 1.0  # Shorter armed blips are ignored
+
+
+def read_ulog_topics(ulog_file, messages=('actuator_outputs',)):
+    """
+    Parse a .ulg file once and return the requested topics as NumPy arrays.
+    Result maps "<topic>_<instance>" (e.g. "actuator_outputs_0") to {field: array}.
+    """
+    from pyulog import ULog
+    with stage("ulog_parse", file=ulog_file) as s:
+        ulog = ULog(ulog_file, list(messages), disable_str_exceptions=False)
+        s.count(bytes=file_bytes(ulog_file), rows=sum(len(d.data["timestamp"]) for d in ulog.data_list))
+    return {f"{d.name}_{d.multi_id}": d.data for d in ulog.data_list}
+
+
+def save_topics(topics, flight_dir):
+    """
+    Write each topic to its own .npz so a reader only touches the topics it needs.
+    """
+    os.makedirs(flight_dir, exist_ok=True)
+    with stage("npz_write", file=flight_dir) as s:
+        for topic, fields in topics.items():
+            np.savez(os.path.join(flight_dir, topic + COLUMNAR_SUFFIX), **fields)
+            s.count(bytes=file_bytes(os.path.join(flight_dir, topic + COLUMNAR_SUFFIX)))
+
+
+def list_topics(flight_dir):
+    return sorted(f[:-len(COLUMNAR_SUFFIX)] for f in os.listdir(flight_dir) if f.endswith(COLUMNAR_SUFFIX))
+
+
+def load_topic(flight_dir, topic):
+    """
+    Lazily open one topic. Columns are only read from disk when indexed, e.g. load_topic(...)['output[0]'].
+    """
+    return np.load(os.path.join(flight_dir, topic + COLUMNAR_SUFFIX))
+
+
+def export_topic_csv(fields, csv_file):
+    """
+    Optional text export, same layout as pyulog's convert_ulog2csv.
+    """
+    with stage("csv_write", file=csv_file) as s:
+        pd.DataFrame({name: np.asarray(values) for name, values in fields.items()}).to_csv(csv_file, index=False)
+        s.count(bytes=file_bytes(csv_file))
+
+
+def process_actuator_outputs(fields, columns):
+    """
+    Keep the requested columns, cut at flight end and shift timestamps to start from 0.
+    Returns None if a required column is missing.
+    """
+    if not all(col in fields for col in columns):
+        return None
+    data = {col: np.asarray(fields[col]) for col in columns}
+
+    # Remove rows after the flight end (same definition as the track, see flight_end)
+    motors = [np.asarray(fields[c]) for c in TRACK_FIELDS["actuator_outputs"] if c in fields]
+    timestamp = data['timestamp'].astype(np.int64)
+    t = (timestamp - timestamp[0]) / 1e6 if timestamp.size else timestamp
+    end = flight_end(t, np.stack(motors, axis=1))
+    if end is not None:
+        cutoff = int(np.searchsorted(t, end, side="right"))
+        data = {col: values[:cutoff] for col, values in data.items()}
+
+    # Normalize timestamp to start from 0 (microseconds)
+    timestamp = data['timestamp'].astype(np.int64)
+    data['timestamp'] = timestamp - timestamp[0] if timestamp.size else timestamp
+    return data
+
+
+def flight_end(t, outputs, armed_pwm=ARMED_PWM):
+    """
+    Flight end in s: the end of the last armed segment of the motor outputs [samples, motors]
+    (any motor above armed_pwm, short dips bridged; see armed_segments), or None if it never armed.
+    The one definition used for both the processed CSV and the track, so both give the same log duration.
+    """
+    segments = armed_segments(t, np.asarray(outputs).max(axis=1) > armed_pwm)
+    return segments[-1][1] if segments else None
+
+
+def armed_segments(t, armed, min_gap=MIN_GAP_SECONDS, min_length=MIN_SEGMENT_SECONDS):
+    """
+    [(start s, end s)] of the runs where armed is True, with gaps shorter than min_gap
+    bridged and segments shorter than min_length dropped.
+    """
+    edges = np.flatnonzero(np.diff(np.concatenate(([0], armed.astype(np.int8), [0]))))
+    segments = []
+    for start, end in zip(t[edges[0::2]], t[edges[1::2] - 1]):
+        if segments and start - segments[-1][1] < min_gap:
+            segments[-1][1] = end
+        else:
+            segments.append([start, end])
+    return [(float(a), float(b)) for a, b in segments if b - a >= min_length]
+
+
+def interp_columns(grid, t, values, hold=False):
+    """
+    Interpolate every column of values [samples, k] (sampled at t, increasing) onto grid in one
+    pass: the bracketing indices are searched once and shared by all columns. hold=True keeps
+    the previous sample (for flags). Values outside t are held at the edges, like np.interp.
+    A topic without samples gives NaN columns.
+    """
+    if len(t) == 0:
+        return np.full((len(grid), values.shape[1]), np.nan)
+    if len(t) == 1:
+        return np.repeat(values[:1], len(grid), axis=0)
+    right = np.clip(np.searchsorted(t, grid, side="right"), 1, len(t) - 1)
+    left = right - 1
+    if hold:
+        return values[np.where(grid >= t[right], right, left)]
+    w = np.clip((grid - t[left]) / (t[right] - t[left]), 0.0, 1.0)[:, None]
+    return values[left] * (1.0 - w) + values[right] * w
+
+
+def extract_track(topics, fields=TRACK_FIELDS, rate_hz=TRACK_RATE_HZ, time_reference=TIME_REFERENCE,
+                  armed_pwm=ARMED_PWM):
+    """
+    Resample the requested fields of every topic instance onto one uniform grid.
+    topics: read_ulog_topics() output (parsed once with all the topics in fields).
+    Returns {"time": s [n], "data": float32 [n, channels], "channels": ["<topic>_<instance>/<field>"],
+    "segments": armed (start s, end s), "rate_hz"}; topics missing from the log, or logged
+    without any samples, are skipped.
+    """
+    if time_reference not in topics or len(topics[time_reference]["timestamp"]) == 0:
+        raise ValueError(f"{time_reference} not found in the log")
+    t0 = int(topics[time_reference]["timestamp"][0])
+    t_end = (int(topics[time_reference]["timestamp"][-1]) - t0) / 1e6
+    grid = np.arange(0.0, t_end + 0.5 / rate_hz, 1.0 / rate_hz)
+
+    columns, channels = [], []
+    for topic in sorted(topics):
+        name = topic.rsplit("_", 1)[0]
+        present = [f for f in fields.get(name, ()) if f in topics[topic]]
+        if not present or len(topics[topic]["timestamp"]) == 0:
+            continue
+        t = (np.asarray(topics[topic]["timestamp"], dtype=np.int64) - t0) / 1e6
+        step = [f for f in present if f.split(".")[-1] in STEP_FIELDS]
+        for group, hold in ((step, True), ([f for f in present if f not in step], False)):
+            if group:
+                values = np.stack([np.asarray(topics[topic][f], dtype=np.float64) for f in group], axis=1)
+                columns.append(interp_columns(grid, t, values, hold))
+                channels.extend(f"{topic}/{f}" for f in group)
+    data = np.concatenate(columns, axis=1).astype(np.float32)
+
+    # Arming from the armed flag when logged, else from the motor outputs
+    flag = [i for i, c in enumerate(channels) if c.endswith("/armed")]
+    motors = [i for i, c in enumerate(channels) if c.startswith(f"{MOTOR_TOPIC}/output[")]
+    if flag:
+        armed = data[:, flag[0]] > 0.5
+    elif motors:
+        armed = data[:, motors].max(axis=1) > armed_pwm
+    else:
+        armed = np.ones(len(grid), dtype=bool)
+    # Flight end from the raw motor samples (not the interpolated grid), exactly as for the processed CSV
+    motor_fields = [f for f in fields.get("actuator_outputs", ()) if f in topics.get(MOTOR_TOPIC, {})]
+    end = None
+    if motor_fields:
+        t = (np.asarray(topics[MOTOR_TOPIC]["timestamp"], dtype=np.int64) - t0) / 1e6
+        end = flight_end(t, np.stack([np.asarray(topics[MOTOR_TOPIC][f]) for f in motor_fields], axis=1), armed_pwm)
+    return {"time": grid, "data": data, "channels": channels, "segments": armed_segments(grid, armed),
+            "flight_end": end, "rate_hz": rate_hz}
+
+
+def save_track(track, track_file):
+    os.makedirs(os.path.dirname(track_file) or ".", exist_ok=True)
+    np.savez(track_file, time=track["time"], data=track["data"], channels=np.array(track["channels"]),
+             segments=np.array(track["segments"], dtype=np.float64).reshape(-1, 2), rate_hz=track["rate_hz"],
+             flight_end=np.nan if track["flight_end"] is None else track["flight_end"])
+
+
+def load_track(track_file):
+    with np.load(track_file) as f:
+        end = float(f["flight_end"]) if "flight_end" in f.files else np.nan  # Missing in tracks ingested before
+        return {"time": f["time"], "data": f["data"], "channels": [str(c) for c in f["channels"]],
+                "segments": [tuple(s) for s in f["segments"]], "rate_hz": float(f["rate_hz"]),
+                "flight_end": None if np.isnan(end) else end}
+
+
+def track_columns(track, prefix):
+    """
+    (names, [n, k] array) of the track channels starting with prefix, e.g. "actuator_outputs_0/".
+    """
+    idx = [i for i, c in enumerate(track["channels"]) if c.startswith(prefix)]
+    return [track["channels"][i][len(prefix):] for i in idx], track["data"][:, idx]
+
+
+def track_dataframe(track, topic=MOTOR_TOPIC, flight_only=True):
+    """
+    Motor outputs of a track in the processed-CSV layout (timestamp in us from 0, output[i]),
+    so auto_sync / rpm_denoise can use it directly. flight_only cuts at flight_end, like the processed CSV.
+    """
+    names, values = track_columns(track, f"{topic}/")
+    n = len(track["time"])
+    end = track.get("flight_end")
+    motors = [i for i, name in enumerate(names) if name in TRACK_FIELDS["actuator_outputs"]]
+    if end is None and motors:  # Older tracks: estimate it on the grid
+        end = flight_end(track["time"], values[:, motors])
+    if flight_only and end is not None:
+        n = int(np.searchsorted(track["time"], end, side="right"))
+    df = pd.DataFrame(values[:n], columns=names)
+    df.insert(0, "timestamp", np.round(track["time"][:n] * 1e6).astype(np.int64))
+    return df
+
+
+def read_flight_log(path):
+    """
+    Motor-output DataFrame (timestamp in us, output[i]) from a processed CSV or a flight track .npz.
+    """
+    if path.endswith(".npz"):
+        return track_dataframe(load_track(path))
+    return pd.read_csv(path)
@@ -0,0 +1,90 @@
+import numpy as np
+
+# Level-of-detail waveform plotting: only ~MAX_COLUMNS min/max pairs are drawn at any zoom level
+LEVEL_FACTOR = 4  # Each pyramid level merges this many blocks of the level below
+MAX_COLUMNS = 2000  # Upper bound of envelope columns drawn per view (about the pixel width of a plot)
+
+
+class WaveformPyramid:
+    """
+    Min/max envelope of a signal at block sizes LEVEL_FACTOR, LEVEL_FACTOR^2, ...
+    Each level is built from the one below, so the whole pyramid costs about one pass over
+    the samples and 2/3 of the signal in memory.
+    """
+
+    def __init__(self, signal, factor=LEVEL_FACTOR, max_columns=MAX_COLUMNS):
+        self.signal = np.asarray(signal, dtype=np.float32)
+        self.factor = factor
+        self.levels = []  # [(block size, mins, maxs)]
+        mins = maxs = self.signal
+        block = 1
+        while len(mins) > max_columns:
+            n = len(mins) // factor * factor
+            tail_min, tail_max = mins[n:], maxs[n:]
+            mins = mins[:n].reshape(-1, factor).min(axis=1)
+            maxs = maxs[:n].reshape(-1, factor).max(axis=1)
+            if len(tail_min):  # Partial last block
+                mins = np.append(mins, tail_min.min())
+                maxs = np.append(maxs, tail_max.max())
+            block *= factor
+            self.levels.append((block, mins, maxs))
+
+    def envelope(self, start, stop, max_columns=MAX_COLUMNS):
+        """
+        Samples [start, stop) reduced to at most max_columns min/max pairs.
+        Returns (sample positions, values): raw samples when the range is small enough,
+        otherwise an interleaved min, max, min, max ... trace that draws each block as a vertical stroke.
+        """
+        start, stop = max(int(start), 0), min(int(np.ceil(stop)), len(self.signal))
+        if stop <= start:
+            return np.empty(0), np.empty(0, dtype=np.float32)
+        if stop - start <= max_columns:
+            return np.arange(start, stop), self.signal[start:stop]
+        for block, mins, maxs in self.levels:
+            if (stop - start) / block <= max_columns or block == self.levels[-1][0]:
+                break
+        first, last = start // block, -(-stop // block)
+        x = np.repeat(np.arange(first, last) * block + block / 2, 2)
+        y = np.empty(2 * (last - first), dtype=np.float32)
+        y[0::2], y[1::2] = mins[first:last], maxs[first:last]
+        return x, y
+
+
+class LODLine:
+    """
+    A waveform line that is re-decimated from its pyramid whenever the x limits of its axes
+    change (zoom, pan, home), so redraws cost O(MAX_COLUMNS) regardless of recording length.
+    x is in time_scale units (1000 -> ms) starting at offset.
+    """
+
+    def __init__(self, ax, signal, sample_rate, scale=1.0, time_scale=1000.0, offset=0.0,
+                 max_columns=MAX_COLUMNS, **plot_kwargs):
+        self.pyramid = WaveformPyramid(signal, max_columns=max_columns)
+        self.sample_rate, self.scale, self.time_scale, self.offset = sample_rate, scale, time_scale, offset
+        self.max_columns = max_columns
+        self.line, = ax.plot([], [], **plot_kwargs)
+        _, mins, maxs = self.pyramid.levels[-1] if self.pyramid.levels else (1, self.pyramid.signal, self.pyramid.signal)
+        lo, hi = sorted((float(mins.min()) * scale, float(maxs.max()) * scale)) if len(mins) else (0.0, 0.0)
+        ax.update_datalim([(self.to_x(0), lo), (self.to_x(len(self.pyramid.signal)), hi)])
+        ax.autoscale_view()
+        self.update(ax)
+        # A plain function keeps self alive; callbacks only hold weak references to bound methods
+        ax.callbacks.connect("xlim_changed", lambda axes: self.update(axes))
+
+    def to_x(self, samples):
+        return self.offset + np.asarray(samples) / self.sample_rate * self.time_scale
+
+    def update(self, ax):
+        lo, hi = ax.get_xlim()
+        start = (lo - self.offset) / self.time_scale * self.sample_rate
+        stop = (hi - self.offset) / self.time_scale * self.sample_rate
+        x, y = self.pyramid.envelope(np.floor(start), np.ceil(stop) + 1, self.max_columns)
+        self.line.set_data(self.to_x(x), y * self.scale)  # Drawn by the redraw that follows the limit change
+
+
+def plot_waveform(ax, signal, sample_rate, scale=1.0, time_scale=1000.0, offset=0.0, **plot_kwargs):
+    """
+    Drop-in for ax.plot(time * time_scale, signal * scale) on long recordings.
+    Returns the LODLine (its .line is the matplotlib Line2D, e.g. for legends).
+    """
+    return LODLine(ax, signal, sample_rate, scale, time_scale, offset, **plot_kwargs)